@@ -201,26 +201,12 @@ async function previewIcon() {
         return;
     }
     
-    // If it's a custom icon (starts with WI)
-    if (id.startsWith('WI')) {
-        try {
-            const icons = await getSavedIcons();
-            if (icons[id]) {
-                const firstFrame = icons[id].frames ? icons[id].frames[0] : icons[id].grid;
-                if (firstFrame) {
-                    const previewData = gridToDataUrl(firstFrame);
-                    prev.innerHTML = `<img src='${previewData}' style='width:${PREVIEW_SIZE}px;height:${PREVIEW_SIZE}px;image-rendering:pixelated' alt='Preview'/>`;
-                    return;
-                }
-            }
-            prev.innerHTML = `<p style='color:var(--text-secondary);font-size:0.8rem'>⚠️ Icône ${id} introuvable</p>`;
-        } catch (error) {
-            prev.innerHTML = `<p style='color:var(--error);font-size:0.8rem'>❌ Erreur de chargement</p>`;
-        }
-    } else {
-        // LaMetric icon
-        prev.innerHTML = `<img src='https://developer.lametric.com/content/apps/icon_thumbs/${id}' style='width:${PREVIEW_SIZE}px;height:${PREVIEW_SIZE}px' onerror='this.src=""' alt='Preview'/>`;
-    }
+    // Rendered by the add-on (custom WI and LaMetric icons), animated and cached
+    const src = `${basePath}/api/icons/${encodeURIComponent(id)}/preview.gif`;
+    prev.innerHTML = `<img src='${src}' style='width:${PREVIEW_SIZE}px;height:${PREVIEW_SIZE}px;image-rendering:pixelated' alt='Preview'/>`;
+    prev.querySelector('img').onerror = () => {
+        prev.innerHTML = `<p style='color:var(--text-secondary);font-size:0.8rem'>⚠️ Icône ${id} introuvable</p>`;
+    };
 }
 
 async function stopAnimation() {
@@ -763,17 +749,31 @@ function generateIconId() {
 }
 
 async function getSavedIcons() {
+    // Metadata only: previews are images served (and cached) by the add-on
     try {
-        const response = await fetch(basePath + '/api/icons');
-        if (!response.ok) throw new Error('Failed to load icons');
-        return await response.json();
+        const icons = [];
+        let cursor = null;
+        do {
+            const params = new URLSearchParams({ fields: 'meta', limit: '200' });
+            if (cursor) params.set('cursor', cursor);
+            const response = await fetch(basePath + `/api/icons/search?${params}`);
+            if (!response.ok) throw new Error('Failed to load icons');
+            const page = await response.json();
+            icons.push(...page.icons);
+            cursor = page.next_cursor;
+        } while (cursor);
+        return icons;
     } catch (error) {
         console.error('Error loading icons:', error);
         showMsg('❌ Erreur de chargement');
-        return {};
+        return [];
     }
 }
 
+function iconPreviewUrl(iconId, format = 'png') {
+    return `${basePath}/api/icons/${encodeURIComponent(iconId)}/preview.${format}`;
+}
+
 async function saveIconToServer(iconId, iconData) {
     try {
         console.log('Saving icon:', iconId, iconData);
@@ -877,25 +877,24 @@ async function loadSavedIcons() {
     const icons = await getSavedIcons();
     const container = document.getElementById('savedIconsList');
     
-    if (Object.keys(icons).length === 0) {
+    if (icons.length === 0) {
         container.innerHTML = '<p style="text-align:center;color:var(--text-secondary);padding:2rem">Aucune création sauvegardée</p>';
         return;
     }
     
-    const sortedIcons = Object.values(icons).sort((a, b) => 
+    const sortedIcons = icons.sort((a, b) => 
         new Date(b.modified) - new Date(a.modified)
     );
     
     container.innerHTML = sortedIcons.map(icon => {
-        // Use first frame for preview if it's an animation
-        const firstFrame = icon.frames ? icon.frames[0] : icon.grid;
-        const previewData = gridToDataUrl(firstFrame);
+        // First frame, rendered by the add-on; off-screen previews load on scroll
+        const previewUrl = iconPreviewUrl(icon.id);
         const date = new Date(icon.created).toLocaleDateString('fr-FR', {
             day: '2-digit',
             month: '2-digit',
             year: '2-digit'
         });
-        const frameCount = icon.frames ? icon.frames.length : 1;
+        const frameCount = icon.frame_count;
         const animBadge = frameCount > 1 ? `<span style='color:var(--primary);font-size:0.7rem'>🎬 ${frameCount}</span>` : '';
         
         // Show only last 6 digits of ID for display
@@ -906,7 +905,7 @@ async function loadSavedIcons() {
         
         return `
             <div class='saved-icon-item' onclick='loadIconFromLibrary("${icon.id}")'>
-                <img src='${previewData}' class='saved-icon-preview' alt='${icon.name}'/>
+                <img src='${previewUrl}' class='saved-icon-preview' loading='lazy' alt='${icon.name}'/>
                 <div class='saved-icon-id' onclick='event.stopPropagation(); copyIconId("${icon.id}")' title='${icon.id} - Cliquer pour copier'>${shortId}</div>
                 ${nameRow}
                 <div class='saved-icon-date'>${date}${hasCustomName ? '' : ' ' + animBadge}</div>
@@ -937,8 +936,8 @@ function gridToDataUrl(grid) {
 }
 
 async function loadIconFromLibrary(iconId) {
-    const icons = await getSavedIcons();
-    const icon = icons[iconId];
+    const response = await fetch(basePath + `/api/icons/${encodeURIComponent(iconId)}`);
+    const icon = response.ok ? await response.json() : null;
     
     if (icon) {
         // Load frames (or convert old single grid format)
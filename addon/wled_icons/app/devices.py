@@ -0,0 +1,250 @@
+"""Registry of WLED devices: capabilities and cached state.
+
+``/json/info`` is read once per host. It gives the firmware version, LED
+count, matrix size, WebSocket support and realtime UDP port, from which the
+registry derives the device's capabilities: the geometry registry reads the
+matrix size from it, and animations fall back to HTTP on a device that
+cannot take the configured transport.
+
+``/json/state`` is cached for ``state_ttl`` seconds and refreshed in the
+background every ``poll_interval`` seconds, so state reads are answered
+without a round-trip to the ESP. The poller leaves alone hosts that are
+playing an animation (their state is not worth a request competing with
+the frames) and hosts whose circuit breaker is open. Concurrent reads of
+the same host share one request. A host that was neither asked about nor
+reached for ``evict_after`` seconds (a mistyped or retired address) is
+forgotten instead of being polled forever; hosts given at construction
+(the configured panels) are kept.
+
+Everything here runs on the animation engine loop.
+"""
+import asyncio
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+from . import logs
+from .wled_client import PIXEL_SAFE_KEYS, WledClient, WledError
+
+log = logs.get_logger("devices")
+
+# First firmware with a DDP receiver
+DDP_VERSION = (0, 11)
+
+
+def parse_version(ver: str) -> tuple:
+    """ "0.14.0-b1" -> (0, 14, 0); unreadable parts count as 0"""
+    parts = []
+    for part in str(ver or "").split("-")[0].split("."):
+        digits = "".join(c for c in part if c.isdigit())
+        parts.append(int(digits) if digits else 0)
+    return tuple(parts)
+
+
+def capabilities(info: Dict) -> Dict:
+    """What a device advertises in /json/info, in the terms the service uses"""
+    leds = info.get("leds") or {}
+    matrix = leds.get("matrix") or {}
+    transports = ["http"]
+    # Connected WebSocket clients, -1 when the firmware was built without WebSockets
+    if isinstance(info.get("ws"), int) and info["ws"] >= 0:
+        transports.append("ws")
+    if parse_version(info.get("ver")) >= DDP_VERSION:
+        transports.append("ddp")
+    if info.get("udpport"):
+        transports += ["dnrgb", "drgb"]
+    return {
+        "name": info.get("name"),
+        "version": info.get("ver"),
+        "leds": int(leds.get("count") or 0),
+        "matrix": {"width": matrix["w"], "height": matrix["h"]} if matrix.get("w") and matrix.get("h") else None,
+        "rgbw": bool(leds.get("rgbw")),
+        "udp_port": info.get("udpport"),
+        "transports": transports,
+    }
+
+
+class Device:
+    def __init__(self, host: str):
+        self.host = host
+        self.info: Optional[Dict] = None
+        self.capabilities: Optional[Dict] = None
+        self.state: Optional[Dict] = None
+        self.state_time = 0.0
+        self.last_seen: Optional[float] = None
+        self.error: Optional[str] = None
+        # Monotonic times of the last request for this host, and of its last answer
+        self.last_used = time.monotonic()
+        self.last_reached: Optional[float] = None
+
+    def idle(self) -> float:
+        """Seconds since the host was last asked about or reached"""
+        return time.monotonic() - max(self.last_used, self.last_reached or 0.0)
+
+    def state_age(self) -> Optional[float]:
+        return time.monotonic() - self.state_time if self.state is not None else None
+
+    def status(self) -> Dict:
+        age = self.state_age()
+        return {
+            "host": self.host,
+            "capabilities": self.capabilities,
+            "state_age": round(age, 1) if age is not None else None,
+            "last_seen": self.last_seen,
+            "error": self.error,
+        }
+
+
+class DeviceRegistry:
+    def __init__(self, client: WledClient, state_ttl: float = 5.0, poll_interval: float = 30.0,
+                 hosts: Iterable[str] = (), evict_after: float = 3600.0):
+        self.client = client
+        self.state_ttl = state_ttl
+        self.poll_interval = poll_interval
+        self.evict_after = evict_after
+        self._devices: Dict[str, Device] = {}
+        self._pending: Dict[tuple, asyncio.Future] = {}
+        self._poller: Optional[asyncio.Task] = None
+        self._pinned = set(hosts)
+        for host in self._pinned:
+            self.device(host)
+
+    def device(self, host: str) -> Device:
+        device = self._devices.get(host)
+        if device is None:
+            device = self._devices[host] = Device(host)
+        return device
+
+    def _use(self, host: str) -> Device:
+        device = self.device(host)
+        device.last_used = time.monotonic()
+        return device
+
+    # --- Reads ---
+
+    async def info(self, host: str) -> Dict:
+        """/json/info of host, read once"""
+        device = self._use(host)
+        if device.info is not None:
+            return device.info
+        return await self._fetch(host, "info")
+
+    async def state(self, host: str, fresh: bool = False) -> Dict:
+        """/json/state of host, from the cache unless older than state_ttl (or fresh)"""
+        device = self._use(host)
+        age = device.state_age()
+        if not fresh and age is not None and age < self.state_ttl:
+            return device.state
+        return await self._fetch(host, "state")
+
+    async def _fetch(self, host: str, kind: str) -> Dict:
+        # One request per host and kind at a time, shared by every caller
+        key = (host, kind)
+        task = self._pending.get(key)
+        if task is None:
+            task = self._pending[key] = asyncio.ensure_future(self._read(host, kind))
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _read(self, host: str, kind: str) -> Dict:
+        device = self.device(host)
+        try:
+            if kind == "info":
+                data = await self.client.get_info(host)
+            else:
+                data = await self.client.get_state(host)
+        except WledError as e:
+            device.error = str(e)
+            raise
+        device.error = None
+        device.last_seen = time.time()
+        device.last_reached = time.monotonic()
+        if kind == "info":
+            device.info = data
+            device.capabilities = capabilities(data)
+            log.info("Device info", host=host, version=device.capabilities["version"],
+                     leds=device.capabilities["leds"], transports=",".join(device.capabilities["transports"]))
+        else:
+            device.state = data
+            device.state_time = time.monotonic()
+        return data
+
+    def capabilities(self, host: str) -> Optional[Dict]:
+        """Capabilities of host if its /json/info was read, without network access"""
+        device = self._devices.get(host)
+        return device.capabilities if device else None
+
+    def transport(self, host: str, preferred: str) -> str:
+        """preferred if host supports it (or is not known yet), else http"""
+        if host in self._devices:
+            self._use(host)
+        caps = self.capabilities(host)
+        if caps is None or preferred in caps["transports"]:
+            return preferred
+        log.debug("Transport not supported, using http", host=host, transport=preferred)
+        return "http"
+
+    # --- Writes ---
+
+    async def set_state(self, host: str, payload: Dict) -> Dict:
+        """Post a state change and keep the cached state in line with it"""
+        result = await self.client.set_state(host, payload)
+        device = self._use(host)
+        if device.state is not None and PIXEL_SAFE_KEYS.issuperset(payload):
+            # "tt" only applies to this request
+            device.state = {**device.state, **{k: v for k, v in payload.items() if k != "tt"}}
+        else:
+            # WLED only answers {"success": true}: read the state again next time
+            device.state = None
+        return result
+
+    def forget(self, host: Optional[str] = None):
+        """Forget info and state (of every host when None) so they are read again"""
+        for device in [self._devices.get(host)] if host else list(self._devices.values()):
+            if device is not None:
+                device.info = device.capabilities = device.state = None
+
+    def all(self) -> Dict[str, Dict]:
+        return {host: device.status() for host, device in list(self._devices.items())}
+
+    # --- Background polling ---
+
+    async def start(self, busy: Callable[[str], bool] = lambda host: False):
+        """Start polling states (on the engine loop); busy(host) hosts are skipped"""
+        if self.poll_interval > 0 and self._poller is None:
+            self._poller = asyncio.ensure_future(self._poll(busy))
+
+    async def _poll(self, busy: Callable[[str], bool]):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            self.evict()
+            hosts = [h for h, d in list(self._devices.items())
+                     if not busy(h) and self.client.flow(h).ready()
+                     and (d.state_age() is None or d.state_age() >= self.poll_interval / 2)]
+            results = await asyncio.gather(*(self._refresh(h) for h in hosts), return_exceptions=True)
+            for host, result in zip(hosts, results):
+                if isinstance(result, Exception) and not isinstance(result, WledError):
+                    log.warning("Device poll failed", host=host, error=result)
+
+    def evict(self):
+        """Forget the hosts idle for evict_after seconds, except the configured ones"""
+        for host, device in list(self._devices.items()):
+            if host not in self._pinned and device.idle() >= self.evict_after:
+                del self._devices[host]
+                log.info("Device forgotten", host=host, idle=round(device.idle()))
+
+    async def _refresh(self, host: str):
+        try:
+            if host in self._devices and self._devices[host].info is None:
+                await self._fetch(host, "info")
+            await self._fetch(host, "state")
+        except WledError as e:
+            log.debug("Device not answering", host=host, error=e)
+
+    async def aclose(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            try:
+                await self._poller
+            except asyncio.CancelledError:
+                pass
+            self._poller = None
@@ -0,0 +1,235 @@
+"""Per-host display queue: priorities, TTLs and resume after an interruption.
+
+Each host has at most one queued entry on screen and a list of waiting
+entries. A new entry with a priority greater than or equal to the one on
+screen interrupts it: the interrupted entry goes back to the queue with its
+position (frame and loop), and resumes from there with its already rendered
+frames once the higher priority content is over. Lower priority entries
+wait their turn.
+
+An entry ends when its loops are done (``loop`` 0 plays until the TTL) or
+when its TTL expires; the TTL counts from the moment it was queued, time
+spent waiting or interrupted included. A new entry replaces any entry of
+the same host with the same ``key`` (the icon id by default), so an
+automation re-sending its ambient icon does not pile up copies.
+
+Anything else taking over the panel (a direct /show/icon, a playlist,
+/stop) clears the host's queue. All methods run on the engine loop.
+"""
+import asyncio
+import itertools
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from . import logs
+from .engine import AnimationEngine, Player
+
+log = logs.get_logger("queue")
+
+# Waiting entries kept per host; the lowest priority ones are dropped first
+MAX_QUEUED_PER_HOST = 20
+
+_order = itertools.count()
+
+
+class QueueEntry:
+    def __init__(self, host: str, icon_id: str, sequence: List[tuple[np.ndarray, float]], loop: int,
+                 make_transport: Callable, priority: int = 0, ttl: Optional[float] = None,
+                 key: Optional[str] = None):
+        self.entry_id = uuid.uuid4().hex[:12]
+        self.host = host
+        self.icon_id = icon_id
+        self.key = key or icon_id
+        self.sequence = sequence
+        self.loop = loop
+        self.make_transport = make_transport
+        self.priority = priority
+        self.ttl = ttl
+        self.created = time.time()
+        self.expires = time.monotonic() + ttl if ttl else None
+        self.order = next(_order)
+        self.state = "queued"
+        # Position to resume from after an interruption
+        self.frame_index = 0
+        self.loop_count = 0
+        self.player: Optional["QueuedPlayer"] = None
+        self.timer: Optional[asyncio.TimerHandle] = None
+        # Why the queue itself stopped the player: "interrupted", "replaced", "removed", "expired"
+        self.stop_reason: Optional[str] = None
+
+    def expired(self, now: Optional[float] = None) -> bool:
+        return self.expires is not None and (now or time.monotonic()) >= self.expires
+
+    def sort_key(self):
+        return (-self.priority, self.order)
+
+    def status(self) -> Dict:
+        player = self.player if self.state == "playing" else None
+        return {
+            "id": self.entry_id,
+            "host": self.host,
+            "icon_id": self.icon_id,
+            "key": self.key,
+            "priority": self.priority,
+            "state": self.state,
+            "ttl": self.ttl,
+            "expires_in": round(max(0.0, self.expires - time.monotonic()), 1) if self.expires else None,
+            "frames": len(self.sequence),
+            "frame": player.frame_index if player else self.frame_index,
+            "loop": self.loop,
+            "loops_done": player.loop_count if player else self.loop_count,
+            "created": self.created,
+        }
+
+
+class QueuedPlayer(Player):
+    """Player of a queue entry, starting from the entry's saved position"""
+
+    def __init__(self, queue: "DisplayQueue", entry: QueueEntry, transport):
+        super().__init__(entry.host, entry.sequence, entry.loop, transport, label=f"queue:{entry.icon_id}")
+        self.queue = queue
+        self.entry = entry
+        self.frame_index = entry.frame_index
+        self.loop_count = entry.loop_count
+
+    def on_end(self):
+        self.queue._on_end(self)
+
+    def status(self) -> Dict:
+        return {**super().status(), "queue_entry": self.entry.entry_id, "priority": self.entry.priority}
+
+
+class DisplayQueue:
+    def __init__(self, engine: AnimationEngine, max_queued: int = MAX_QUEUED_PER_HOST):
+        self.engine = engine
+        self.max_queued = max_queued
+        self._waiting: Dict[str, List[QueueEntry]] = {}
+        self._current: Dict[str, QueueEntry] = {}
+
+    async def enqueue(self, entry: QueueEntry) -> QueueEntry:
+        host = entry.host
+        waiting = [e for e in self._waiting.get(host, []) if e.key != entry.key and not e.expired()]
+        self._waiting[host] = waiting
+        current = self._current.get(host)
+        if current is not None and current.key == entry.key:
+            current.stop_reason = "replaced"
+        elif current is not None and entry.priority >= current.priority:
+            current.stop_reason = "interrupted"
+            waiting.append(current)
+        elif current is not None:
+            waiting.append(entry)
+            self._trim(host)
+            log.info("Entry queued", host=host, entry=entry.entry_id, icon_id=entry.icon_id,
+                     priority=entry.priority, waiting=len(waiting))
+            return entry
+        # Nothing from the queue on screen, or this entry takes over
+        await self._start(entry)
+        return entry
+
+    def entries(self, host: Optional[str] = None) -> Dict[str, Dict]:
+        hosts = [host] if host else sorted(set(self._waiting) | set(self._current))
+        out = {}
+        for h in hosts:
+            current = self._current.get(h)
+            waiting = sorted((e for e in self._waiting.get(h, []) if not e.expired()), key=QueueEntry.sort_key)
+            out[h] = {"current": current.status() if current else None,
+                      "queued": [e.status() for e in waiting]}
+        return out
+
+    async def remove(self, host: str, entry_id: str) -> bool:
+        """Drop one entry; removing the one on screen moves on to the next"""
+        current = self._current.get(host)
+        if current is not None and current.entry_id == entry_id:
+            current.stop_reason = "removed"
+            await self.engine.halt(host)
+            return True
+        waiting = self._waiting.get(host, [])
+        kept = [e for e in waiting if e.entry_id != entry_id]
+        self._waiting[host] = kept
+        return len(kept) != len(waiting)
+
+    async def clear(self, host: Optional[str] = None) -> int:
+        """Drop every entry of host (of every host when None) and stop the one on screen"""
+        hosts = [host] if host else list(set(self._waiting) | set(self._current))
+        count = 0
+        for h in hosts:
+            count += len(self._waiting.pop(h, []))
+            current = self._current.get(h)
+            if current is not None:
+                count += 1
+                current.stop_reason = "removed"
+                self._forget_current(current)
+                await self.engine.halt(h)
+        return count
+
+    # --- Internals ---
+
+    def _trim(self, host: str):
+        waiting = self._waiting[host]
+        waiting.sort(key=QueueEntry.sort_key)
+        for dropped in waiting[self.max_queued:]:
+            log.warning("Queue full, entry dropped", host=host, entry=dropped.entry_id, icon_id=dropped.icon_id)
+        del waiting[self.max_queued:]
+
+    async def _start(self, entry: QueueEntry):
+        entry.state = "playing"
+        entry.stop_reason = None
+        self._current[entry.host] = entry
+        entry.player = QueuedPlayer(self, entry, entry.make_transport())
+        # Halts whatever the host was playing (an interrupted entry saves its position)
+        await self.engine.play(entry.player)
+        if entry.expires is not None:
+            entry.timer = self.engine.loop.call_later(max(0.0, entry.expires - time.monotonic()),
+                                                      self._expire, entry)
+        log.info("Entry playing", host=entry.host, entry=entry.entry_id, icon_id=entry.icon_id,
+                 priority=entry.priority, frame=entry.frame_index, loops_done=entry.loop_count)
+
+    def _expire(self, entry: QueueEntry):
+        if self._current.get(entry.host) is entry:
+            entry.stop_reason = "expired"
+            self.engine.loop.create_task(self.engine.halt(entry.host))
+
+    def _forget_current(self, entry: QueueEntry):
+        if self._current.get(entry.host) is entry:
+            del self._current[entry.host]
+        if entry.timer is not None:
+            entry.timer.cancel()
+            entry.timer = None
+
+    def _on_end(self, player: QueuedPlayer):
+        """Called by the engine when a queued player stops, whatever the reason"""
+        entry = player.entry
+        entry.frame_index, entry.loop_count = player.frame_index, player.loop_count
+        reason = entry.stop_reason
+        self._forget_current(entry)
+        if reason == "interrupted":
+            # Already back in the waiting list; resumes later from this position
+            entry.state = "interrupted"
+            return
+        if reason == "replaced" or (reason is None and player.state == "stopped"):
+            entry.state = "stopped"
+            if reason is None:
+                # Something outside the queue took over the panel
+                dropped = self._waiting.pop(entry.host, [])
+                if dropped:
+                    log.info("Queue cleared by another display", host=entry.host, dropped=len(dropped))
+            return
+        # Finished its loops, expired, removed or crashed: next entry
+        entry.state = reason or player.state
+        self.engine.loop.create_task(self._advance(entry.host))
+
+    async def _advance(self, host: str):
+        if host in self._current or self.engine.player(host) is not None:
+            return
+        now = time.monotonic()
+        waiting = [e for e in self._waiting.get(host, []) if not e.expired(now)]
+        if not waiting:
+            self._waiting.pop(host, None)
+            return
+        waiting.sort(key=QueueEntry.sort_key)
+        entry = waiting.pop(0)
+        self._waiting[host] = waiting
+        await self._start(entry)
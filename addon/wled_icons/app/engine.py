@@ -0,0 +1,313 @@
+"""Per-host animation engine.
+
+One asyncio event loop, running in a single background thread, schedules
+every animation as a task and owns all WLED I/O (the shared WledClient and
+the transports live on it). Players are registered by host, so starting or
+stopping an animation on one panel leaves the others alone. A group player
+is registered under each of its member hosts: starting something else on
+any member stops the whole group.
+
+Code running elsewhere reaches the loop with ``run()`` (from a coroutine on
+another loop, e.g. a FastAPI endpoint) or ``call()`` (from a plain thread).
+
+Frames are timed against absolute deadlines on the loop's monotonic clock:
+frame N is due at start + sum(durations before N), whatever the network
+latency was, so GIFs play at their nominal speed and long loops do not
+drift. When a send stalls past the slot of the following frames, those
+frames are dropped to catch up instead of being played late.
+
+A sequence may still be decoding while it plays (``FrameStream``): the
+engine then waits for each frame before sending it.
+
+Frames also follow the transport's flow control: a panel that answers
+slowly gets frames no closer than its ``min_interval`` (the others are
+skipped, the timeline is kept), and none while its circuit breaker is open.
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from . import logs
+from .metrics import FRAME_FAILURES, FRAMES_DROPPED, FRAMES_LATE, FRAMES_SENT, FRAMES_THROTTLED
+
+log = logs.get_logger("engine")
+
+# A frame sent later than this after its deadline counts as late
+LATE_TOLERANCE = 0.010
+
+
+class Player:
+    """An animation playing (or about to play) on one host"""
+
+    def __init__(self, host: str, sequence: List[Tuple[np.ndarray, float]], loop: int, transport,
+                 label: Optional[str] = None, hosts: Optional[List[str]] = None):
+        self.host = host
+        self.hosts = hosts or [host]
+        self.sequence = sequence
+        self.loop = loop
+        self.transport = transport
+        self.label = label
+        self.state = "starting"
+        self.started = time.time()
+        self.frame_index = 0
+        self.loop_count = 0
+        self.frames_sent = 0
+        self.errors = 0
+        self.late_frames = 0
+        self.dropped_frames = 0
+        self.throttled_frames = 0
+        self.max_lateness = 0.0
+        self.play_started: Optional[float] = None
+        self.play_ended: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def next_cycle(self):
+        """Called before every loop after the first; may replace the sequence"""
+
+    def on_end(self):
+        """Called once the player has stopped and released its hosts, whatever the reason"""
+
+    @property
+    def cycle_duration(self) -> float:
+        return sum(duration for _, duration in self.sequence)
+
+    def timing(self) -> Dict:
+        end = self.play_ended or time.monotonic()
+        elapsed = end - self.play_started if self.play_started else 0.0
+        cycle = self.cycle_duration
+        target = len(self.sequence) / cycle if cycle > 0 else None
+        interval = getattr(self.transport, "min_interval", 0.0)
+        effective = min(target, 1 / interval) if target and interval else target
+        return {
+            "target_fps": round(target, 2) if target else None,
+            "effective_fps": round(effective, 2) if effective else None,
+            "achieved_fps": round(self.frames_sent / elapsed, 2) if elapsed > 0 else None,
+            "late_frames": self.late_frames,
+            "dropped_frames": self.dropped_frames,
+            "throttled_frames": self.throttled_frames,
+            "max_lateness_ms": round(self.max_lateness * 1000, 1),
+        }
+
+    def status(self) -> Dict:
+        status = {
+            "host": self.host,
+            "hosts": self.hosts,
+            "label": self.label,
+            "state": self.state,
+            "transport": self.transport.name,
+            "frames": len(self.sequence),
+            "frame": self.frame_index,
+            "loop": self.loop,
+            "loops_done": self.loop_count,
+            "frames_sent": self.frames_sent,
+            "errors": self.errors,
+            "started": self.started,
+            **self.timing(),
+        }
+        if hasattr(self.transport, "member_status"):
+            status["members"] = self.transport.member_status()
+        return status
+
+
+class AnimationEngine:
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._players: Dict[str, Player] = {}
+        self._thread = threading.Thread(target=self._run, name="animation-engine", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def call(self, coro, timeout: float = 10.0):
+        """Run a coroutine on the engine loop from another thread and wait for it"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    async def run(self, coro):
+        """Await a coroutine on the engine loop from a coroutine running on another loop"""
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+    # --- Thread-safe public API ---
+
+    def stop(self, host: Optional[str] = None) -> List[str]:
+        """Stop the player of host, or every player when host is None"""
+        return self.call(self.halt(host))
+
+    def _unique_players(self) -> List[Player]:
+        return list({id(p): p for p in list(self._players.values())}.values())
+
+    def players(self) -> List[Dict]:
+        return [p.status() for p in self._unique_players()]
+
+    def player(self, host: str) -> Optional[Player]:
+        return self._players.get(host)
+
+    def shutdown(self, *cleanups):
+        """Stop every player, run the cleanup coroutines, then stop the loop"""
+        try:
+            self.stop()
+            for coro in cleanups:
+                self.call(coro)
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+    # --- Engine loop side ---
+
+    async def play(self, player: Player):
+        """Register and start player, replacing the current player of its hosts"""
+        for host in player.hosts:
+            await self.halt(host)
+        for host in player.hosts:
+            self._players[host] = player
+        player.task = self.loop.create_task(self._play(player))
+        return player
+
+    async def halt(self, host: Optional[str] = None) -> List[str]:
+        """Stop the player of host (every player when None) and wait for it to close"""
+        targets = self._unique_players() if host is None else [p for p in [self._players.get(host)] if p]
+        for player in targets:
+            player.task.cancel()
+        for player in targets:
+            try:
+                await player.task
+            except asyncio.CancelledError:
+                pass
+        return [p.host for p in targets]
+
+    async def _play(self, player: Player):
+        log.info("Animation started", host=player.host, label=player.label, frames=len(player.sequence),
+                 loop=player.loop, transport=player.transport.name)
+        player.state = "playing"
+        player.play_started = time.monotonic()
+        clock = self.loop.time
+        cycle = player.cycle_duration
+        deadline = clock()
+        # A resumed player starts from its saved position
+        start = min(player.frame_index, max(len(player.sequence) - 1, 0))
+        last_send: Optional[float] = None
+        try:
+            while True:
+                index = start
+                while await self._frame_ready(player.sequence, index):
+                    colors, duration = player.sequence[index]
+                    player.frame_index = index
+                    last = self._is_last(player.sequence, index)
+                    index += 1
+                    if not getattr(player.sequence, "complete", True):
+                        # Still decoding: the loop length grows with every frame
+                        cycle = player.cycle_duration
+                    lateness = clock() - deadline
+                    if lateness > cycle:
+                        # Stalled for more than a whole loop: re-anchor instead of dropping forever
+                        deadline = clock()
+                        lateness = 0.0
+                    elif lateness >= duration and not last:
+                        # This frame's slot is already over: skip it to catch up
+                        player.dropped_frames += 1
+                        FRAMES_DROPPED.labels(player.host).inc()
+                        deadline += duration
+                        continue
+                    transport = player.transport
+                    if not transport.ready() or (
+                            not last and last_send is not None
+                            and clock() - last_send < transport.min_interval):
+                        # The panel cannot take this frame (too slow, or unreachable): skip it
+                        player.throttled_frames += 1
+                        FRAMES_THROTTLED.labels(player.host).inc()
+                        deadline += duration
+                        await self._hold(player, deadline)
+                        continue
+                    if lateness > LATE_TOLERANCE:
+                        player.late_frames += 1
+                        FRAMES_LATE.labels(player.host).inc()
+                        player.max_lateness = max(player.max_lateness, lateness)
+                    last_send = clock()
+                    try:
+                        await player.transport.send(colors)
+                        player.frames_sent += 1
+                        FRAMES_SENT.labels(player.host).inc()
+                        if log.isEnabledFor(logging.DEBUG) and logs.frame_sampled(player.host):
+                            log.debug("Frame sent", host=player.host, frame=player.frame_index, sent=player.frames_sent,
+                                      lateness_ms=round(lateness * 1000, 1), dropped=player.dropped_frames)
+                    except Exception as e:
+                        player.errors += 1
+                        FRAME_FAILURES.labels(player.host).inc()
+                        # An unreachable panel fails every frame: log the first failure, then a few
+                        if player.errors == 1 or player.errors % logs.FRAME_SAMPLE_EVERY == 0:
+                            log.warning("Could not send frame", host=player.host, errors=player.errors, error=e)
+                    deadline += duration
+                    await self._hold(player, deadline)
+
+                if not len(player.sequence):
+                    # A streamed sequence that failed before its first frame
+                    break
+                start = 0
+                player.loop_count += 1
+                if player.loop > 0 and player.loop_count >= player.loop:
+                    break
+                player.next_cycle()
+                cycle = player.cycle_duration
+            player.state = "finished"
+        except asyncio.CancelledError:
+            player.state = "stopped"
+            raise
+        except Exception:
+            player.state = "error"
+            log.exception("Player crashed", host=player.host)
+        finally:
+            player.play_ended = time.monotonic()
+            release = getattr(player.sequence, "release", None)
+            if release is not None:
+                # A stream still decoding no longer needs to wait for this playback
+                release()
+            for host in player.hosts:
+                if self._players.get(host) is player:
+                    del self._players[host]
+            try:
+                # Realtime transports hand the panel back to its normal state
+                await player.transport.close()
+            except Exception as e:
+                log.warning("Could not close transport", host=player.host, error=e)
+            log.info("Animation ended", host=player.host, state=player.state, sent=player.frames_sent,
+                     errors=player.errors, late=player.late_frames, dropped=player.dropped_frames)
+            try:
+                player.on_end()
+            except Exception:
+                log.exception("Player end hook failed", host=player.host)
+
+    @staticmethod
+    async def _frame_ready(sequence, index: int) -> bool:
+        """Whether sequence has a frame at index, waiting for a streamed sequence to decode it"""
+        wait = getattr(sequence, "wait", None)
+        if wait is not None:
+            return await wait(index)
+        return index < len(sequence)
+
+    @staticmethod
+    def _is_last(sequence, index: int) -> bool:
+        """Whether index is the last frame (never, for a sequence still being decoded)"""
+        return index == len(sequence) - 1 and getattr(sequence, "complete", True)
+
+    async def _hold(self, player: Player, deadline: float):
+        """Wait until the next frame deadline, refreshing realtime transports meanwhile"""
+        interval = player.transport.keepalive_interval
+        while True:
+            remaining = deadline - self.loop.time()
+            if remaining <= 0:
+                return
+            if not interval:
+                await asyncio.sleep(remaining)
+                return
+            await asyncio.sleep(min(interval, remaining))
+            await player.transport.keepalive()
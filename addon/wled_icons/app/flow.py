@@ -0,0 +1,142 @@
+"""Per-host flow control for the WLED JSON API.
+
+Each host gets a ``HostFlow`` that the WledClient feeds with the outcome of
+every request:
+
+- round-trip time: an exponential moving average of successful requests,
+  from the second one on (the first also opens the connection).
+  It sets the frame request timeout (a few RTTs instead of the client's
+  5 s) and the minimum interval between two animation frames, so a panel
+  on weak Wi-Fi gets a lower frame rate instead of a backlog of late frames.
+- circuit breaker: after ``FAILURE_THRESHOLD`` failures in a row the host is
+  considered down and requests fail fast without touching the network. Once
+  the cooldown is over, one request goes through as a probe: success closes
+  the breaker, failure reopens it with a doubled cooldown.
+
+Frames sent to a host are serialized by ``sending`` (one frame in flight).
+Everything here runs on the animation engine loop.
+"""
+import asyncio
+import time
+from typing import Dict, Optional
+
+# Smoothing of the round-trip time estimate (exponential moving average)
+RTT_SMOOTHING = 0.2
+# Minimum frame interval, in round-trip times: leaves the ESP idle time between frames
+FRAME_HEADROOM = 1.5
+# Frame request timeout, in round-trip times, and its floor
+TIMEOUT_RTTS = 4
+MIN_FRAME_TIMEOUT = 1.0
+
+FAILURE_THRESHOLD = 5
+OPEN_SECONDS = 2.0
+MAX_OPEN_SECONDS = 30.0
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class HostFlow:
+    def __init__(self, host: str):
+        self.host = host
+        self.sending = asyncio.Lock()
+        self.reset()
+
+    def reset(self):
+        self.rtt: Optional[float] = None
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.failures = 0
+        self.successes = 0
+        self.open_seconds = OPEN_SECONDS
+        self.retry_at = 0.0
+        self.opened = 0
+        self._probing = False
+
+    # --- Round-trip time ---
+
+    @property
+    def min_interval(self) -> float:
+        """Shortest time between two frames this host keeps up with"""
+        return self.rtt * FRAME_HEADROOM if self.rtt else 0.0
+
+    def frame_timeout(self, default: float) -> float:
+        if self.rtt is None:
+            return default
+        return min(default, max(MIN_FRAME_TIMEOUT, self.rtt * TIMEOUT_RTTS))
+
+    # --- Circuit breaker ---
+
+    def ready(self) -> bool:
+        """Whether a request would be let through now (does not take the probe)"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            return time.monotonic() >= self.retry_at
+        return not self._probing
+
+    def allow(self) -> bool:
+        """Take the right to send a request; the first one after the cooldown is the probe"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() >= self.retry_at:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def success(self, rtt: float) -> bool:
+        """Record an answered request; True when it closed the breaker"""
+        self.successes += 1
+        if self.successes > 1:
+            # The first answer also paid for the TCP handshake: it would throttle the first frames
+            self.rtt = rtt if self.rtt is None else self.rtt + RTT_SMOOTHING * (rtt - self.rtt)
+        self.consecutive_failures = 0
+        self._probing = False
+        if self.state == CLOSED:
+            return False
+        self.state = CLOSED
+        self.open_seconds = OPEN_SECONDS
+        return True
+
+    def failure(self, elapsed: Optional[float] = None) -> bool:
+        """Record a request without answer; True when it opened the breaker
+
+        elapsed (the time waited, e.g. a timeout) is a lower bound of the
+        round-trip time and raises the estimate, so frames slow down and get
+        longer timeouts on a degrading link.
+        """
+        if elapsed is not None and self.rtt is not None and elapsed > self.rtt:
+            self.rtt += RTT_SMOOTHING * (elapsed - self.rtt)
+        self.failures += 1
+        self.consecutive_failures += 1
+        probe_failed = self.state == HALF_OPEN and self._probing
+        self._probing = False
+        if probe_failed:
+            self.open_seconds = min(MAX_OPEN_SECONDS, self.open_seconds * 2)
+        elif self.state != CLOSED or self.consecutive_failures < FAILURE_THRESHOLD:
+            return False
+        self.state = OPEN
+        self.opened += 1
+        self.retry_at = time.monotonic() + self.open_seconds
+        return True
+
+    def abandon(self):
+        """A request was cancelled before its outcome was known"""
+        self._probing = False
+
+    def status(self) -> Dict:
+        interval = self.min_interval
+        return {
+            "host": self.host,
+            "rtt_ms": round(self.rtt * 1000, 1) if self.rtt is not None else None,
+            "max_fps": round(1 / interval, 1) if interval else None,
+            "breaker": self.state,
+            "retry_in": round(max(0.0, self.retry_at - time.monotonic()), 1) if self.state == OPEN else None,
+            "consecutive_failures": self.consecutive_failures,
+            "failures": self.failures,
+            "successes": self.successes,
+            "opened": self.opened,
+        }
@@ -0,0 +1,138 @@
+"""Progressively decoded frame sequences.
+
+An animated GIF used to be decoded completely before its first frame was
+sent. A ``FrameStream`` is a (pixels, duration) list filled by a decoder
+thread while the animation engine is already playing it:
+
+- the engine awaits ``wait(index)`` before each frame, which returns as soon
+  as that frame is decoded (False once the stream has ended before it);
+- the decoder stays at most ``READ_AHEAD`` frames ahead of playback, so a
+  long GIF does not compete with the frames being sent for the CPU. Once
+  nobody paces the stream (``release()`` when its animation stops, or no
+  frame consumed for ``STALL_TIMEOUT``), it decodes the rest at full speed,
+  so every stream completes;
+- each stream decodes on its own thread: a stream waiting for playback to
+  catch up never holds back the decoding of another one;
+- identical consecutive frames are merged by summing their durations. A
+  frame is published once the next different frame (or the end) is known,
+  so its duration is final when the engine reads it;
+- the list keeps every frame: later loops replay it without decoding, and
+  ``on_done`` lets the caller memoize the finished sequence.
+
+Plain threads use ``first()`` and ``result()`` to wait for the first frame
+or for the whole sequence.
+"""
+import asyncio
+import threading
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from . import logs
+
+log = logs.get_logger("stream")
+
+# Frames decoded ahead of the one being played
+READ_AHEAD = 4
+# Seconds the decoder waits for playback to catch up before it stops pacing
+STALL_TIMEOUT = 2.0
+
+Frame = Tuple[np.ndarray, float]
+
+
+class FrameStream(list):
+    def __init__(self, frames: Iterator[Frame], on_done: Optional[Callable[["FrameStream"], None]] = None,
+                 read_ahead: int = READ_AHEAD):
+        super().__init__()
+        self.read_ahead = read_ahead
+        self.complete = False
+        self.error: Optional[Exception] = None
+        self._on_done = on_done
+        self._consumed = 0
+        self._progress = threading.Condition()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._changed: Optional[asyncio.Event] = None
+        threading.Thread(target=self._decode, args=(frames,), name="frame-decoder", daemon=True).start()
+
+    # --- Decoder thread ---
+
+    def _decode(self, frames: Iterator[Frame]):
+        pending: Optional[Frame] = None
+        try:
+            for pixels, duration in frames:
+                if pending is not None and np.array_equal(pending[0], pixels):
+                    pending = (pending[0], pending[1] + duration)
+                    continue
+                if pending is not None:
+                    self._publish(pending)
+                pending = (pixels, duration)
+            if pending is not None:
+                self._publish(pending)
+        except Exception as e:
+            self.error = e
+            log.warning("Frame decoding failed", decoded=len(self), error=e)
+        with self._progress:
+            self.complete = True
+            self._progress.notify_all()
+        self._signal()
+        if self._on_done is not None:
+            try:
+                self._on_done(self)
+            except Exception:
+                log.exception("Stream completion hook failed")
+
+    def _publish(self, frame: Frame):
+        with self._progress:
+            if not self._progress.wait_for(lambda: len(self) - self._consumed < self.read_ahead, STALL_TIMEOUT):
+                # Nobody is reading: finish without pacing
+                self.read_ahead = float("inf")
+            self.append(frame)
+            self._progress.notify_all()
+        self._signal()
+
+    def _signal(self):
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._changed.set)
+
+    # --- Consumers ---
+
+    async def wait(self, index: int) -> bool:
+        """Wait until frame index is decoded (from one event loop); False if the stream ended before it"""
+        if self._loop is None:
+            self._changed = asyncio.Event()
+            self._loop = asyncio.get_running_loop()
+        with self._progress:
+            self._consumed = max(self._consumed, index)
+            self._progress.notify_all()
+        while index >= len(self) and not self.complete:
+            self._changed.clear()
+            if index < len(self) or self.complete:
+                break
+            await self._changed.wait()
+        return index < len(self)
+
+    def first(self, timeout: Optional[float] = None):
+        """Block until the first frame is decoded; re-raises the error of a stream that has none"""
+        with self._progress:
+            if not self._progress.wait_for(lambda: len(self) or self.complete, timeout):
+                raise TimeoutError("Décodage trop long")
+        if not len(self) and self.error is not None:
+            raise self.error
+
+    def release(self):
+        """Stop pacing the decoder (playback stopped): the rest is decoded at full speed"""
+        with self._progress:
+            self.read_ahead = float("inf")
+            self._progress.notify_all()
+
+    def result(self, timeout: Optional[float] = None) -> List[Frame]:
+        """Every frame, once decoding is over (blocking); re-raises a decoding error"""
+        # Whoever waits for the whole sequence lifts the read-ahead limit
+        self.release()
+        with self._progress:
+            if not self._progress.wait_for(lambda: self.complete, timeout):
+                raise TimeoutError("Décodage trop long")
+        if self.error is not None:
+            raise self.error
+        return list(self)
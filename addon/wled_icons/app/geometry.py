@@ -0,0 +1,165 @@
+"""Per-host matrix geometry.
+
+Frames are rendered row-major at the panel's size; a Geometry then maps
+them to LED order. Panels configured as a 2D matrix in WLED already take
+logical row-major pixels (WLED does the serpentine mapping itself), so
+their geometry is read from ``/json/info`` (``leds.matrix``) with an
+identity mapping. Plain strips wired as a matrix are declared in the
+``panels`` option with their wiring: ``serpentine`` (every other row runs
+backwards) and ``origin`` (corner of the first LED).
+
+Without configuration or matrix info, a square LED count gives a square
+panel and anything else falls back to 8x8.
+"""
+import math
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from . import logs
+from .devices import DeviceRegistry
+from .wled_client import WledError
+
+log = logs.get_logger("geometry")
+
+ORIGINS = ("top-left", "top-right", "bottom-left", "bottom-right")
+DEFAULT_SIZE = (8, 8)
+# A host counts as in use for this long after something was shown on it
+IN_USE_SECONDS = 3600
+# After a failed /json/info, the default geometry is used this long before asking again
+RETRY_SECONDS = 60
+
+
+@lru_cache(maxsize=64)
+def index_map(width: int, height: int, serpentine: bool, origin: str) -> Optional[np.ndarray]:
+    """LED index -> row-major pixel index, or None when they are the same"""
+    led = np.arange(width * height)
+    row, col = led // width, led % width
+    if serpentine:
+        col = np.where(row % 2 == 1, width - 1 - col, col)
+    if origin.endswith("right"):
+        col = width - 1 - col
+    if origin.startswith("bottom"):
+        row = height - 1 - row
+    mapping = row * width + col
+    if np.array_equal(mapping, led):
+        return None
+    mapping.flags.writeable = False
+    return mapping
+
+
+class Geometry:
+    def __init__(self, width: int, height: int, serpentine: bool = False, origin: str = "top-left",
+                 source: str = "default"):
+        self.width = int(width)
+        self.height = int(height)
+        self.serpentine = bool(serpentine)
+        self.origin = origin if origin in ORIGINS else "top-left"
+        self.source = source
+
+    @property
+    def size(self) -> tuple:
+        return (self.width, self.height)
+
+    @property
+    def key(self) -> tuple:
+        """Everything that changes the rendered frames (render cache key part)"""
+        return (self.width, self.height, self.serpentine, self.origin)
+
+    def to_leds(self, pixels: np.ndarray) -> np.ndarray:
+        """(..., W*H, 3) row-major pixels -> LED order"""
+        mapping = index_map(self.width, self.height, self.serpentine, self.origin)
+        if mapping is None:
+            return pixels
+        return np.ascontiguousarray(pixels[..., mapping, :])
+
+    def as_dict(self) -> Dict:
+        return {"width": self.width, "height": self.height, "serpentine": self.serpentine,
+                "origin": self.origin, "source": self.source}
+
+
+def from_info(info: Dict) -> Optional[Geometry]:
+    """Geometry advertised by WLED /json/info, if any"""
+    leds = info.get("leds") or {}
+    matrix = leds.get("matrix") or {}
+    if matrix.get("w") and matrix.get("h"):
+        return Geometry(matrix["w"], matrix["h"], source="wled")
+    count = int(leds.get("count") or 0)
+    side = math.isqrt(count)
+    if count and side * side == count:
+        return Geometry(side, side, source="wled")
+    return None
+
+
+class GeometryRegistry:
+    """Configured geometries, plus the ones discovered from WLED (cached per host)"""
+
+    def __init__(self, panels: List[Dict], default: Geometry = None):
+        self.default = default or Geometry(*DEFAULT_SIZE)
+        self._configured = {
+            p["host"]: Geometry(p["width"], p["height"], p.get("serpentine", False),
+                                p.get("origin", "top-left"), source="config")
+            for p in panels if p.get("host") and p.get("width") and p.get("height")
+        }
+        self._discovered: Dict[str, Geometry] = {}
+        # host -> monotonic time before which a failed discovery is not retried
+        self._failed: Dict[str, float] = {}
+        self._used: Dict[str, float] = {}
+
+    def get(self, host: str) -> Geometry:
+        """Known geometry of host, without any network access"""
+        return self._configured.get(host) or self._discovered.get(host) or self.default
+
+    async def discover(self, host: str, devices: DeviceRegistry) -> Geometry:
+        """Geometry of host, from its /json/info the first time (run on the engine loop)"""
+        self._used[host] = time.monotonic()
+        known = self._configured.get(host) or self._discovered.get(host)
+        if known:
+            return known
+        if time.monotonic() < self._failed.get(host, 0.0):
+            # Unreachable a moment ago: do not make every frame wait for the info timeout again
+            return self.default
+        try:
+            geometry = from_info(await devices.info(host))
+        except (WledError, ValueError) as e:
+            self._failed[host] = time.monotonic() + RETRY_SECONDS
+            log.warning("Could not read /json/info, using the default geometry", host=host,
+                        retry_in=RETRY_SECONDS, error=e)
+            return self.default
+        self._failed.pop(host, None)
+        if geometry is None:
+            geometry = Geometry(*self.default.size, source="default")
+        self._discovered[host] = geometry
+        log.info("Panel geometry", host=host, width=geometry.width, height=geometry.height, source=geometry.source)
+        return geometry
+
+    def in_use(self, limit: int = 4) -> List[Geometry]:
+        """Distinct geometries of the hosts used lately, most recent first (at most limit)
+
+        Without network access; the default geometry when no host was used
+        within IN_USE_SECONDS.
+        """
+        since = time.monotonic() - IN_USE_SECONDS
+        distinct = {}
+        for host, used in sorted(self._used.items(), key=lambda item: item[1], reverse=True):
+            if used < since or len(distinct) >= limit:
+                break
+            geometry = self.get(host)
+            distinct.setdefault(geometry.key, geometry)
+        return list(distinct.values()) or [self.default]
+
+    def forget(self, host: Optional[str] = None):
+        if host is None:
+            self._discovered.clear()
+            self._failed.clear()
+            self._used.clear()
+        else:
+            self._discovered.pop(host, None)
+            self._failed.pop(host, None)
+            self._used.pop(host, None)
+
+    def all(self) -> Dict[str, Dict]:
+        known = {**self._discovered, **self._configured}
+        return {host: g.as_dict() for host, g in known.items()}
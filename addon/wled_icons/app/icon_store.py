@@ -0,0 +1,318 @@
+"""Custom (WI) icon storage.
+
+Icons live in a SQLite database (one row per icon) instead of a single JSON
+file rewritten on every save. Reads and writes touch one icon, each write
+is an atomic transaction (WAL journal, so a crash mid-write leaves the
+previous version intact), and recently used icons are kept decoded in
+memory.
+
+A row holds the metadata (name, fps, dates) as JSON and the frames as a
+compact binary WIC record (see ``icon_codec``): rendering decodes it
+straight to an array, and the "#RRGGBB" grids of the JSON API are only
+built when an icon is read through it. Rows written by older versions
+(grids inside the JSON) are converted once at startup; a row that cannot be
+converted is logged and left as it is, out of the index.
+
+A light in-memory index (id -> name, content hash) is loaded at startup so
+listings and cache keys never need to read icon payloads. The legacy
+``custom_icons.json`` is imported once and renamed to
+``custom_icons.json.migrated``. The search index follows every write.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from . import frames, icon_codec, logs
+from .search_index import SearchIndex
+
+log = logs.get_logger("icons")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS icons (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL DEFAULT '',
+    data TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    updated REAL NOT NULL DEFAULT (julianday('now')),
+    pixels BLOB
+)
+"""
+
+# Rows read per query when streaming the whole library
+PAGE_SIZE = 256
+
+Row = Tuple[str, Dict, bytes]
+
+# Metadata fields read by the service, and their types
+META_TYPES = {"name": str, "fps": int, "created": str, "modified": str}
+
+
+class IconStoreError(Exception):
+    """The icon database could not be read or written"""
+
+
+def content_hash(data: str, pixels: bytes = b"") -> str:
+    return hashlib.sha1(data.encode() + pixels).hexdigest()
+
+
+def check_meta(meta: Dict):
+    """Raise ValueError unless the known metadata fields have the types the API gives them"""
+    for key, kind in META_TYPES.items():
+        value = meta.get(key)
+        if value is not None and (not isinstance(value, kind) or isinstance(value, bool)):
+            raise ValueError(f"{key} invalide")
+    if meta.get("fps") is not None and meta["fps"] < 1:
+        raise ValueError("fps invalide")
+
+
+def split_icon(icon: Dict, check: bool = True) -> Tuple[Dict, bytes]:
+    """JSON API icon (grids of "#RRGGBB") -> (metadata, WIC record without metadata)
+
+    Raises ValueError on malformed grids, or malformed metadata when check is set.
+    """
+    meta = {key: value for key, value in icon.items() if key not in ("frames", "grid", "id") and value is not None}
+    if check:
+        check_meta(meta)
+    grids = icon.get("frames") or [icon.get("grid")]
+    if not isinstance(grids, list) or not grids or not grids[0] or not grids[0][0]:
+        raise ValueError("Icône sans pixels")
+    try:
+        rgb = frames.grids_to_array(grids)[..., :3]
+    except (TypeError, IndexError, AttributeError):
+        raise ValueError("Grilles de tailles différentes ou couleurs invalides")
+    return meta, icon_codec.encode(rgb)
+
+
+class IconStore:
+    def __init__(self, path: Path, cache_size: int = 256):
+        self.path = Path(path)
+        self.cache_size = cache_size
+        self._lock = threading.RLock()
+        self._cache: "OrderedDict[str, Tuple[Dict, np.ndarray]]" = OrderedDict()
+        self._index: Dict[str, Tuple[str, str]] = {}
+        self.search = SearchIndex()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(SCHEMA)
+        self._migrate_rows()
+        self._load_index()
+
+    def _load_index(self):
+        # Rows left unconverted by _migrate_rows are kept in the database but not served
+        for icon_id, name, digest in self._db.execute("SELECT id, name, hash FROM icons WHERE pixels IS NOT NULL"):
+            self._index[icon_id] = (name, digest)
+            self.search.add(icon_id, name)
+
+    def _migrate_rows(self):
+        """Convert rows holding JSON grids (older versions) to WIC records, in one transaction"""
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(icons)")}
+        if "pixels" not in columns:
+            self._db.execute("ALTER TABLE icons ADD COLUMN pixels BLOB")
+        rows = []
+        for icon_id, data in self._db.execute("SELECT id, data FROM icons WHERE pixels IS NULL"):
+            try:
+                icon = json.loads(data)
+                meta, record = split_icon(icon if isinstance(icon, dict) else {}, check=False)
+            except ValueError as e:
+                # Leave the row as it is (it can still be repaired by hand) rather than lose it
+                log.warning("Could not convert icon, skipped", icon_id=icon_id, error=e)
+                continue
+            rows.append(self._row(icon_id, meta, record))
+        if rows:
+            self._write(rows)
+
+    # --- Reads ---
+
+    def __contains__(self, icon_id: str) -> bool:
+        return icon_id in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def ids(self) -> List[str]:
+        return list(self._index)
+
+    def name(self, icon_id: str) -> Optional[str]:
+        entry = self._index.get(icon_id)
+        return entry[0] if entry else None
+
+    def content_hash(self, icon_id: str) -> Optional[str]:
+        """Hash of the stored metadata and pixels, changes on every update"""
+        entry = self._index.get(icon_id)
+        return entry[1] if entry else None
+
+    def _load(self, icon_id: str) -> Optional[Tuple[Dict, np.ndarray]]:
+        """(metadata, (N, H, W, 3) frames) of an icon, decoded once and kept in the LRU"""
+        with self._lock:
+            entry = self._cache.get(icon_id)
+            if entry is not None:
+                self._cache.move_to_end(icon_id)
+                return entry
+            if icon_id not in self._index:
+                return None
+            row = self._db.execute("SELECT data, pixels FROM icons WHERE id = ?", (icon_id,)).fetchone()
+            if row is None:
+                return None
+            entry = (json.loads(row[0]), icon_codec.decode(row[1]))
+            self._remember(icon_id, entry)
+            return entry
+
+    def get(self, icon_id: str) -> Optional[Dict]:
+        """Return the icon as the JSON API shows it (id, metadata and "#RRGGBB" frames), or None"""
+        entry = self._load(icon_id)
+        if entry is None:
+            return None
+        meta, rgb = entry
+        grids = icon_codec.to_grids(rgb)
+        # "grid" (first frame) is kept for clients of the single-frame format
+        return {**meta, "id": icon_id, "frames": grids, "grid": grids[0]}
+
+    def info(self, icon_id: str) -> Optional[Dict]:
+        """Metadata plus frame count and size, without building the grids"""
+        entry = self._load(icon_id)
+        if entry is None:
+            return None
+        meta, rgb = entry
+        n, h, w, _ = rgb.shape
+        return {**meta, "frames": n, "width": w, "height": h}
+
+    def rgba(self, icon_id: str) -> Optional[np.ndarray]:
+        """Opaque (N, H, W, 4) RGBA frames, ready for the render pipeline"""
+        entry = self._load(icon_id)
+        if entry is None:
+            return None
+        rgb = entry[1]
+        out = np.full(rgb.shape[:3] + (4,), 255, dtype=np.uint8)
+        out[..., :3] = rgb
+        return out
+
+    def record(self, icon_id: str) -> Optional[bytes]:
+        """The icon as a WIC record, metadata included"""
+        with self._lock:
+            if icon_id not in self._index:
+                return None
+            row = self._db.execute("SELECT data, pixels FROM icons WHERE id = ?", (icon_id,)).fetchone()
+        if row is None:
+            return None
+        return icon_codec.with_meta(row[1], json.loads(row[0]))
+
+    def rows(self) -> Iterator[Row]:
+        """Every icon as (id, metadata, WIC record without metadata), in id order
+
+        Read PAGE_SIZE rows at a time: memory stays constant whatever the
+        library size.
+        """
+        after = ""
+        while True:
+            with self._lock:
+                page = self._db.execute(
+                    "SELECT id, data, pixels FROM icons WHERE id > ? AND pixels IS NOT NULL ORDER BY id LIMIT ?", (after, PAGE_SIZE),
+                ).fetchall()
+            for icon_id, data, pixels in page:
+                yield icon_id, json.loads(data), pixels
+            if len(page) < PAGE_SIZE:
+                return
+            after = page[-1][0]
+
+    def items(self) -> Iterator[Tuple[str, Dict]]:
+        """Every icon as the JSON API shows it, streamed in id order"""
+        for icon_id, meta, pixels in self.rows():
+            grids = icon_codec.to_grids(icon_codec.decode(pixels))
+            yield icon_id, {**meta, "id": icon_id, "frames": grids, "grid": grids[0]}
+
+    # --- Writes ---
+
+    @staticmethod
+    def _row(icon_id: str, meta: Dict, record: bytes) -> Tuple:
+        data = json.dumps(meta, separators=(",", ":"), sort_keys=True)
+        return (icon_id, str(meta.get("name") or ""), data, record, content_hash(data, record))
+
+    def _write(self, rows: List[Tuple], replace: bool = True):
+        """Write rows in one transaction and update the index; the decoded cache drops them"""
+        verb = "INSERT" if replace else "INSERT OR IGNORE"
+        conflict = (" ON CONFLICT(id) DO UPDATE SET name = excluded.name, data = excluded.data, "
+                    "pixels = excluded.pixels, hash = excluded.hash, updated = julianday('now')") if replace else ""
+        with self._lock:
+            try:
+                self._db.execute("BEGIN")
+                self._db.executemany(
+                    f"{verb} INTO icons (id, name, data, pixels, hash) VALUES (?, ?, ?, ?, ?)" + conflict, rows)
+                self._db.execute("COMMIT")
+            except sqlite3.Error as e:
+                if self._db.in_transaction:
+                    self._db.execute("ROLLBACK")
+                raise IconStoreError(str(e))
+            for icon_id, name, _, _, digest in rows:
+                if replace or icon_id not in self._index:
+                    self._index[icon_id] = (name, digest)
+                    self.search.add(icon_id, name)
+                    self._cache.pop(icon_id, None)
+
+    def put(self, icon_id: str, icon: Dict):
+        """Save an icon given as the JSON API shows it; ValueError on malformed grids"""
+        meta, record = split_icon(icon)
+        self._write([self._row(icon_id, meta, record)])
+
+    def put_record(self, icon_id: str, record: bytes):
+        """Save an icon given as a WIC record; ValueError if it (or its metadata) is not valid"""
+        self.put_many([(icon_id, *icon_codec.split(record))])
+
+    def put_many(self, rows: Iterable[Row]):
+        """Save (id, metadata, WIC record) rows in a single transaction; ValueError on an invalid row"""
+        checked = []
+        for icon_id, meta, record in rows:
+            # Reject truncated or corrupted records before they reach the database
+            check_meta(meta)
+            icon_codec.decode(record)
+            checked.append(self._row(icon_id, meta, icon_codec.split(record)[1]))
+        if checked:
+            self._write(checked)
+
+    def delete(self, icon_id: str) -> bool:
+        with self._lock:
+            try:
+                deleted = self._db.execute("DELETE FROM icons WHERE id = ?", (icon_id,)).rowcount
+            except sqlite3.Error as e:
+                raise IconStoreError(str(e))
+            self._index.pop(icon_id, None)
+            self.search.remove(icon_id)
+            self._cache.pop(icon_id, None)
+            return deleted > 0
+
+    def _remember(self, icon_id: str, entry: Tuple[Dict, np.ndarray]):
+        self._cache[icon_id] = entry
+        self._cache.move_to_end(icon_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    # --- Migration ---
+
+    def import_json(self, json_file: Path) -> int:
+        """Import a legacy custom_icons.json in one transaction, then rename it"""
+        json_file = Path(json_file)
+        if not json_file.exists():
+            return 0
+        with open(json_file, "r") as f:
+            icons = json.load(f)
+        rows = []
+        for icon_id, icon in icons.items():
+            try:
+                rows.append(self._row(icon_id, *split_icon(icon, check=False)))
+            except ValueError:
+                continue
+        # Icons already in the database are newer than the legacy file
+        self._write(rows, replace=False)
+        json_file.rename(json_file.with_name(json_file.name + ".migrated"))
+        return len(rows)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,327 @@
+"""Persistent on-disk cache for LaMetric icon downloads.
+
+Blobs are stored content-addressed (``blobs/<sha256>``) and an index maps
+each icon id to its blob plus the HTTP validators needed to revalidate it.
+A hit is served from disk without touching the network; entries older than
+``max_age`` are revalidated in the background with a conditional GET.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+import requests
+
+from . import logs
+from .metrics import LAMETRIC_FETCH_SECONDS
+
+log = logs.get_logger("cache")
+
+LAMETRIC_URL = "https://developer.lametric.com/content/apps/icon_thumbs/{icon_id}"
+
+
+class IconNotFound(Exception):
+    """Raised when LaMetric does not know the requested icon"""
+
+
+class LaMetricCache:
+    def __init__(self, root: Path, max_bytes: int, max_age: float,
+                 negative_ttl: float = 3600.0, timeout: float = 8.0):
+        self.root = root
+        self.blobs_dir = root / "blobs"
+        self.index_file = root / "index.json"
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.negative_ttl = negative_ttl
+        self.timeout = timeout
+
+        self._lock = threading.RLock()
+        self._fetch_locks: Dict[str, threading.Lock] = {}
+        self._revalidating: set = set()
+        self._index: Dict[str, Dict] = {}
+        self._dirty = False
+        self._last_flush = 0.0
+        self.stats_counters = {
+            "hits": 0,
+            "misses": 0,
+            "negative_hits": 0,
+            "revalidations": 0,
+            "not_modified": 0,
+            "evictions": 0,
+            "errors": 0,
+        }
+        self._load_index()
+
+    # --- Index persistence ---
+
+    def _load_index(self):
+        if not self.index_file.exists():
+            return
+        try:
+            with open(self.index_file, 'r') as f:
+                self._index = json.load(f)
+        except Exception as e:
+            log.error("Could not load the LaMetric cache index", error=e)
+            self._index = {}
+        # Drop entries whose blob vanished
+        for icon_id, entry in list(self._index.items()):
+            if not entry.get("missing") and not self._blob_path(entry["sha256"]).exists():
+                del self._index[icon_id]
+
+    def _flush(self, force: bool = False):
+        """Write the index atomically; access-time only updates are batched"""
+        if not self._dirty:
+            return
+        now = time.time()
+        if not force and now - self._last_flush < 30:
+            return
+        try:
+            self.root.mkdir(parents=True, exist_ok=True)
+            tmp = self.index_file.with_suffix(".tmp")
+            with open(tmp, 'w') as f:
+                json.dump(self._index, f)
+            os.replace(tmp, self.index_file)
+            self._dirty = False
+            self._last_flush = now
+        except Exception as e:
+            log.error("Could not save the LaMetric cache index", error=e)
+
+    def _blob_path(self, sha: str) -> Path:
+        return self.blobs_dir / sha
+
+    # --- Public API ---
+
+    def get(self, icon_id: str) -> bytes:
+        """Return the icon bytes, downloading them only on a cache miss"""
+        data = self._lookup(icon_id)
+        if data is not None:
+            return data
+
+        # Serialize downloads of the same icon so concurrent misses fetch once
+        with self._lock:
+            fetch_lock = self._fetch_locks.setdefault(icon_id, threading.Lock())
+        with fetch_lock:
+            try:
+                data = self._lookup(icon_id, count=False)
+                if data is not None:
+                    return data
+                with self._lock:
+                    self.stats_counters["misses"] += 1
+                return self._fetch(icon_id)
+            finally:
+                # Waiters already holding this lock find the stored entry; later misses get a new one
+                with self._lock:
+                    if self._fetch_locks.get(icon_id) is fetch_lock:
+                        del self._fetch_locks[icon_id]
+
+    def content_hash(self, icon_id: str) -> Optional[str]:
+        """Return the sha256 of the cached blob for icon_id, if any"""
+        with self._lock:
+            entry = self._index.get(icon_id)
+            if entry and not entry.get("missing"):
+                return entry["sha256"]
+        return None
+
+    def peek(self, icon_id: str) -> Optional[str]:
+        """Return the blob hash without reading the blob.
+
+        Used when the caller may already hold a rendering of that content;
+        the entry stays warm in the LRU and is still revalidated.
+        """
+        with self._lock:
+            entry = self._index.get(icon_id)
+            if entry is None or entry.get("missing"):
+                return None
+            if not self._blob_path(entry["sha256"]).exists():
+                return None
+        return self._lookup(icon_id, count=False, read=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = [e for e in self._index.values() if not e.get("missing")]
+            return {
+                **self.stats_counters,
+                "entries": len(entries),
+                "negative_entries": len(self._index) - len(entries),
+                "bytes": self._total_bytes(),
+                "max_bytes": self.max_bytes,
+            }
+
+    def clear(self):
+        with self._lock:
+            for entry in self._index.values():
+                if not entry.get("missing"):
+                    self._blob_path(entry["sha256"]).unlink(missing_ok=True)
+            self._index = {}
+            self._dirty = True
+            self._flush(force=True)
+
+    # --- Internals ---
+
+    def _lookup(self, icon_id: str, count: bool = True, read: bool = True):
+        with self._lock:
+            entry = self._index.get(icon_id)
+            if entry is None:
+                return None
+            now = time.time()
+            if entry.get("missing"):
+                if now < entry["expires"]:
+                    if count:
+                        self.stats_counters["negative_hits"] += 1
+                    raise IconNotFound(icon_id)
+                del self._index[icon_id]
+                self._dirty = True
+                return None
+            sha = entry["sha256"]
+
+        # Disk I/O outside the lock: hits of other icons do not wait behind it
+        if read:
+            try:
+                data = self._blob_path(sha).read_bytes()
+            except OSError:
+                with self._lock:
+                    # Unless the entry was replaced meanwhile, its blob is gone
+                    if self._index.get(icon_id, {}).get("sha256") == sha:
+                        del self._index[icon_id]
+                        self._dirty = True
+                return None
+        else:
+            data = sha
+
+        with self._lock:
+            entry = self._index.get(icon_id)
+            if entry is None or entry.get("sha256") != sha:
+                # Evicted or replaced while reading: the bytes read are still a valid answer
+                return data
+            if count:
+                self.stats_counters["hits"] += 1
+            entry["last_access"] = now
+            self._dirty = True
+            stale = now - entry.get("checked", 0) > self.max_age
+            self._flush()
+
+        if stale:
+            self._revalidate_in_background(icon_id)
+        return data
+
+    def _fetch(self, icon_id: str) -> bytes:
+        url = LAMETRIC_URL.format(icon_id=icon_id)
+        try:
+            with LAMETRIC_FETCH_SECONDS.time():
+                r = requests.get(url, timeout=self.timeout)
+        except requests.RequestException:
+            with self._lock:
+                self.stats_counters["errors"] += 1
+            raise
+        if r.status_code in (404, 410):
+            self._store_missing(icon_id)
+            raise IconNotFound(icon_id)
+        r.raise_for_status()
+        self._store(icon_id, r.content, r.headers)
+        return r.content
+
+    def _revalidate_in_background(self, icon_id: str):
+        with self._lock:
+            if icon_id in self._revalidating:
+                return
+            self._revalidating.add(icon_id)
+        threading.Thread(target=self._revalidate, args=(icon_id,), daemon=True).start()
+
+    def _revalidate(self, icon_id: str):
+        """Conditional GET; on network errors the stale copy keeps being served"""
+        try:
+            with self._lock:
+                entry = dict(self._index.get(icon_id) or {})
+                self.stats_counters["revalidations"] += 1
+            headers = {}
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+            url = LAMETRIC_URL.format(icon_id=icon_id)
+            with LAMETRIC_FETCH_SECONDS.time():
+                r = requests.get(url, headers=headers, timeout=self.timeout)
+            if r.status_code == 304:
+                with self._lock:
+                    self.stats_counters["not_modified"] += 1
+                    current = self._index.get(icon_id)
+                    if current and not current.get("missing"):
+                        current["checked"] = time.time()
+                        self._dirty = True
+                        self._flush(force=True)
+            elif r.status_code in (404, 410):
+                self._store_missing(icon_id)
+            elif r.ok:
+                self._store(icon_id, r.content, r.headers)
+        except requests.RequestException as e:
+            with self._lock:
+                self.stats_counters["errors"] += 1
+            log.warning("LaMetric revalidation failed", icon_id=icon_id, error=e)
+        finally:
+            with self._lock:
+                self._revalidating.discard(icon_id)
+
+    def _store(self, icon_id: str, content: bytes, headers):
+        sha = hashlib.sha256(content).hexdigest()
+        now = time.time()
+        with self._lock:
+            self.blobs_dir.mkdir(parents=True, exist_ok=True)
+            path = self._blob_path(sha)
+            if not path.exists():
+                tmp = path.with_suffix(".tmp")
+                tmp.write_bytes(content)
+                os.replace(tmp, path)
+            old = self._index.get(icon_id)
+            self._index[icon_id] = {
+                "sha256": sha,
+                "size": len(content),
+                "etag": headers.get("ETag"),
+                "last_modified": headers.get("Last-Modified"),
+                "checked": now,
+                "last_access": now,
+            }
+            if old and not old.get("missing") and old["sha256"] != sha:
+                self._release_blob(old["sha256"])
+            self._dirty = True
+            self._evict()
+            self._flush(force=True)
+
+    def _store_missing(self, icon_id: str):
+        with self._lock:
+            old = self._index.get(icon_id)
+            self._index[icon_id] = {"missing": True, "expires": time.time() + self.negative_ttl}
+            if old and not old.get("missing"):
+                self._release_blob(old["sha256"])
+            self._dirty = True
+            self._flush(force=True)
+
+    def _release_blob(self, sha: str):
+        """Delete a blob once no index entry references it"""
+        if any(e.get("sha256") == sha for e in self._index.values()):
+            return
+        self._blob_path(sha).unlink(missing_ok=True)
+
+    def _total_bytes(self) -> int:
+        blobs = {e["sha256"]: e["size"] for e in self._index.values() if not e.get("missing")}
+        return sum(blobs.values())
+
+    def _evict(self):
+        """Drop least recently used icons until the cache fits in max_bytes"""
+        total = self._total_bytes()
+        if total <= self.max_bytes:
+            return
+        lru = sorted(
+            (item for item in self._index.items() if not item[1].get("missing")),
+            key=lambda item: item[1].get("last_access", 0),
+        )
+        for icon_id, entry in lru:
+            if total <= self.max_bytes:
+                break
+            del self._index[icon_id]
+            if not any(e.get("sha256") == entry["sha256"] for e in self._index.values()):
+                self._blob_path(entry["sha256"]).unlink(missing_ok=True)
+                total -= entry["size"]
+            self.stats_counters["evictions"] += 1
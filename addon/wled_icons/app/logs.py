@@ -0,0 +1,84 @@
+"""Leveled, structured logging.
+
+Every module logs through ``get_logger(component)``; keyword arguments
+become ``key=value`` fields after the message::
+
+    log.info("Animation started", host=host, frames=12)
+    2026-01-01 12:00:00 INFO    [engine] Animation started host=192.168.1.100 frames=12
+
+Messages below the ``log_level`` option are rejected before anything is
+formatted, and per-frame debug output goes through ``frame_sampled()`` so
+that only one frame in ``FRAME_SAMPLE_EVERY`` per host is logged.
+"""
+import logging
+import sys
+from typing import Dict
+
+ROOT_LOGGER = "wled_icons"
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+
+# Per-frame debug lines: one frame in this many, per host
+FRAME_SAMPLE_EVERY = 50
+
+_LOGGING_KWARGS = {"exc_info", "stack_info", "stacklevel", "extra"}
+
+
+def _field(value) -> str:
+    text = str(value)
+    if not text or any(c in text for c in ' ="'):
+        return '"' + text.replace('"', '\\"') + '"'
+    return text
+
+
+class StructuredFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        component = record.name.rsplit(".", 1)[-1]
+        line = f"{self.formatTime(record, '%Y-%m-%d %H:%M:%S')} {record.levelname:<7} [{component}] {record.getMessage()}"
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{key}={_field(value)}" for key, value in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class StructuredLogger(logging.LoggerAdapter):
+    """Logger whose extra keyword arguments are structured fields"""
+
+    def process(self, msg, kwargs):
+        # Only called once the level check passed
+        fields = {key: kwargs.pop(key) for key in list(kwargs) if key not in _LOGGING_KWARGS}
+        if fields:
+            kwargs["extra"] = {**kwargs.get("extra", {}), "fields": fields}
+        return msg, kwargs
+
+
+def get_logger(component: str) -> StructuredLogger:
+    return StructuredLogger(logging.getLogger(f"{ROOT_LOGGER}.{component}"), {})
+
+
+_frame_counts: Dict[str, int] = {}
+
+
+def frame_sampled(host: str) -> bool:
+    """True for one frame in FRAME_SAMPLE_EVERY on host (the first one included)"""
+    count = _frame_counts.get(host, 0)
+    _frame_counts[host] = count + 1
+    return count % FRAME_SAMPLE_EVERY == 0
+
+
+def setup(level: str = "INFO"):
+    """Send the service logs to stdout at the log_level option"""
+    level = str(level).upper()
+    if level not in LEVELS:
+        level = "INFO"
+    root = logging.getLogger(ROOT_LOGGER)
+    if not root.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(StructuredFormatter())
+        root.addHandler(handler)
+        root.propagate = False
+    root.setLevel(level)
+    logging.getLogger("uvicorn.error").setLevel(level)
+    # One line per HTTP request: only worth it when debugging
+    logging.getLogger("uvicorn.access").setLevel(logging.DEBUG if level == "DEBUG" else logging.WARNING)
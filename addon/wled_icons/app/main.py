@@ -1,60 +1,147 @@
-from fastapi import FastAPI, HTTPException, Response
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import FastAPI, Header, HTTPException, Request, Response
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict
+from typing import Iterator, List, Optional, Dict, Union
 from pathlib import Path
 import requests
 from io import BytesIO
-from PIL import Image, ImageSequence, ImageDraw, ImageFilter
-import time
+from PIL import Image, ImageSequence
+import base64
+import hashlib
 import json
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import numpy as np
+
+from . import frames, icon_codec, logs, metrics, preview
+from .settings import DATA_DIR, get_option
+from .lametric_cache import LaMetricCache, IconNotFound
+from .render_cache import RenderCache
+from .transport import TRANSPORTS, GroupTransport, HttpTransport, create_transport
+from .engine import AnimationEngine, Player
+from .display_queue import DisplayQueue, QueueEntry
+from .frame_stream import FrameStream
+from .wled_client import WledClient, WledError
+from .devices import DeviceRegistry
+from .icon_store import IconStore, IconStoreError, check_meta, split_icon
+from .playlist import PlaylistItem, PlaylistJobs, PlaylistPlayer
+from .geometry import Geometry, GeometryRegistry
 
 app = FastAPI(title="WLED Icons Service", version="0.6.4")
 
-# Global animation control
-animation_lock = threading.Lock()
-stop_animation_event = threading.Event()
-current_animation_thread = None
+logs.setup(get_option("log_level", "INFO"))
+log = logs.get_logger("api")
 
-# Data storage path
-DATA_DIR = Path("/data")
+# Data storage path (custom_icons.json is the legacy store, migrated to icons.db)
 ICONS_FILE = DATA_DIR / "custom_icons.json"
+ICONS_DB = DATA_DIR / "icons.db"
+LAMETRIC_CACHE_DIR = DATA_DIR / "lametric_cache"
 
 # HTML file path
 HTML_FILE = Path(__file__).parent / "index.html"
 CSS_FILE = Path(__file__).parent / "styles.css"
 JS_FILE = Path(__file__).parent / "app.js"
 
-print(f"[STARTUP] Data directory: {DATA_DIR}")
-print(f"[STARTUP] Icons file: {ICONS_FILE}")
-print(f"[STARTUP] HTML file: {HTML_FILE}")
-print(f"[STARTUP] CSS file: {CSS_FILE}")
-print(f"[STARTUP] JS file: {JS_FILE}")
-
-# --- Icon Storage Helpers ---
-
-def load_custom_icons() -> Dict:
-    """Load custom icons from persistent storage"""
-    if not ICONS_FILE.exists():
-        return {}
-    try:
-        with open(ICONS_FILE, 'r') as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"Error loading icons: {e}")
-        return {}
-
-def save_custom_icons(icons: Dict):
-    """Save custom icons to persistent storage"""
-    DATA_DIR.mkdir(exist_ok=True)
-    try:
-        with open(ICONS_FILE, 'w') as f:
-            json.dump(icons, f, indent=2)
-    except Exception as e:
-        print(f"Error saving icons: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to save: {e}")
+log.info("Starting", data_dir=DATA_DIR, icons_db=ICONS_DB)
+log.debug("Web UI files", html=HTML_FILE, css=CSS_FILE, js=JS_FILE)
+
+# LaMetric downloads are cached on disk so repeated icons skip the WAN round-trip
+lametric_cache = LaMetricCache(
+    LAMETRIC_CACHE_DIR,
+    max_bytes=int(get_option("lametric_cache_mb", 20)) * 1024 * 1024,
+    max_age=float(get_option("lametric_cache_max_age_hours", 168)) * 3600,
+)
+
+# Animation frames transport (http, or realtime UDP: ddp, dnrgb, drgb)
+DEFAULT_TRANSPORT = get_option("transport", "http")
+REALTIME_TIMEOUT = int(get_option("realtime_timeout", 2))
+
+# Panel sizes and wiring: configured per host, else read from WLED /json/info
+geometries = GeometryRegistry(get_option("panels", []))
+FIT_MODES = ("contain", "stretch")
+
+# Rotations rendered when a custom icon is saved, for the most recently used panel geometries
+COMPILED_ROTATIONS = (0, 90, 180, 270)
+COMPILED_GEOMETRIES = 4
+# Compilations run one at a time, off the request threads
+compiler = ThreadPoolExecutor(max_workers=1, thread_name_prefix="icon-compiler")
+compiling: set = set()
+compiling_lock = threading.Lock()
+
+# Animated LaMetric icons being decoded while they play, by render cache key
+decoding: Dict[tuple, FrameStream] = {}
+decoding_lock = threading.Lock()
+STREAM_TIMEOUT = 30.0
+
+# Bulk import: icons written per transaction, longest accepted line, errors reported
+IMPORT_BATCH = 256
+IMPORT_MAX_LINE = 1024 * 1024
+IMPORT_MAX_ERRORS = 100
+
+# Named groups of panels: {"name": ..., "hosts": [...], "columns": ...}
+GROUPS: Dict[str, Dict] = {g["name"]: g for g in get_option("groups", []) if g.get("name") and g.get("hosts")}
+
+# Animations: one player per host, scheduled on a single event loop that
+# also owns the pooled keep-alive WLED client
+engine = AnimationEngine()
+display_queue = DisplayQueue(engine)
+wled = WledClient(
+    timeout=float(get_option("wled_timeout", 5)),
+    retries=int(get_option("wled_retries", 1)),
+    max_concurrency=int(get_option("wled_max_concurrency", 2)),
+    keyframe_interval=int(get_option("keyframe_interval", 30)),
+)
+
+# Device capabilities (/json/info, read once) and state, cached and polled in the background
+devices = DeviceRegistry(
+    wled,
+    state_ttl=float(get_option("device_state_ttl", 5)),
+    poll_interval=float(get_option("device_poll_interval", 30)),
+    hosts=dict.fromkeys([p["host"] for p in get_option("panels", []) if p.get("host")]
+                        + [h for g in GROUPS.values() for h in g["hosts"]]),
+)
+# Panels playing an animation are not polled
+engine.call(devices.start(busy=lambda host: engine.player(host) is not None))
+
+
+@app.on_event("shutdown")
+def shutdown_engine():
+    compiler.shutdown(wait=False, cancel_futures=True)
+    engine.shutdown(devices.aclose(), wled.aclose())
+
+# Bulk display playlists by job id
+playlists = PlaylistJobs()
+
+# Rendered (colors, duration) sequences, so repeated triggers skip decode/transform
+render_cache = RenderCache(max_bytes=int(get_option("render_cache_mb", 16)) * 1024 * 1024)
+previews = preview.PreviewCache(max_bytes=4 * 1024 * 1024)
+
+# Gauges read from the service state when /metrics is scraped
+metrics.ACTIVE_PLAYERS.set_function(lambda: len(engine.players()))
+metrics.RENDER_CACHE_BYTES.set_function(lambda: render_cache.stats()["bytes"])
+metrics.RENDER_CACHE_ENTRIES.set_function(lambda: render_cache.stats()["entries"])
+metrics.LAMETRIC_CACHE_BYTES.set_function(lambda: lametric_cache.stats()["bytes"])
+metrics.LAMETRIC_CACHE_ENTRIES.set_function(lambda: lametric_cache.stats()["entries"])
+metrics.WLED_RTT_SECONDS.set_function(
+    lambda: {(host,): f["rtt_ms"] / 1000 for host, f in wled.flow_stats().items() if f["rtt_ms"] is not None})
+metrics.WLED_BREAKER_OPEN.set_function(
+    lambda: {(host,): int(f["breaker"] != "closed") for host, f in wled.flow_stats().items()})
+
+# --- Icon Storage ---
+
+# Custom icons: one SQLite row per icon, recently used ones kept parsed in memory
+icon_store = IconStore(ICONS_DB)
+try:
+    migrated = icon_store.import_json(ICONS_FILE)
+    if migrated:
+        log.info("Migrated custom icons", count=migrated, source=ICONS_FILE)
+except Exception as e:
+    log.error("Could not migrate custom icons", source=ICONS_FILE, error=e)
+metrics.CUSTOM_ICONS.set_function(lambda: len(icon_store))
 
 # --- Helpers ---
 
@@ -67,75 +154,27 @@ def hex_to_rgb(hex_color: str) -> tuple[int, int, int]:
     return tuple(int(s[i:i+2], 16) for i in (0,2,4))  # type: ignore
 
 
-def recolor_nontransparent(img: Image.Image, rgb: tuple[int,int,int]) -> Image.Image:
-    img = img.convert("RGBA")
-    data = img.getdata()
-    out = []
-    for r,g,b,a in data:
-        if a > 0:
-            out.append((*rgb, a))
-        else:
-            out.append((r,g,b,a))
-    out_img = Image.new("RGBA", img.size)
-    out_img.putdata(out)
-    return out_img
-
-
-def frame_to_colors(frame: Image.Image, rotate: int = 0, flip_h: bool = False, flip_v: bool = False) -> List[List[int]]:
-    """Convert 8x8 image to WLED color array with optional transformations"""
-    # Apply transformations
-    if rotate:
-        frame = frame.rotate(-rotate, expand=False)  # Negative because PIL rotates counter-clockwise
-    if flip_h:
-        frame = frame.transpose(Image.FLIP_LEFT_RIGHT)
-    if flip_v:
-        frame = frame.transpose(Image.FLIP_TOP_BOTTOM)
-    
-    pixels: List[List[int]] = []
-    data = frame.getdata()
-    for y in range(8):
-        for x in range(8):
-            r, g, b, a = data[y * 8 + x]
-            if a < 10:
-                r, g, b = 0, 0, 0
-            pixels.append([r, g, b])
-    return pixels
-
-
-def send_frame(host: str, colors: List[List[int]], brightness: int = 255):
-    print(f"[SEND_FRAME] Sending to {host} with brightness {brightness}")
-    print(f"[SEND_FRAME] Colors array dimensions: {len(colors)}x{len(colors[0]) if colors else 0}")
-    
-    url = f"http://{host}/json/state"
-    payload = {"seg": [{"id": 0, "i": colors, "bri": brightness}]}
-    
-    print(f"[SEND_FRAME] Payload: {payload}")
-    
-    try:
-        r = requests.post(url, json=payload, timeout=5)
-        print(f"[SEND_FRAME] WLED response: {r.status_code}")
-        if not r.ok:
-            print(f"[SEND_FRAME] WLED error: {r.text}")
-            raise HTTPException(status_code=502, detail=f"WLED error: {r.status_code} {r.text}")
-        else:
-            print(f"[SEND_FRAME] Success!")
-    except requests.exceptions.RequestException as e:
-        print(f"[SEND_FRAME] Request exception: {e}")
-        raise HTTPException(status_code=502, detail=f"Connection error: {str(e)}")
+def pick_transport(host: str, requested: Optional[str]) -> str:
+    """Transport asked for, else the default one if the device supports it, else http"""
+    return requested or devices.transport(host, DEFAULT_TRANSPORT)
 
 
-# rasterize_svg removed - SVG endpoint deprecated
-    img = binary.resize((8, 8), Image.Resampling.NEAREST)
-    
-    if color:
-        img = recolor_nontransparent(img, hex_to_rgb(color))
-    
-    return img
+async def wled_call(coro):
+    """Await a WLED client call on the engine loop, mapping failures to 502"""
+    try:
+        return await engine.run(coro)
+    except WledError as e:
+        raise HTTPException(status_code=502, detail=str(e))
 
 
 # --- Models ---
 class IconRequest(BaseModel):
-    host: str = Field(..., description="Adresse IP/host WLED")
+    host: Optional[str] = Field(None, description="Adresse IP/host WLED")
+    hosts: Optional[List[str]] = Field(None, description="Plusieurs hôtes WLED, affichage synchronisé")
+    group: Optional[str] = Field(None, description="Nom d'un groupe défini dans l'option groups")
+    tile: bool = Field(False, description="Découper l'image sur la grille de panneaux au lieu de la dupliquer")
+    columns: Optional[int] = Field(None, ge=1, description="Colonnes de la grille pour tile (défaut: colonnes du groupe, sinon une rangée)")
+    fit: str = Field("contain", description="Adaptation à la taille du panneau: contain (bandes noires) ou stretch")
     icon_id: str = Field(..., description="ID icône LaMetric, ex: 1486")
     color: Optional[str] = Field(None, description="Couleur hex pour recolorer")
     rotate: int = Field(0, description="Rotation en degrés: 0, 90, 180, 270")
@@ -145,6 +184,10 @@ class IconRequest(BaseModel):
     fps: Optional[int] = Field(None, description="Forcer FPS pour les GIFs (sinon utiliser la durée GIF)")
     loop: int = Field(1, description="Nombre de boucles pour les GIFs")
     brightness: int = Field(255, ge=0, le=255, description="Luminosité (0-255)")
+    transport: Optional[str] = Field(None, description="Transport des animations: http, ddp, dnrgb, drgb (défaut: option transport)")
+    priority: Optional[int] = Field(None, description="Passer par la file d'attente de l'hôte avec cette priorité (plus grand = plus prioritaire)")
+    ttl: Optional[float] = Field(None, gt=0, description="File d'attente: durée de vie de l'entrée en secondes, attente comprise")
+    key: Optional[str] = Field(None, description="File d'attente: une nouvelle entrée remplace celles de même clé (défaut: icon_id)")
 
 
 # SvgRequest removed - deprecated endpoint
@@ -155,137 +198,396 @@ class PngRequest(BaseModel):
     png: bytes = Field(..., description="PNG 8x8 en bytes base64")
 
 
-# --- Endpoints ---
-@app.post("/show/icon")
-def show_icon(req: IconRequest):
-    """Display LaMetric icon (8x8 JPG) or custom WI icon"""
-    global current_animation_thread
-    
-    print(f"[SHOW_ICON] Received request for icon_id: {req.icon_id}")
+# --- Sequence Rendering ---
+
+@lru_cache(maxsize=1024)
+def icon_thumbnail(icon_id: str, content_hash: str) -> str:
+    """First frame of a custom icon as a PNG data URI (memoized per content hash)"""
+    stack = icon_store.rgba(icon_id)
+    buf = BytesIO()
+    Image.fromarray(stack[0], "RGBA").save(buf, format="PNG", optimize=True)
+    return "data:image/png;base64," + base64.b64encode(buf.getvalue()).decode()
+
+
+def icon_meta(icon_id: str, info: Dict) -> Dict:
+    """Lightweight description of a custom icon for listings (info from icon_store.info)"""
+    return {
+        "id": icon_id,
+        "name": info.get("name", ""),
+        "frame_count": info["frames"],
+        "fps": info.get("fps", 8),
+        "created": info.get("created"),
+        "modified": info.get("modified"),
+        "thumbnail": icon_thumbnail(icon_id, icon_store.content_hash(icon_id)),
+    }
+
+
+def render_frames(stack: np.ndarray, color, req: IconRequest, geometry: Geometry,
+                  grid: Optional[tuple[int, int]] = None) -> np.ndarray:
+    """Fit, transform and map frames to the LED order of the target panels"""
+    with metrics.RENDER_SECONDS.time():
+        rendered = frames.render(stack, color, req.rotate, req.flip_h, req.flip_v,
+                                 size=geometry.size, grid=grid, mode=req.fit)
+        return geometry.to_leds(rendered)
+
+
+def collapse_frames(rendered: np.ndarray, durations: List[float]) -> List[tuple[np.ndarray, float]]:
+    """(pixels, duration) sequence where runs of identical frames become one longer frame"""
+    if len(rendered) > 1:
+        flat = rendered.reshape(len(rendered), -1)
+        starts = np.flatnonzero(np.r_[True, np.any(flat[1:] != flat[:-1], axis=1)])
+    else:
+        starts = np.arange(len(rendered))
+    totals = np.add.reduceat(np.asarray(durations, dtype=float), starts) if len(starts) else []
+    return [(rendered[i], float(total)) for i, total in zip(starts, totals)]
+
+
+def render_custom_sequence(icon_id: str, req: IconRequest, geometry: Geometry,
+                           grid: Optional[tuple[int, int]] = None) -> List[tuple[np.ndarray, float]]:
+    """Render a custom WI icon into a (pixels, duration) sequence"""
+    with metrics.DECODE_SECONDS.labels("custom").time():
+        stack = icon_store.rgba(icon_id)
+    if stack is None:
+        raise HTTPException(status_code=404, detail=f"Icône personnalisée {icon_id} introuvable")
+    # Icons stored before fps was validated may hold anything there
+    base_fps = icon_store.info(icon_id).get("fps") or 8
+    base_fps = max(1, base_fps) if isinstance(base_fps, (int, float)) else 8
     
-    sequence: List[tuple[List[List[int]], float]] = []
+    # Determine FPS
+    fps = req.fps if (req.fps and req.fps > 0) else base_fps
+    duration = 1.0 / fps
     
-    # --- 1. PREPARE SEQUENCE ---
+    # If animation disabled, just take first frame
+    if not req.animate:
+        stack = stack[:1]
+
+    # WI icons are drawn opaque; recoloring only applies to LaMetric icons
+    rendered = render_frames(stack, None, req, geometry, grid)
+    return collapse_frames(rendered, [duration] * len(rendered))
+
+
+def gif_frame_duration(frame: Image.Image, req: IconRequest) -> float:
+    """Display time of a GIF frame in seconds (req.fps overrides the GIF timing)"""
+    if req.fps and req.fps > 0:
+        return 1.0 / req.fps
+    # Like browsers, treat 0-10 ms frames as 100 ms
+    duration = frame.info.get("duration", 100) / 1000.0
+    return duration if duration > 0.01 else 0.1
+
+
+def decode_lametric(content: bytes, req: IconRequest) -> tuple[np.ndarray, List[float]]:
+    """Decode a LaMetric icon (JPG/PNG/GIF) into RGBA frames and their durations"""
+    img = Image.open(BytesIO(content))
     
+    # Handle Animation
+    if getattr(img, 'is_animated', False) and req.animate:
+        images = []
+        durations = []
+        for frame in ImageSequence.Iterator(img):
+            images.append(frame.convert("RGBA"))
+            durations.append(gif_frame_duration(frame, req))
+        stack = frames.images_to_array(images)
+    else:
+        # Static image
+        if getattr(img, 'is_animated', False):
+            img.seek(0)
+        stack = frames.image_to_array(img)[None]
+        durations = [1.0]
+    return stack, durations
+
+
+def render_lametric_sequence(content: bytes, req: IconRequest, geometry: Geometry,
+                             grid: Optional[tuple[int, int]] = None) -> List[tuple[np.ndarray, float]]:
+    """Decode a LaMetric icon into a (pixels, duration) sequence"""
+    with metrics.DECODE_SECONDS.labels("lametric").time():
+        stack, durations = decode_lametric(content, req)
+    color = hex_to_rgb(req.color) if req.color else None
+    rendered = render_frames(stack, color, req, geometry, grid)
+    return collapse_frames(rendered, durations)
+
+
+def is_animated(content: bytes) -> bool:
+    """Whether an image has several frames (reads headers only)"""
+    return getattr(Image.open(BytesIO(content)), "is_animated", False)
+
+
+def iter_lametric_frames(content: bytes, req: IconRequest, geometry: Geometry,
+                         grid: Optional[tuple[int, int]] = None) -> Iterator[tuple[np.ndarray, float]]:
+    """Decode and render an animated LaMetric icon one frame at a time"""
+    color = hex_to_rgb(req.color) if req.color else None
+    img = Image.open(BytesIO(content))
+    decode_time = 0.0
+    for frame in ImageSequence.Iterator(img):
+        started = time.perf_counter()
+        rendered = render_frames(frames.image_to_array(frame)[None], color, req, geometry, grid)[0]
+        duration = gif_frame_duration(frame, req)
+        decode_time += time.perf_counter() - started
+        yield rendered, duration
+    metrics.DECODE_SECONDS.labels("lametric").observe(decode_time)
+
+
+def stream_lametric_sequence(key: tuple, content: bytes, req: IconRequest, geometry: Geometry,
+                             grid: Optional[tuple[int, int]] = None) -> FrameStream:
+    """Start decoding an animated LaMetric icon in the background; the render cache gets the result"""
+    def done(stream: FrameStream):
+        if stream.error is None:
+            render_cache.put(key, list(stream))
+        with decoding_lock:
+            if decoding.get(key) is stream:
+                del decoding[key]
+
+    # Under the lock: concurrent requests share one decode, and done() waits until it is registered
+    with decoding_lock:
+        stream = decoding.get(key)
+        if stream is None:
+            stream = decoding[key] = FrameStream(iter_lametric_frames(content, req, geometry, grid), done)
+    return stream
+
+
+def render_params(req: IconRequest, geometry: Geometry, grid: Optional[tuple[int, int]] = None) -> tuple:
+    """Request fields and target layout that change the rendered frames (part of the cache key)"""
+    color = req.color.strip().lstrip('#').upper() if req.color else None
+    return (color, req.rotate % 360, req.flip_h, req.flip_v, req.fps or None, req.animate,
+            req.fit, geometry.key, grid)
+
+
+def resolve_targets(req: IconRequest) -> tuple[List[str], Optional[tuple[int, int]]]:
+    """Hosts a request is for, and the (columns, rows) wall grid when tiling"""
+    if sum(bool(x) for x in (req.host, req.hosts, req.group)) != 1:
+        raise HTTPException(status_code=400, detail="Indiquer exactement un de host, hosts ou group")
+    group = {}
+    if req.group:
+        if req.group not in GROUPS:
+            raise HTTPException(status_code=404, detail=f"Groupe inconnu: {req.group}")
+        group = GROUPS[req.group]
+        hosts = group["hosts"]
+    else:
+        hosts = [req.host] if req.host else req.hosts
+    hosts = list(dict.fromkeys(hosts))
+    if not req.tile or len(hosts) < 2:
+        return hosts, None
+    columns = min(req.columns or group.get("columns") or len(hosts), len(hosts))
+    return hosts, (columns, -(-len(hosts) // columns))
+
+
+def prepare_sequence(req: IconRequest, geometry: Geometry, grid: Optional[tuple[int, int]] = None,
+                     stream: bool = False) -> List[tuple[np.ndarray, float]]:
+    """Return the rendered sequence for a request, from the render cache when possible
+
+    With stream=True, an animated LaMetric icon that is not in the cache is
+    returned as a FrameStream as soon as its first frame is decoded; the
+    rest is decoded while it plays.
+    """
     # CASE A: Custom WI Icon
     if req.icon_id.startswith("WI"):
-        icons = load_custom_icons()
-        if req.icon_id not in icons:
+        content_hash = icon_store.content_hash(req.icon_id)
+        if content_hash is None:
             raise HTTPException(status_code=404, detail=f"Icône personnalisée {req.icon_id} introuvable")
         
-        icon_data = icons[req.icon_id]
-        frames_data = icon_data.get("frames") or [icon_data.get("grid")]
-        base_fps = icon_data.get("fps", 8)
-        
-        # Determine FPS
-        fps = req.fps if (req.fps and req.fps > 0) else base_fps
-        duration = 1.0 / fps
-        
-        # If animation disabled, just take first frame
-        if not req.animate:
-            frames_data = [frames_data[0]]
-            
-        for grid in frames_data:
-            # Convert grid to colors
-            if req.rotate or req.flip_h or req.flip_v:
-                # Build 8x8 image for transformations
-                img = Image.new("RGB", (8, 8))
-                pixels = img.load()
-                for y in range(8):
-                    for x in range(8):
-                        rgb = hex_to_rgb(grid[y][x])
-                        pixels[x, y] = rgb
-                colors = frame_to_colors(img, req.rotate, req.flip_h, req.flip_v)
-            else:
-                # Direct conversion
-                colors = []
-                for row in grid:
-                    for hex_color in row:
-                        rgb = hex_to_rgb(hex_color)
-                        colors.append(list(rgb))
-            
-            sequence.append((colors, duration))
+        key = (req.icon_id, content_hash, *render_params(req, geometry, grid))
+        sequence = render_cache.get(key)
+        if sequence is None:
+            sequence = render_custom_sequence(req.icon_id, req, geometry, grid)
+            render_cache.put(key, sequence)
+        return sequence
 
     # CASE B: LaMetric Icon
-    else:
-        url = f"https://developer.lametric.com/content/apps/icon_thumbs/{req.icon_id}"
-        try:
-            r = requests.get(url, timeout=8)
-            if not r.ok:
-                raise HTTPException(status_code=404, detail=f"Icône LaMetric {req.icon_id} introuvable")
-            
-            img = Image.open(BytesIO(r.content))
-            
-            # Handle Animation
-            if getattr(img, 'is_animated', False) and req.animate:
-                for frame in ImageSequence.Iterator(img):
-                    f = frame.convert("RGBA")
-                    if f.size != (8, 8):
-                        f = f.resize((8, 8), Image.Resampling.NEAREST)
-                    if req.color:
-                        f = recolor_nontransparent(f, hex_to_rgb(req.color))
-                    
-                    # Calculate duration
-                    frame_duration = frame.info.get("duration", 100) / 1000.0
-                    if req.fps and req.fps > 0:
-                        frame_duration = 1.0 / req.fps
-                        
-                    colors = frame_to_colors(f, req.rotate, req.flip_h, req.flip_v)
-                    sequence.append((colors, frame_duration))
-            else:
-                # Static image
-                if getattr(img, 'is_animated', False):
-                    img.seek(0)
-                img = img.convert("RGBA")
-                if req.color:
-                    img = recolor_nontransparent(img, hex_to_rgb(req.color))
-                colors = frame_to_colors(img, req.rotate, req.flip_h, req.flip_v)
-                sequence.append((colors, 1.0))
-                
-        except requests.RequestException as e:
-            raise HTTPException(status_code=502, detail=f"Erreur téléchargement: {str(e)}")
+    try:
+        content_hash = lametric_cache.peek(req.icon_id)
+        if content_hash is not None:
+            sequence = render_cache.get((req.icon_id, content_hash, *render_params(req, geometry, grid)))
+            if sequence is not None:
+                return sequence
+        content = lametric_cache.get(req.icon_id)
+    except IconNotFound:
+        raise HTTPException(status_code=404, detail=f"Icône LaMetric {req.icon_id} introuvable")
+    except requests.RequestException as e:
+        raise HTTPException(status_code=502, detail=f"Erreur téléchargement: {str(e)}")
+
+    content_hash = lametric_cache.content_hash(req.icon_id) or hashlib.sha256(content).hexdigest()
+    key = (req.icon_id, content_hash, *render_params(req, geometry, grid))
+    try:
+        # Another request may already be decoding this rendering
+        sequence = decoding.get(key)
+        if sequence is None and stream and req.animate and is_animated(content):
+            sequence = stream_lametric_sequence(key, content, req, geometry, grid)
+        if sequence is not None:
+            if stream:
+                sequence.first(STREAM_TIMEOUT)
+                return sequence
+            return sequence.result(STREAM_TIMEOUT)
+        sequence = render_lametric_sequence(content, req, geometry, grid)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Icône LaMetric {req.icon_id} illisible: {str(e)}")
+
+    render_cache.put(key, sequence)
+    return sequence
+
+
+def compile_icon(icon_id: str):
+    """Render a custom icon ahead of display, right after it is saved
+
+    Fills the render cache with the sequences of the common requests
+    (COMPILED_ROTATIONS, animated and still, no recoloring or mirroring) for
+    the geometries of the panels in use, so that showing the icon only
+    looks up ready-to-send frames instead of decoding and transforming them.
+    """
+    with compiling_lock:
+        compiling.discard(icon_id)
+    try:
+        with metrics.COMPILE_SECONDS.time():
+            for geometry in geometries.in_use(COMPILED_GEOMETRIES):
+                for rotate in COMPILED_ROTATIONS:
+                    for animate in (True, False):
+                        prepare_sequence(IconRequest(icon_id=icon_id, rotate=rotate, animate=animate), geometry)
+    except HTTPException as e:
+        # Deleted (or replaced by an unreadable icon) before its turn came
+        log.debug("Icon not compiled", icon_id=icon_id, error=e.detail)
+    except Exception:
+        log.exception("Icon compilation failed", icon_id=icon_id)
+
+
+def schedule_compile(icon_id: str):
+    """Compile an icon in the background; saves made before it starts share one compilation"""
+    with compiling_lock:
+        if icon_id in compiling:
+            return
+        compiling.add(icon_id)
+    compiler.submit(compile_icon, icon_id)
+
+
+# --- Endpoints ---
+@app.post("/show/icon")
+async def show_icon(req: IconRequest):
+    """Display LaMetric icon (8x8 JPG) or custom WI icon"""
+    log.debug("Show icon", icon_id=req.icon_id, host=req.host, hosts=req.hosts, group=req.group)
+    if req.priority is not None or req.ttl is not None:
+        return await enqueue_icon(req)
+    
+    if req.transport and req.transport not in TRANSPORTS:
+        raise HTTPException(status_code=400, detail=f"Transport inconnu: {req.transport} ({', '.join(TRANSPORTS)})")
+    if req.fit not in FIT_MODES:
+        raise HTTPException(status_code=400, detail=f"fit inconnu: {req.fit} ({', '.join(FIT_MODES)})")
+    hosts, grid = resolve_targets(req)
+    # Panels of a group are expected to share the first one's geometry
+    geometry = await engine.run(geometries.discover(hosts[0], devices))
+    
+    # --- 1. PREPARE SEQUENCE ---
+    # Decoding may hit the disk or LaMetric: keep it off the event loop
+    # Animated GIFs start playing as soon as their first frame is decoded
+    sequence = await run_in_threadpool(prepare_sequence, req, geometry, grid, True)
 
     # --- 2. EXECUTE ---
     
-    # Always stop previous animation first
-    stop_previous_animation()
+    # Always stop the previous animation on these hosts first
+    for host in hosts:
+        await engine.run(engine.halt(host))
     
     if not sequence:
         raise HTTPException(status_code=500, detail="No frames generated")
+
+    def make_transport(host: str, name: str):
+        return create_transport(name, host, wled, brightness=req.brightness, timeout=REALTIME_TIMEOUT)
+
+    # Several panels: one transport sending every frame to all of them together
+    group = None
+    if len(hosts) > 1:
+        group = GroupTransport([make_transport(h, "http") for h in hosts], tiled=grid is not None)
         
-    # If single frame, send directly (blocking but fast)
-    if len(sequence) == 1:
-        print("[SHOW_ICON] Sending single static frame")
-        send_frame(req.host, sequence[0][0], brightness=req.brightness)
-        return {"ok": True, "mode": "static"}
+    # If single frame, send directly
+    if len(sequence) == 1 and getattr(sequence, "complete", True):
+        if group:
+            await wled_call(group.send(sequence[0][0]))
+        else:
+            await wled_call(wled.send_frame(hosts[0], sequence[0][0], req.brightness))
+        return {"ok": True, "mode": "static", "hosts": hosts}
     
-    # If animation, start background thread
-    print(f"[SHOW_ICON] Starting animation thread with {len(sequence)} frames")
-    t = threading.Thread(
-        target=background_animation_loop,
-        args=(req.host, sequence, req.loop, req.brightness),
-        daemon=True
-    )
-    with animation_lock:
-        current_animation_thread = t
-        t.start()
+    # If animation, hand it to the engine (one player per host)
+    if group:
+        transport = GroupTransport([make_transport(h, pick_transport(h, req.transport)) for h in hosts],
+                                   tiled=grid is not None)
+    else:
+        transport = make_transport(hosts[0], pick_transport(hosts[0], req.transport))
+    label = req.group or ",".join(hosts)
+    player = Player(label, sequence, req.loop, transport, label=req.icon_id, hosts=hosts)
+    await engine.run(engine.play(player))
         
-    return {"ok": True, "mode": "animation", "frames": len(sequence)}
+    return {"ok": True, "mode": "animation", "frames": len(sequence), "hosts": hosts}
+
+
+@app.post("/api/queue")
+async def enqueue_icon(req: IconRequest):
+    """Queue an icon on one host; it interrupts lower priorities and lets them resume afterwards"""
+    if req.transport and req.transport not in TRANSPORTS:
+        raise HTTPException(status_code=400, detail=f"Transport inconnu: {req.transport} ({', '.join(TRANSPORTS)})")
+    if req.fit not in FIT_MODES:
+        raise HTTPException(status_code=400, detail=f"fit inconnu: {req.fit} ({', '.join(FIT_MODES)})")
+    if req.hosts or req.group:
+        raise HTTPException(status_code=400, detail="La file d'attente ne gère qu'un hôte à la fois (host)")
+    if not req.host:
+        raise HTTPException(status_code=400, detail="host requis")
+    geometry = await engine.run(geometries.discover(req.host, devices))
+    sequence = await run_in_threadpool(prepare_sequence, req, geometry)
+    if not sequence:
+        raise HTTPException(status_code=500, detail="No frames generated")
+
+    # A static icon stays on screen until its TTL or something more important
+    static = len(sequence) == 1
+    name = "http" if static else pick_transport(req.host, req.transport)
+
+    def make_transport():
+        return create_transport(name, req.host, wled, brightness=req.brightness, timeout=REALTIME_TIMEOUT)
+
+    entry = QueueEntry(req.host, req.icon_id, sequence, 0 if static else req.loop, make_transport,
+                       priority=req.priority or 0, ttl=req.ttl, key=req.key)
+    await engine.run(display_queue.enqueue(entry))
+    return {"ok": True, "mode": "queued", "entry": entry.status(), "hosts": [req.host]}
+
+
+@app.get("/api/queue")
+def list_queues():
+    """Display queues of every host: entry on screen and waiting entries"""
+    return {"queues": display_queue.entries()}
+
+
+@app.get("/api/queue/{host}")
+def get_queue(host: str):
+    return {"host": host, **display_queue.entries(host)[host]}
+
+
+@app.delete("/api/queue")
+async def clear_queues():
+    """Empty every queue and stop the queued entries on screen"""
+    return {"ok": True, "removed": await engine.run(display_queue.clear())}
+
+
+@app.delete("/api/queue/{host}")
+async def clear_queue(host: str):
+    return {"ok": True, "removed": await engine.run(display_queue.clear(host))}
+
+
+@app.delete("/api/queue/{host}/{entry_id}")
+async def remove_queue_entry(host: str, entry_id: str):
+    """Remove one entry; removing the one on screen shows the next"""
+    if not await engine.run(display_queue.remove(host, entry_id)):
+        raise HTTPException(status_code=404, detail=f"Entrée {entry_id} absente de la file de {host}")
+    return {"ok": True}
 
 
 # /show/svg endpoint removed - deprecated
 
 
 @app.post("/show/png")
-def show_png(req: PngRequest):
+async def show_png(req: PngRequest):
     try:
-        img = Image.open(BytesIO(req.png)).convert("RGBA")
+        img = await run_in_threadpool(lambda: Image.open(BytesIO(req.png)).convert("RGBA"))
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"PNG invalide: {e}")
-    if img.size != (8,8):
-        img = img.resize((8,8), Image.NEAREST)
-    colors = frame_to_colors(img)
-    send_frame(req.host, colors)
+    geometry = await engine.run(geometries.discover(req.host, devices))
+    colors = await run_in_threadpool(
+        lambda: geometry.to_leds(frames.render(frames.image_to_array(img)[None], size=geometry.size))[0])
+    await engine.run(engine.halt(req.host))
+    await wled_call(wled.send_frame(req.host, colors))
     return {"ok": True}
 
 
@@ -301,11 +603,30 @@ class CustomIcon(BaseModel):
     name: str
     frames: Optional[List[List[List[str]]]] = Field(None, description="Multiple frames for animation")
     grid: Optional[List[List[str]]] = Field(None, description="Single frame (legacy)")
-    fps: Optional[int] = Field(8, description="FPS for animation")
+    fps: Optional[int] = Field(8, ge=1, description="FPS for animation")
     created: str
     modified: str
 
 
+class BulkDisplayItem(BaseModel):
+    id: str = Field(..., description="ID icône (WI ou LaMetric)")
+    duration: Optional[float] = Field(None, ge=0.1, description="Durée d'affichage en secondes (défaut: duration de la requête)")
+
+
+class BulkDisplayRequest(BaseModel):
+    icons: List[Union[str, BulkDisplayItem]] = Field(..., description="List of icon IDs to display sequentially")
+    host: str
+    duration: float = Field(2.0, ge=0.1, description="Duration per icon in seconds")
+    brightness: int = Field(255, ge=0, le=255)
+    rotate: int = Field(0, ge=0, le=270)
+    flip_h: bool = False
+    flip_v: bool = False
+    animate: bool = Field(True, description="Jouer l'animation complète des icônes animées")
+    loop: int = Field(1, description="Nombre de passages de la playlist (0 = infini)")
+    shuffle: bool = Field(False, description="Ordre aléatoire, tiré à chaque passage")
+    transport: Optional[str] = Field(None, description="Transport des animations: http, ddp, dnrgb, drgb (défaut: option transport)")
+
+
 # Disabled: Custom GIF upload feature
 # @app.post("/show/gif")
 # def show_gif(req: GifRequest):
@@ -357,11 +678,130 @@ class CustomIcon(BaseModel):
 #     return {"ok": True, "mode": "animation", "frames": len(sequence)}
 
 
+class StopRequest(BaseModel):
+    host: Optional[str] = Field(None, description="Hôte WLED à arrêter (tous si absent)")
+    group: Optional[str] = Field(None, description="Groupe à arrêter")
+
+
 @app.post("/stop")
-def stop_animation():
-    """Stop any currently running animation"""
-    stop_previous_animation()
-    return {"ok": True, "message": "Animation stopped"}
+async def stop_animation(req: Optional[StopRequest] = None):
+    """Stop the animation running on a host or group, or all animations if none is given"""
+    if req and req.group:
+        if req.group not in GROUPS:
+            raise HTTPException(status_code=404, detail=f"Groupe inconnu: {req.group}")
+        stopped = []
+        for host in GROUPS[req.group]["hosts"]:
+            stopped += await engine.run(engine.halt(host))
+    else:
+        stopped = await engine.run(engine.halt(req.host if req else None))
+    return {"ok": True, "message": "Animation stopped", "stopped": stopped}
+
+
+@app.get("/api/geometry")
+def list_geometries():
+    """Panel geometries, configured or discovered from WLED"""
+    return {"default": geometries.default.as_dict(), "panels": geometries.all()}
+
+
+@app.delete("/api/geometry")
+def forget_geometries(host: Optional[str] = None):
+    """Forget discovered geometries so they are read again from WLED"""
+    geometries.forget(host)
+    devices.forget(host)
+    return {"ok": True}
+
+
+@app.get("/api/devices")
+def list_devices():
+    """Known WLED devices: capabilities from /json/info and age of the cached state"""
+    return {"devices": devices.all(), "state_ttl": devices.state_ttl, "poll_interval": devices.poll_interval}
+
+
+@app.get("/api/devices/{host}")
+async def get_device(host: str, fresh: bool = False):
+    """One device with its /json/info and state (cached unless fresh)"""
+    info = await wled_call(devices.info(host))
+    state = await wled_call(devices.state(host, fresh))
+    return {**devices.device(host).status(), "info": info, "state": state}
+
+
+@app.delete("/api/devices")
+def forget_devices(host: Optional[str] = None):
+    """Forget device info and state (and discovered geometries) so they are read again"""
+    devices.forget(host)
+    geometries.forget(host)
+    return {"ok": True}
+
+
+@app.get("/api/flow")
+def list_flows():
+    """Flow control of each panel: round-trip time, frame rate cap and circuit breaker; WebSocket links"""
+    return {"hosts": wled.flow_stats(), "sockets": wled.socket_stats()}
+
+
+@app.delete("/api/flow")
+def reset_flows(host: Optional[str] = None):
+    """Close the circuit breaker and forget the measured round-trip time"""
+    wled.reset_flow(host)
+    return {"ok": True}
+
+
+@app.get("/api/groups")
+def list_groups():
+    """Panel groups defined in the add-on options"""
+    return {"groups": list(GROUPS.values())}
+
+
+@app.get("/api/players")
+def list_players():
+    """What is playing where"""
+    return {"players": engine.players()}
+
+
+@app.get("/api/playlists")
+def list_playlists():
+    """Running and recently finished bulk display playlists"""
+    return {"playlists": [p.status() for p in playlists.all()]}
+
+
+@app.get("/api/playlists/{job_id}")
+def get_playlist(job_id: str):
+    player = playlists.get(job_id)
+    if player is None:
+        raise HTTPException(status_code=404, detail="Playlist introuvable")
+    return player.status()
+
+
+@app.delete("/api/playlists/{job_id}")
+async def cancel_playlist(job_id: str):
+    """Stop a playlist if it is still playing"""
+    player = playlists.get(job_id)
+    if player is None:
+        raise HTTPException(status_code=404, detail="Playlist introuvable")
+    if engine.player(player.host) is player:
+        await engine.run(engine.halt(player.host))
+    return player.status()
+
+
+@app.get("/api/cache")
+def get_cache_stats():
+    """LaMetric download, rendered frames and preview cache statistics"""
+    return {"lametric": lametric_cache.stats(), "frames": render_cache.stats(), "previews": previews.stats()}
+
+
+@app.delete("/api/cache")
+def clear_cache():
+    """Empty the LaMetric download, rendered frames and preview caches"""
+    lametric_cache.clear()
+    render_cache.clear()
+    previews.clear()
+    return {"ok": True}
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Prometheus metrics (text exposition format)"""
+    return Response(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @app.get("/")
@@ -387,82 +827,337 @@ def scripts():
 @app.get("/api/icons")
 def get_custom_icons():
     """Get all custom icons"""
-    icons = load_custom_icons()
     # Add the ID to each icon object
-    for icon_id, icon_data in icons.items():
-        icon_data['id'] = icon_id
-    return icons
+    return {icon_id: {**icon_data, 'id': icon_id} for icon_id, icon_data in icon_store.items()}
+
+
+@app.get("/api/icons/search")
+def search_icons(q: str = "", limit: int = 20, cursor: Optional[str] = None, fields: str = "full"):
+    """Search icons by name or ID, best matches first
+
+    fields=meta returns metadata and a PNG thumbnail instead of the grid.
+    """
+    if fields not in ("full", "meta"):
+        raise HTTPException(status_code=400, detail="fields doit valoir 'full' ou 'meta'")
+    try:
+        ids, next_cursor = icon_store.search.search(q, max(1, min(limit, 200)), cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Curseur invalide")
+
+    results = []
+    for icon_id in ids:
+        if fields == "meta":
+            info = icon_store.info(icon_id)
+            if info is not None:
+                results.append(icon_meta(icon_id, info))
+            continue
+        icon_data = icon_store.get(icon_id)
+        if icon_data is None:
+            continue
+        results.append({
+            "id": icon_id,
+            "name": icon_data.get("name", ""),
+            "grid": icon_data["frames"][0]
+        })
+    
+    return {"icons": results, "count": len(results), "next_cursor": next_cursor}
+
+
+@app.get("/api/icons/export")
+def export_icons(encoding: str = "wic"):
+    """Stream the whole library as NDJSON, one icon per line
+
+    encoding=wic puts the frames in a base64 WIC record, encoding=grids in
+    "#RRGGBB" grids. Icons are read page by page: memory stays constant.
+    """
+    if encoding not in ("wic", "grids"):
+        raise HTTPException(status_code=400, detail="encoding doit valoir 'wic' ou 'grids'")
+
+    def lines():
+        for icon_id, meta, record in icon_store.rows():
+            if encoding == "wic":
+                pixels = {"wic": base64.b64encode(record).decode()}
+            else:
+                pixels = {"frames": icon_codec.to_grids(icon_codec.decode(record))}
+            yield json.dumps({"id": icon_id, **meta, **pixels}, separators=(",", ":")) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={
+        "Content-Disposition": 'attachment; filename="wled-icons.ndjson"',
+    })
 
 
 @app.get("/api/icons/{icon_id}")
 def get_custom_icon(icon_id: str):
     """Get a specific custom icon"""
-    icons = load_custom_icons()
-    if icon_id not in icons:
+    icon = icon_store.get(icon_id)
+    if icon is None:
         raise HTTPException(status_code=404, detail="Icon not found")
-    return icons[icon_id]
+    return icon
+
+
+def icon_content_hash(icon_id: str) -> str:
+    """Hash of an icon's source content, downloading a LaMetric icon if it is not cached"""
+    if icon_id.startswith("WI"):
+        content_hash = icon_store.content_hash(icon_id)
+        if content_hash is None:
+            raise HTTPException(status_code=404, detail=f"Icône personnalisée {icon_id} introuvable")
+        return content_hash
+    content_hash = lametric_cache.peek(icon_id)
+    if content_hash is not None:
+        return content_hash
+    try:
+        content = lametric_cache.get(icon_id)
+    except IconNotFound:
+        raise HTTPException(status_code=404, detail=f"Icône LaMetric {icon_id} introuvable")
+    except requests.RequestException as e:
+        raise HTTPException(status_code=502, detail=f"Erreur téléchargement: {str(e)}")
+    return lametric_cache.content_hash(icon_id) or hashlib.sha256(content).hexdigest()
+
+
+@app.get("/api/icons/{icon_id}/preview.{fmt}")
+def icon_preview(icon_id: str, fmt: str, scale: int = 8, width: Optional[int] = None,
+                 height: Optional[int] = None, color: Optional[str] = None, rotate: int = 0,
+                 flip_h: bool = False, flip_v: bool = False, animate: bool = True, fps: Optional[int] = None,
+                 fit: str = "contain", if_none_match: Optional[str] = Header(None)):
+    """Preview of a custom or LaMetric icon as rendered for a panel: PNG (first frame) or animated GIF"""
+    if fmt not in preview.FORMATS:
+        raise HTTPException(status_code=404, detail=f"Format inconnu: {fmt} ({', '.join(preview.FORMATS)})")
+    if fit not in FIT_MODES:
+        raise HTTPException(status_code=400, detail=f"fit inconnu: {fit} ({', '.join(FIT_MODES)})")
+    if not 1 <= scale <= preview.MAX_SCALE:
+        raise HTTPException(status_code=400, detail=f"scale doit être entre 1 et {preview.MAX_SCALE}")
+    default_width, default_height = geometries.default.size
+    width, height = width or default_width, height or default_height
+    if not (0 < width <= 256 and 0 < height <= 256):
+        raise HTTPException(status_code=400, detail="width et height doivent être entre 1 et 256")
+    req = IconRequest(icon_id=icon_id, color=color, rotate=rotate, flip_h=flip_h, flip_v=flip_v,
+                      animate=animate and fmt == "gif", fps=fps, fit=fit)
+    # Plain row-major pixels: the image as seen on the panel
+    geometry = Geometry(width, height, source="preview")
+
+    tag = preview.etag(icon_id, icon_content_hash(icon_id), render_params(req, geometry), fmt, scale)
+    headers = {
+        "ETag": tag,
+        # Custom icons can be edited: revalidate (cheap 304); LaMetric icons rarely change
+        "Cache-Control": "no-cache" if icon_id.startswith("WI") else "public, max-age=86400",
+    }
+    if preview.etag_matches(if_none_match, tag):
+        return Response(status_code=304, headers=headers)
+    body = previews.get(tag)
+    if body is None:
+        body = preview.encode(prepare_sequence(req, geometry), geometry.size, fmt, scale)
+        previews.put(tag, body)
+    return Response(body, media_type=preview.FORMATS[fmt], headers=headers)
+
+
+@app.get("/api/icons/{icon_id}/wic")
+def get_custom_icon_wic(icon_id: str):
+    """A custom icon as a binary WIC record (metadata included)"""
+    record = icon_store.record(icon_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Icon not found")
+    return Response(record, media_type=icon_codec.MEDIA_TYPE,
+                    headers={"ETag": f'"{icon_store.content_hash(icon_id)}"'})
+
+
+@app.put("/api/icons/{icon_id}/wic")
+async def put_custom_icon_wic(icon_id: str, request: Request):
+    """Save or update a custom icon from a binary WIC record"""
+    if not icon_id.startswith("WI"):
+        raise HTTPException(status_code=400, detail="Icon ID must start with 'WI'")
+    record = await request.body()
+    try:
+        await run_in_threadpool(icon_store.put_record, icon_id, record)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except IconStoreError as e:
+        log.error("Could not save icon", icon_id=icon_id, error=e)
+        raise HTTPException(status_code=500, detail=f"Failed to save: {e}")
+    render_cache.invalidate(icon_id)
+    schedule_compile(icon_id)
+    frame_count = icon_codec.shape(record)[0]
+    log.info("Icon saved", icon_id=icon_id, frames=frame_count, bytes=len(record))
+    return {"ok": True, "id": icon_id}
+
+
+def parse_import_line(line: bytes) -> tuple:
+    """One NDJSON export line -> (id, metadata, WIC record); ValueError if malformed"""
+    item = json.loads(line)
+    if not isinstance(item, dict):
+        raise ValueError("Objet JSON attendu")
+    icon_id = item.pop("id", None)
+    if not isinstance(icon_id, str) or not icon_id.startswith("WI"):
+        raise ValueError("id manquant ou ne commençant pas par 'WI'")
+    wic = item.pop("wic", None)
+    if wic is None:
+        return (icon_id, *split_icon(item))
+    try:
+        record = base64.b64decode(wic, validate=True)
+    except (TypeError, ValueError):
+        raise ValueError("wic n'est pas du base64 valide")
+    # Metadata of the line wins over the one inside the record
+    meta, record = icon_codec.split(record)
+    meta = {**meta, **item}
+    check_meta(meta)
+    return icon_id, meta, record
+
+
+@app.post("/api/icons/import")
+async def import_icons(request: Request):
+    """Import an NDJSON export (one icon per line, wic or grids), streamed
+
+    Lines are parsed as they arrive and saved IMPORT_BATCH icons per
+    transaction, so memory stays constant whatever the library size.
+    Existing icons with the same id are replaced; malformed lines are
+    skipped and reported.
+    """
+    imported, errors, batch = 0, [], []
+    line_number = 0
+
+    async def flush():
+        nonlocal imported
+        if not batch:
+            return
+        try:
+            await run_in_threadpool(icon_store.put_many, batch)
+        except IconStoreError as e:
+            log.error("Icon import failed", imported=imported, error=e)
+            raise HTTPException(status_code=500, detail=f"Failed to save: {e}")
+        for icon_id, _, _ in batch:
+            render_cache.invalidate(icon_id)
+        imported += len(batch)
+        batch.clear()
+
+    def error(message: str):
+        if len(errors) < IMPORT_MAX_ERRORS:
+            errors.append({"line": line_number, "error": message})
+
+    async def take(line: bytes):
+        nonlocal line_number
+        line_number += 1
+        if not line.strip():
+            return
+        try:
+            row = parse_import_line(line)
+            icon_codec.decode(row[2])
+        except ValueError as e:
+            error(str(e))
+            return
+        batch.append(row)
+        if len(batch) >= IMPORT_BATCH:
+            await flush()
+
+    pending = b""
+    async for chunk in request.stream():
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            await take(line)
+        if len(pending) > IMPORT_MAX_LINE:
+            raise HTTPException(status_code=413, detail=f"Ligne {line_number + 1} trop longue")
+    await take(pending)
+    await flush()
+
+    log.info("Icons imported", imported=imported, errors=len(errors))
+    return {"ok": not errors, "imported": imported, "errors": errors}
+
+
+@app.post("/api/icons/bulk-display")
+async def bulk_display_icons(req: BulkDisplayRequest):
+    """Play icons one after another as a background playlist job"""
+    if req.transport and req.transport not in TRANSPORTS:
+        raise HTTPException(status_code=400, detail=f"Transport inconnu: {req.transport} ({', '.join(TRANSPORTS)})")
+
+    def render_items() -> tuple[List[PlaylistItem], List[str]]:
+        items, skipped = [], []
+        for entry in req.icons:
+            icon_id, duration = (entry, None) if isinstance(entry, str) else (entry.id, entry.duration)
+            icon_req = IconRequest(host=req.host, icon_id=icon_id, rotate=req.rotate, flip_h=req.flip_h,
+                                   flip_v=req.flip_v, animate=req.animate, brightness=req.brightness)
+            try:
+                sequence = prepare_sequence(icon_req, geometry)
+            except HTTPException as e:
+                log.warning("Playlist icon skipped", icon_id=icon_id, reason=e.detail)
+                skipped.append(icon_id)
+                continue
+            items.append(PlaylistItem(icon_id, sequence, duration or req.duration))
+        return items, skipped
+
+    # Every frame is rendered before playback starts
+    geometry = await engine.run(geometries.discover(req.host, devices))
+    items, skipped = await run_in_threadpool(render_items)
+    if not items:
+        raise HTTPException(status_code=404, detail="Aucune icône trouvée")
+
+    transport = create_transport(
+        pick_transport(req.host, req.transport),
+        req.host,
+        wled,
+        brightness=req.brightness,
+        timeout=REALTIME_TIMEOUT,
+    )
+    player = PlaylistPlayer(req.host, items, req.loop, req.shuffle, transport)
+    playlists.add(player)
+    await engine.run(engine.play(player))
+    log.info("Playlist started", job_id=player.job_id, host=req.host, icons=len(items))
+
+    return {
+        "ok": True,
+        "job_id": player.job_id,
+        "displayed": [item.icon_id for item in items],
+        "skipped": skipped,
+        "count": len(items),
+    }
 
 
 @app.post("/api/icons/{icon_id}")
 def save_custom_icon(icon_id: str, icon: CustomIcon):
     """Save or update a custom icon"""
-    print(f"[API] Saving icon: {icon_id}")
-    print(f"[API] Icon data: {icon.model_dump()}")
-    
     if not icon_id.startswith("WI"):
         raise HTTPException(status_code=400, detail="Icon ID must start with 'WI'")
     
-    icons = load_custom_icons()
-    icons[icon_id] = icon.model_dump()
-    save_custom_icons(icons)
+    try:
+        icon_store.put(icon_id, icon.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Icône invalide: {e}")
+    except IconStoreError as e:
+        log.error("Could not save icon", icon_id=icon_id, error=e)
+        raise HTTPException(status_code=500, detail=f"Failed to save: {e}")
+    render_cache.invalidate(icon_id)
+    schedule_compile(icon_id)
     
-    print(f"[API] Icon {icon_id} saved successfully")
+    log.info("Icon saved", icon_id=icon_id, frames=len(icon.frames or [icon.grid]))
     return {"ok": True, "id": icon_id}
 
 
 @app.delete("/api/icons/{icon_id}")
 def delete_custom_icon(icon_id: str):
     """Delete a custom icon"""
-    icons = load_custom_icons()
-    if icon_id not in icons:
+    try:
+        deleted = icon_store.delete(icon_id)
+    except IconStoreError as e:
+        log.error("Could not delete icon", icon_id=icon_id, error=e)
+        raise HTTPException(status_code=500, detail=f"Failed to delete: {e}")
+    if not deleted:
         raise HTTPException(status_code=404, detail="Icon not found")
     
-    del icons[icon_id]
-    save_custom_icons(icons)
+    render_cache.invalidate(icon_id)
     return {"ok": True, "deleted": icon_id}
 
 
 @app.post("/api/icons/{icon_id}/display")
-def display_custom_icon(icon_id: str, host: str, rotate: int = 0, flip_h: bool = False, flip_v: bool = False):
+async def display_custom_icon(icon_id: str, host: str, rotate: int = 0, flip_h: bool = False, flip_v: bool = False):
     """Display a custom icon on WLED"""
-    icons = load_custom_icons()
-    if icon_id not in icons:
+    if icon_id not in icon_store:
         raise HTTPException(status_code=404, detail="Icon not found")
     
-    icon_data = icons[icon_id]
-    grid = icon_data["grid"]
-    
-    # Convert hex grid to RGB values
-    colors = []
-    for row in grid:
-        row_colors = []
-        for hex_color in row:
-            rgb = hex_to_rgb(hex_color)
-            row_colors.append(list(rgb))
-        colors.append(row_colors)
-    
-    # Apply transformations if needed
-    if rotate or flip_h or flip_v:
-        # Create temporary image for transformations
-        img = Image.new("RGB", (8, 8))
-        pixels = img.load()
-        for y in range(8):
-            for x in range(8):
-                pixels[x, y] = tuple(colors[y][x])
-        
-        colors = frame_to_colors(img, rotate, flip_h, flip_v)
+    # First frame only: this endpoint shows a still image, compiled when the icon was saved
+    geometry = await engine.run(geometries.discover(host, devices))
+    req = IconRequest(icon_id=icon_id, rotate=rotate, flip_h=flip_h, flip_v=flip_v, animate=False)
+    colors = (await run_in_threadpool(prepare_sequence, req, geometry))[0][0]
     
-    send_frame(host, colors)
+    await engine.run(engine.halt(host))
+    await wled_call(wled.send_frame(host, colors))
     return {"ok": True}
 
 
@@ -475,185 +1170,30 @@ class BrightnessRequest(BaseModel):
 class WLEDStateRequest(BaseModel):
     host: str
 
-class BulkDisplayRequest(BaseModel):
-    icons: List[str] = Field(..., description="List of icon IDs to display sequentially")
-    host: str
-    duration: float = Field(2.0, ge=0.1, description="Duration per icon in seconds")
-    brightness: int = Field(255, ge=0, le=255)
-    rotate: int = Field(0, ge=0, le=270)
-    flip_h: bool = False
-    flip_v: bool = False
-
-
 @app.post("/api/wled/brightness")
-def set_wled_brightness(req: BrightnessRequest):
+async def set_wled_brightness(req: BrightnessRequest):
     """Set WLED brightness without changing content"""
-    url = f"http://{req.host}/json/state"
-    payload = {"bri": req.brightness}
-    
-    try:
-        r = requests.post(url, json=payload, timeout=5)
-        if not r.ok:
-            raise HTTPException(status_code=502, detail=f"WLED error: {r.status_code}")
-        return {"ok": True, "brightness": req.brightness}
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=502, detail=f"Connection error: {str(e)}")
+    await wled_call(devices.set_state(req.host, {"bri": req.brightness}))
+    return {"ok": True, "brightness": req.brightness}
 
 
 @app.post("/api/wled/state")
-def get_wled_state(req: WLEDStateRequest):
-    """Get current WLED state"""
-    url = f"http://{req.host}/json/state"
-    
-    try:
-        r = requests.get(url, timeout=5)
-        if not r.ok:
-            raise HTTPException(status_code=502, detail=f"WLED error: {r.status_code}")
-        return r.json()
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=502, detail=f"Connection error: {str(e)}")
+async def get_wled_state(req: WLEDStateRequest, fresh: bool = False):
+    """Get current WLED state, from the device cache unless fresh"""
+    return await wled_call(devices.state(req.host, fresh))
 
 
 @app.post("/api/wled/off")
-def turn_wled_off(req: WLEDStateRequest):
+async def turn_wled_off(req: WLEDStateRequest):
     """Turn WLED off"""
-    url = f"http://{req.host}/json/state"
-    payload = {"on": False}
-    
-    try:
-        r = requests.post(url, json=payload, timeout=5)
-        if not r.ok:
-            raise HTTPException(status_code=502, detail=f"WLED error: {r.status_code}")
-        return {"ok": True}
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=502, detail=f"Connection error: {str(e)}")
+    await wled_call(devices.set_state(req.host, {"on": False}))
+    return {"ok": True}
 
 
 @app.post("/api/wled/on")
-def turn_wled_on(req: WLEDStateRequest):
+async def turn_wled_on(req: WLEDStateRequest):
     """Turn WLED on"""
-    url = f"http://{req.host}/json/state"
-    payload = {"on": True}
-    
-    try:
-        r = requests.post(url, json=payload, timeout=5)
-        if not r.ok:
-            raise HTTPException(status_code=502, detail=f"WLED error: {r.status_code}")
-        return {"ok": True}
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=502, detail=f"Connection error: {str(e)}")
-
-
-@app.post("/api/icons/bulk-display")
-def bulk_display_icons(req: BulkDisplayRequest):
-    """Display multiple icons sequentially"""
-    icons_db = load_custom_icons()
-    displayed = []
-    
-    for icon_id in req.icons:
-        if icon_id not in icons_db:
-            print(f"[BULK] Icon {icon_id} not found, skipping")
-            continue
-        
-        icon_data = icons_db[icon_id]
-        grid = icon_data["grid"]
-        
-        # Build image for transformations
-        img = Image.new("RGB", (8, 8))
-        pixels = img.load()
-        for y in range(8):
-            for x in range(8):
-                rgb = hex_to_rgb(grid[y][x])
-                pixels[x, y] = rgb
-        
-        colors = frame_to_colors(img, req.rotate, req.flip_h, req.flip_v)
-        
-        # Apply brightness
-        if req.brightness < 255:
-            colors = [[int(c * req.brightness / 255) for c in pixel] for pixel in colors]
-        
-        send_frame(req.host, colors, req.brightness)
-        displayed.append(icon_id)
-        
-        if len(displayed) < len(req.icons):  # Don't sleep after last icon
-            time.sleep(req.duration)
-    
-    return {"ok": True, "displayed": displayed, "count": len(displayed)}
-
-
-@app.get("/api/icons/search")
-def search_icons(q: str = "", limit: int = 20):
-    """Search icons by name or ID"""
-    icons = load_custom_icons()
-    results = []
-    
-    q_lower = q.lower()
-    for icon_id, icon_data in icons.items():
-        name = icon_data.get("name", "").lower()
-        if q_lower in icon_id.lower() or q_lower in name:
-            results.append({
-                "id": icon_id,
-                "name": icon_data.get("name", ""),
-                "grid": icon_data.get("grid", [])
-            })
-            if len(results) >= limit:
-                break
-    
-    return {"icons": results, "count": len(results)}
-
-
-def stop_previous_animation():
-    global current_animation_thread
-    with animation_lock:
-        if current_animation_thread and current_animation_thread.is_alive():
-            print("[ANIMATION] Stopping previous animation...")
-            stop_animation_event.set()
-            current_animation_thread.join(timeout=2.0)
-            if current_animation_thread.is_alive():
-                print("[ANIMATION] Warning: Thread did not stop gracefully")
-            else:
-                print("[ANIMATION] Previous animation stopped")
-        stop_animation_event.clear()
+    await wled_call(devices.set_state(req.host, {"on": True}))
+    return {"ok": True}
 
-def background_animation_loop(host: str, sequence: List[tuple[List[List[int]], float]], loop: int, brightness: int):
-    """
-    Runs in a background thread.
-    sequence: List of (colors, duration) tuples
-    """
-    print(f"[ANIMATION] Starting background loop. Frames: {len(sequence)}, Loop: {loop}")
-    loop_count = 0
-    
-    try:
-        while not stop_animation_event.is_set():
-            for colors, duration in sequence:
-                if stop_animation_event.is_set():
-                    break
-                
-                try:
-                    # We use a simplified send_frame here to avoid raising HTTP exceptions in the thread
-                    # or we just catch them
-                    send_frame(host, colors, brightness)
-                except Exception as e:
-                    print(f"[ANIMATION] Error sending frame: {e}")
-                    # Optional: stop animation on error?
-                    # stop_animation_event.set()
-                    # break
-                
-                # Sleep in small chunks to be responsive to stop event
-                elapsed = 0
-                step = 0.05
-                while elapsed < duration:
-                    if stop_animation_event.is_set():
-                        break
-                    time.sleep(min(step, duration - elapsed))
-                    elapsed += step
-            
-            loop_count += 1
-            if loop > 0 and loop_count >= loop:
-                print("[ANIMATION] Loop count reached, stopping.")
-                break
-    except Exception as e:
-        print(f"[ANIMATION] Thread crashed: {e}")
-    finally:
-        print("[ANIMATION] Thread exiting")
 
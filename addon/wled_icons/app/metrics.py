@@ -0,0 +1,260 @@
+"""Prometheus metrics, rendered in the text exposition format at /metrics.
+
+A minimal, dependency-free implementation: counters, gauges and histograms
+with labels. Recording a value is a dict lookup for the labelled child, a
+bisect over the bucket bounds and a few additions under an uncontended
+lock, so the instrumentation stays on in production, Raspberry Pi included.
+Gauges that mirror existing state (players, cache sizes) are computed only
+when /metrics is scraped.
+
+Label values should stay few (hosts, stages): every combination is kept
+forever.
+"""
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _labels_text(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List["_Metric"] = []
+
+    def register(self, metric: "_Metric"):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, names, values, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_labels_text(names, values)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), registry: Registry = REGISTRY):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+        registry.register(self)
+
+    def labels(self, *values):
+        """Child for one combination of label values (created on first use)"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name} expects labels {self.label_names}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def remove(self, *values):
+        with self._lock:
+            self._children.pop(values, None)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _items(self):
+        with self._lock:
+            return list(self._children.items())
+
+    def samples(self):
+        raise NotImplementedError
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def samples(self):
+        for values, child in self._items():
+            yield "", self.label_names, values, child.value
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Gauge(_Metric):
+    """A value that goes up and down; set it, or give a function read at scrape time"""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), registry: Registry = REGISTRY,
+                 function: Optional[Callable] = None):
+        super().__init__(name, help, labels, registry)
+        self.function = function
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def set_function(self, function: Callable):
+        """function() returns a number, or {label values tuple: number} for labelled gauges"""
+        self.function = function
+
+    def samples(self):
+        if self.function is None:
+            for values, child in self._items():
+                yield "", self.label_names, values, child.value
+            return
+        try:
+            result = self.function()
+        except Exception:
+            # A broken callback must not take the whole scrape down
+            return
+        if isinstance(result, dict):
+            for values, value in result.items():
+                yield "", self.label_names, values, value
+        else:
+            yield "", self.label_names, (), result
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), registry: Registry = REGISTRY,
+                 buckets: Sequence[float] = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, help, labels, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def samples(self):
+        names = self.label_names + ("le",)
+        for values, child in self._items():
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.bounds + (math.inf,), counts):
+                cumulative += count
+                yield "_bucket", names, values + (_format_value(bound),), cumulative
+            yield "_sum", self.label_names, values, total
+            yield "_count", self.label_names, values, cumulative
+
+
+# --- Service metrics ---
+
+# Pipeline stages, from download to the panel
+LAMETRIC_FETCH_SECONDS = Histogram(
+    "wled_icons_lametric_fetch_seconds", "Download time of LaMetric icons (cache misses and revalidations)",
+    buckets=(.05, .1, .25, .5, 1, 2, 4, 8))
+DECODE_SECONDS = Histogram(
+    "wled_icons_decode_seconds", "Icon decoding time (GIF/PNG/JPG or WIC records to frames)", ["source"],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, 1))
+RENDER_SECONDS = Histogram(
+    "wled_icons_render_seconds", "Fit, recolor, transform and LED mapping time of a whole sequence",
+    buckets=(.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .5))
+COMPILE_SECONDS = Histogram(
+    "wled_icons_compile_seconds", "Time to render a saved custom icon for the common requests and panels",
+    buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1))
+ENCODE_SECONDS = Histogram(
+    "wled_icons_encode_seconds", "Time to encode one frame into a WLED payload", ["transport"],
+    buckets=(.00005, .0001, .00025, .0005, .001, .0025, .005, .01, .05))
+WLED_REQUEST_SECONDS = Histogram(
+    "wled_icons_wled_request_seconds", "Round-trip time of WLED JSON API requests",
+    buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5))
+
+# Per host
+FRAMES_SENT = Counter("wled_icons_frames_sent_total", "Animation frames sent", ["host"])
+FRAME_FAILURES = Counter("wled_icons_frame_failures_total", "Animation frames that could not be sent", ["host"])
+FRAMES_DROPPED = Counter("wled_icons_frames_dropped_total", "Animation frames skipped to catch up", ["host"])
+FRAMES_LATE = Counter("wled_icons_frames_late_total", "Animation frames sent late", ["host"])
+FRAMES_THROTTLED = Counter("wled_icons_frames_throttled_total",
+                           "Animation frames skipped by flow control (slow or unreachable panel)", ["host"])
+WLED_RETRIES = Counter("wled_icons_wled_retries_total", "WLED requests retried after an error", ["host"])
+
+# Read from the service state at scrape time (functions set by main)
+ACTIVE_PLAYERS = Gauge("wled_icons_active_players", "Animations currently playing")
+RENDER_CACHE_BYTES = Gauge("wled_icons_render_cache_bytes", "Size of the rendered sequences cache")
+RENDER_CACHE_ENTRIES = Gauge("wled_icons_render_cache_entries", "Sequences in the render cache")
+LAMETRIC_CACHE_BYTES = Gauge("wled_icons_lametric_cache_bytes", "Size of the LaMetric download cache")
+LAMETRIC_CACHE_ENTRIES = Gauge("wled_icons_lametric_cache_entries", "Icons in the LaMetric download cache")
+CUSTOM_ICONS = Gauge("wled_icons_custom_icons", "Custom (WI) icons stored")
+WLED_RTT_SECONDS = Gauge("wled_icons_wled_rtt_seconds", "Smoothed round-trip time of WLED requests", ["host"])
+WLED_BREAKER_OPEN = Gauge("wled_icons_wled_breaker_open", "1 while the host's circuit breaker is not closed", ["host"])
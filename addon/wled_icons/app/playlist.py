@@ -0,0 +1,112 @@
+"""Server-side playlists (bulk display).
+
+A playlist is a Player whose sequence is the concatenation of its items:
+each item's pre-rendered animation is repeated (and its last frame cut
+short) to fill the item's duration, so the engine plays the whole playlist
+on its usual absolute-deadline schedule and no request thread waits for it.
+Shuffled playlists draw a new order at every loop.
+"""
+import bisect
+import random
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .engine import Player
+
+Sequence = List[Tuple[np.ndarray, float]]
+
+# Finished playlists kept for status queries
+MAX_FINISHED_JOBS = 50
+
+
+def fit_sequence(sequence: Sequence, duration: float) -> Sequence:
+    """Loop sequence until it lasts exactly duration seconds"""
+    if not sequence:
+        return []
+    if sum(frame_duration for _, frame_duration in sequence) <= 0:
+        # Looping would never reach duration: hold the first frame instead
+        return [(sequence[0][0], duration)]
+    out: Sequence = []
+    elapsed = 0.0
+    while duration - elapsed > 1e-6:
+        for pixels, frame_duration in sequence:
+            frame_duration = min(frame_duration, duration - elapsed)
+            out.append((pixels, frame_duration))
+            elapsed += frame_duration
+            if duration - elapsed <= 1e-6:
+                break
+    return out
+
+
+class PlaylistItem:
+    def __init__(self, icon_id: str, sequence: Sequence, duration: float):
+        self.icon_id = icon_id
+        self.duration = duration
+        self.frames = fit_sequence(sequence, duration)
+        self.animated = len(sequence) > 1
+
+
+class PlaylistPlayer(Player):
+    def __init__(self, host: str, items: List[PlaylistItem], loop: int, shuffle: bool, transport):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.items = items
+        self.shuffle = shuffle
+        self._order: List[int] = []
+        self._offsets: List[int] = []
+        super().__init__(host, self._build(), loop, transport, label=f"playlist:{self.job_id}")
+
+    def _build(self) -> Sequence:
+        self._order = list(range(len(self.items)))
+        if self.shuffle:
+            random.shuffle(self._order)
+        sequence: Sequence = []
+        self._offsets = []
+        for index in self._order:
+            self._offsets.append(len(sequence))
+            sequence += self.items[index].frames
+        return sequence
+
+    def next_cycle(self):
+        if self.shuffle:
+            self.sequence = self._build()
+
+    def current_item(self) -> Optional[PlaylistItem]:
+        if not self._offsets or self.state not in ("starting", "playing"):
+            return None
+        position = bisect.bisect_right(self._offsets, self.frame_index) - 1
+        return self.items[self._order[max(0, position)]]
+
+    def status(self) -> Dict:
+        current = self.current_item()
+        return {
+            **super().status(),
+            "job_id": self.job_id,
+            "items": [{"id": item.icon_id, "duration": item.duration, "animated": item.animated}
+                      for item in self.items],
+            "order": [self.items[i].icon_id for i in self._order],
+            "shuffle": self.shuffle,
+            "current": current.icon_id if current else None,
+        }
+
+
+class PlaylistJobs:
+    """Recent playlists by job id (running ones and the last finished ones)"""
+
+    def __init__(self, max_finished: int = MAX_FINISHED_JOBS):
+        self.max_finished = max_finished
+        self._jobs: "OrderedDict[str, PlaylistPlayer]" = OrderedDict()
+
+    def add(self, player: PlaylistPlayer):
+        self._jobs[player.job_id] = player
+        done = [job_id for job_id, p in self._jobs.items() if p.play_ended is not None]
+        for job_id in done[:max(0, len(done) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[PlaylistPlayer]:
+        return self._jobs.get(job_id)
+
+    def all(self) -> List[PlaylistPlayer]:
+        return list(self._jobs.values())
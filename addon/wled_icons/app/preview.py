@@ -0,0 +1,104 @@
+"""Preview images of icons, rendered by the panel pipeline.
+
+A preview is the sequence the panel would show (same fit, recoloring,
+transforms and alpha flattening, in plain row-major order) scaled up by an
+integer factor, as a PNG of the first frame or an animated GIF.
+
+Encoded previews are kept in a byte-bounded LRU keyed by their ETag, which
+is derived from the icon's content hash and the render parameters only: a
+conditional request is answered with 304 without rendering anything, and a
+new version of an icon gets a new ETag.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+FORMATS = {"png": "image/png", "gif": "image/gif"}
+MAX_SCALE = 32
+# Bump when the encoding changes so that clients drop their cached previews
+PREVIEW_VERSION = 1
+
+
+def etag(*parts) -> str:
+    """Strong ETag of a preview, from its source content hash and render parameters"""
+    digest = hashlib.sha1(repr((PREVIEW_VERSION, *parts)).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], tag: str) -> bool:
+    """Whether an If-None-Match header value covers tag"""
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    return "*" in candidates or tag in (c[2:] if c.startswith("W/") else c for c in candidates)
+
+
+def encode(sequence: List[Tuple[np.ndarray, float]], size: Tuple[int, int], fmt: str, scale: int = 1) -> bytes:
+    """Encode (pixels, duration) frames of a width x height panel as PNG (first frame) or GIF"""
+    width, height = size
+    frames = np.stack([pixels for pixels, _ in sequence]).reshape(-1, height, width, 3)
+    if scale > 1:
+        frames = frames.repeat(scale, axis=1).repeat(scale, axis=2)
+    buf = BytesIO()
+    if fmt == "png":
+        Image.fromarray(frames[0], "RGB").save(buf, format="PNG", optimize=True)
+        return buf.getvalue()
+    # Small icons have few colors: an adaptive palette keeps them exact
+    images = [Image.fromarray(f, "RGB").convert("P", palette=Image.Palette.ADAPTIVE, colors=256) for f in frames]
+    durations = [max(20, int(round(duration * 1000))) for _, duration in sequence]
+    images[0].save(buf, format="GIF", save_all=True, append_images=images[1:], duration=durations,
+                   loop=0, disposal=1)
+    return buf.getvalue()
+
+
+class PreviewCache:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats_counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, tag: str) -> Optional[bytes]:
+        with self._lock:
+            body = self._entries.get(tag)
+            if body is None:
+                self.stats_counters["misses"] += 1
+                return None
+            self._entries.move_to_end(tag)
+            self.stats_counters["hits"] += 1
+            return body
+
+    def put(self, tag: str, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(tag, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[tag] = body
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.stats_counters["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                **self.stats_counters,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,77 @@
+"""In-memory LRU of fully rendered frame sequences.
+
+Keys are ``(source, content_hash, *render_params)`` tuples so that a new
+version of an icon never hits a stale entry, and entries of a given source
+can be dropped explicitly when a custom icon is saved or deleted.
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+# Rough per-pixel cost of a [r, g, b] Python list (list object + 3 small ints refs)
+_PIXEL_BYTES = 88
+_FRAME_OVERHEAD = 120
+
+
+def estimate_sequence_bytes(sequence: List[Tuple]) -> int:
+    total = 0
+    for colors, _duration in sequence:
+        nbytes = getattr(colors, "nbytes", None)
+        total += _FRAME_OVERHEAD + (nbytes if nbytes is not None else len(colors) * _PIXEL_BYTES)
+    return total
+
+
+class RenderCache:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple, Tuple[List[Tuple], int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats_counters = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, key: Tuple) -> Optional[List[Tuple]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats_counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats_counters["hits"] += 1
+            return entry[0]
+
+    def put(self, key: Tuple, sequence: List[Tuple]):
+        size = estimate_sequence_bytes(sequence)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (sequence, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.stats_counters["evictions"] += 1
+
+    def invalidate(self, source: Hashable):
+        """Drop every rendering of the given icon source"""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == source]:
+                _, size = self._entries.pop(key)
+                self._bytes -= size
+                self.stats_counters["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                **self.stats_counters,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
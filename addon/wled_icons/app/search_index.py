@@ -0,0 +1,235 @@
+"""In-memory search index over custom icon ids and names.
+
+Every id and name is indexed by its 1-, 2- and 3-character substrings, so a
+query term of up to 3 characters is a single posting lookup and a longer
+term intersects the postings of its trigrams (smallest first) before the
+candidates are checked for the actual substring. Ids, names and their words
+are also kept in sorted lists for exact and prefix lookups (bisect). Updates
+touch only the entries of the icon being saved or deleted.
+
+Results are ranked by the best way each term matches: exact id or name,
+then id / name prefix, word prefix, and plain substring. A single-term
+query walks those tiers best first, reading the sorted lists lazily from
+the cursor position, and stops as soon as the page is full: a short term
+matching most of the library costs the same as a rare one. Pagination uses
+an opaque cursor holding the sort key of the last result, which stays
+stable when icons are added between pages.
+"""
+import base64
+import bisect
+import heapq
+import json
+import re
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+GRAM_SIZES = (1, 2, 3)
+
+# Score of the best way a term matches a field
+SCORE_EXACT = 100
+SCORE_PREFIX = 60
+SCORE_WORD_PREFIX = 40
+SCORE_SUBSTRING = 10
+ID_WEIGHT = 1.2
+
+WORD_SPLIT = re.compile(r"[\s_\-.,;:/]+")
+
+
+def grams(text: str) -> Set[str]:
+    return {text[i:i + n] for n in GRAM_SIZES for i in range(len(text) - n + 1)}
+
+
+def words(text: str) -> Tuple[str, ...]:
+    return tuple(sorted(set(WORD_SPLIT.split(text)) - {""}))
+
+
+def term_score(term: str, text: str, text_words: Tuple[str, ...]) -> float:
+    if text == term:
+        return SCORE_EXACT
+    if text.startswith(term):
+        return SCORE_PREFIX
+    if any(word.startswith(term) for word in text_words):
+        return SCORE_WORD_PREFIX
+    if term in text:
+        return SCORE_SUBSTRING
+    return 0
+
+
+def encode_cursor(key: Tuple) -> str:
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key = tuple(json.loads(base64.urlsafe_b64decode(padded)))
+        float(key[0]), str(key[1]), str(key[2])
+        return key
+    except Exception:
+        raise ValueError("invalid cursor")
+
+
+class _Doc:
+    __slots__ = ("id", "name", "id_words", "name_words")
+
+    def __init__(self, icon_id: str, name: str):
+        self.id = icon_id.lower()
+        self.name = (name or "").lower()
+        self.id_words = words(self.id)
+        self.name_words = words(self.name)
+
+    def score(self, term: str) -> float:
+        return round(max(term_score(term, self.id, self.id_words) * ID_WEIGHT,
+                         term_score(term, self.name, self.name_words)), 3)
+
+
+class SearchIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._docs: Dict[str, _Doc] = {}
+        self._postings: Dict[str, Set[str]] = {}
+        # Sorted (text, id) lists for exact / prefix lookups
+        self._ids: List[Tuple[str, str]] = []
+        self._names: List[Tuple[str, str]] = []
+        self._id_words: List[Tuple[str, str]] = []
+        self._name_words: List[Tuple[str, str]] = []
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def add(self, icon_id: str, name: str):
+        """Index (or re-index) an icon"""
+        with self._lock:
+            self.remove(icon_id)
+            doc = self._docs[icon_id] = _Doc(icon_id, name)
+            for gram in grams(doc.id) | grams(doc.name):
+                self._postings.setdefault(gram, set()).add(icon_id)
+            for entries, key in self._sorted_entries(icon_id, doc):
+                bisect.insort(entries, key)
+
+    def remove(self, icon_id: str):
+        with self._lock:
+            doc = self._docs.pop(icon_id, None)
+            if doc is None:
+                return
+            for gram in grams(doc.id) | grams(doc.name):
+                posting = self._postings.get(gram)
+                if posting is not None:
+                    posting.discard(icon_id)
+                    if not posting:
+                        del self._postings[gram]
+            for entries, key in self._sorted_entries(icon_id, doc):
+                i = bisect.bisect_left(entries, key)
+                if i < len(entries) and entries[i] == key:
+                    del entries[i]
+
+    def _sorted_entries(self, icon_id: str, doc: _Doc):
+        yield self._ids, (doc.id, icon_id)
+        yield self._names, (doc.name, icon_id)
+        for word in doc.id_words:
+            yield self._id_words, (word, icon_id)
+        for word in doc.name_words:
+            yield self._name_words, (word, icon_id)
+
+    def _candidates(self, term: str) -> Set[str]:
+        """Ids whose id or name contains term"""
+        if len(term) <= max(GRAM_SIZES):
+            return self._postings.get(term, set())
+        postings = [self._postings.get(term[i:i + 3]) for i in range(len(term) - 2)]
+        if any(p is None for p in postings):
+            return set()
+        postings.sort(key=len)
+        found = set(postings[0])
+        for posting in postings[1:]:
+            found &= posting
+            if not found:
+                break
+        # Trigrams can all be present without the term being a substring
+        return {i for i in found if term in self._docs[i].id or term in self._docs[i].name}
+
+    def search(self, query: str, limit: int = 20, cursor: Optional[str] = None) -> Tuple[List[str], Optional[str]]:
+        """Return (ids for this page, cursor of the next page or None)
+
+        Every whitespace separated term of query must match the id or the name.
+        An empty query lists every icon by name.
+        """
+        terms = [t for t in query.lower().split() if t]
+        after = decode_cursor(cursor) if cursor else None
+        with self._lock:
+            if len(terms) == 1:
+                page = self._search_term(terms[0], limit, after)
+            else:
+                page = self._search_terms(terms, limit, after)
+        next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+        return [key[2] for key in page[:limit]], next_cursor
+
+    def _search_terms(self, terms: List[str], limit: int, after: Optional[Tuple]) -> List[Tuple]:
+        """Several terms (or none): score every candidate matching all of them"""
+        if terms:
+            matches: Set[str] = set()
+            for n, term in enumerate(sorted(terms, key=len, reverse=True)):
+                found = self._candidates(term)
+                matches = set(found) if n == 0 else matches & found
+                if not matches:
+                    break
+        else:
+            # Everything, by name: read the sorted name list from the cursor
+            lo = bisect.bisect_right(self._names, (after[1], after[2])) if after else 0
+            return [(0, name, icon_id) for name, icon_id in self._names[lo:lo + limit + 1]]
+        keys = []
+        for icon_id in matches:
+            doc = self._docs[icon_id]
+            # Sort key: best score first, then name, then id
+            key = (-round(sum(doc.score(t) for t in terms), 3), doc.name, icon_id)
+            if after is None or key > after:
+                keys.append(key)
+        return heapq.nsmallest(limit + 1, keys)
+
+    def _search_term(self, term: str, limit: int, after: Optional[Tuple]) -> List[Tuple]:
+        """One term: fill the page tier by tier, best tier first
+
+        Within a tier results follow the order of the list they come from
+        (id, name or word), so the sort key is (-score, text, id).
+        """
+        page: List[Tuple] = []
+        tiers = [
+            (SCORE_EXACT * ID_WEIGHT, self._ids, True),
+            (SCORE_EXACT, self._names, True),
+            (SCORE_PREFIX * ID_WEIGHT, self._ids, False),
+            (SCORE_PREFIX, self._names, False),
+            (SCORE_WORD_PREFIX * ID_WEIGHT, self._id_words, False),
+            (SCORE_WORD_PREFIX, self._name_words, False),
+        ]
+        for score, entries, exact in tiers:
+            score = round(score, 3)
+            if after is not None and -score < after[0]:
+                continue
+            lo = bisect.bisect_left(entries, (term, ""))
+            hi = bisect.bisect_left(entries, (term + ("\0" if exact else "\uffff"), ""))
+            if after is not None and -score == after[0]:
+                lo = max(lo, bisect.bisect_right(entries, (after[1], after[2])))
+            for i in range(lo, hi):
+                text, icon_id = entries[i]
+                doc = self._docs[icon_id]
+                # Listed in a better tier already, or under an earlier word in this one
+                if doc.score(term) != score:
+                    continue
+                if entries is self._id_words or entries is self._name_words:
+                    field_words = doc.id_words if entries is self._id_words else doc.name_words
+                    if text != next(w for w in field_words if w.startswith(term)):
+                        continue
+                page.append((-score, text, icon_id))
+                if len(page) > limit:
+                    return page
+
+        # Substrings only: candidates from the gram postings, ordered by name
+        keys = []
+        for icon_id in self._candidates(term):
+            doc = self._docs[icon_id]
+            score = doc.score(term)
+            if score > SCORE_SUBSTRING * ID_WEIGHT:
+                continue
+            key = (-score, doc.name, icon_id)
+            if after is None or key > after:
+                keys.append(key)
+        return page + heapq.nsmallest(limit + 1 - len(page), keys)
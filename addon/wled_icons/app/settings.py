@@ -0,0 +1,31 @@
+"""Add-on settings, read from the Home Assistant options file"""
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict
+
+# Data storage path (overridable for local runs outside the add-on container)
+DATA_DIR = Path(os.environ.get("WLED_ICONS_DATA_DIR", "/data"))
+OPTIONS_FILE = DATA_DIR / "options.json"
+
+
+def load_options() -> Dict[str, Any]:
+    """Load add-on options written by the Supervisor"""
+    if not OPTIONS_FILE.exists():
+        return {}
+    try:
+        with open(OPTIONS_FILE, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        logging.getLogger("wled_icons.settings").error("Could not load %s: %s", OPTIONS_FILE, e)
+        return {}
+
+
+OPTIONS = load_options()
+
+
+def get_option(name: str, default: Any) -> Any:
+    """Return an add-on option, falling back to default when unset"""
+    value = OPTIONS.get(name)
+    return default if value is None else value
@@ -0,0 +1,317 @@
+"""Frame transports to WLED.
+
+``http`` posts each frame to the JSON API (``seg.i``, delta encoded against
+the previous frame) and is the default and fallback. ``ws`` sends the same
+JSON messages over a persistent WebSocket per host (see ``wled_socket``):
+frames are queued and written without waiting for a response. The realtime
+transports stream raw RGB over UDP instead:
+
+- ``ddp``: DDP on port 4048, 480 LEDs per packet, push flag on the last one
+- ``dnrgb``: WLED realtime protocol 4 on port 21324, start index + RGB
+- ``drgb``: WLED realtime protocol 2 on port 21324 (490 LEDs max, larger
+  frames are sent as DNRGB chunks)
+
+WLED leaves realtime mode after its timeout when packets stop arriving, so
+realtime transports resend the last frame from ``keepalive()`` during long
+frames, and ``close()`` hands the panel back to its normal state.
+
+``GroupTransport`` drives several panels as one: every frame goes to all
+members in parallel (the same frame, or one tile each on a video wall), and
+members that answer faster are held back by their latency difference so the
+panels switch frames together.
+
+Transport methods are coroutines run on the animation engine loop; HTTP
+goes through the shared WledClient, UDP datagrams are sent directly.
+"""
+import asyncio
+import socket
+import struct
+import time
+from typing import List, Optional
+
+import numpy as np
+
+from . import frames, logs
+from .metrics import ENCODE_SECONDS
+from .wled_client import WledClient, WledError
+
+log = logs.get_logger("transport")
+
+DDP_PORT = 4048
+REALTIME_PORT = 21324
+
+DDP_HEADER = struct.Struct(">BBBBIH")
+DDP_VERSION = 0x40
+DDP_PUSH = 0x01
+DDP_TYPE_RGB24 = 0x0B
+DDP_DEST_DISPLAY = 0x01
+DDP_MAX_LEDS = 480
+
+PROTOCOL_DRGB = 2
+PROTOCOL_DNRGB = 4
+DRGB_MAX_LEDS = 490
+DNRGB_MAX_LEDS = 489
+
+TRANSPORTS = ("http", "ws", "ddp", "dnrgb", "drgb")
+
+# Seconds a finished animation waits for its queued WebSocket frames
+WS_FLUSH_TIMEOUT = 1.0
+
+# Smoothing of the per-member latency estimate (exponential moving average)
+LATENCY_SMOOTHING = 0.2
+
+
+def udp_address(host: str) -> str:
+    """Strip an optional :port (only meaningful for HTTP) and IPv6 brackets from host"""
+    if host.startswith("["):
+        return host[1:].split("]", 1)[0]
+    return host.rsplit(":", 1)[0] if host.count(":") == 1 else host
+
+
+class HttpTransport:
+    """JSON API transport; frames stay on the panel after playback"""
+    name = "http"
+    keepalive_interval: Optional[float] = None
+
+    def __init__(self, host: str, client: WledClient, brightness: int = 255):
+        self.host = host
+        self.client = client
+        self.brightness = brightness
+
+    async def send(self, pixels: np.ndarray):
+        await self.client.send_frame(self.host, pixels, self.brightness)
+
+    @property
+    def min_interval(self) -> float:
+        """Shortest time between frames the panel keeps up with (0: no limit)"""
+        return self.client.flow(self.host).min_interval
+
+    def ready(self) -> bool:
+        """False while the host's circuit breaker is open"""
+        return self.client.flow(self.host).ready()
+
+    async def keepalive(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class WebSocketTransport:
+    """JSON API frames over the host's persistent WebSocket; frames stay on the panel after playback"""
+    name = "ws"
+    # No round-trip per frame: the socket's bounded queue drops what the panel cannot take
+    min_interval = 0.0
+    keepalive_interval: Optional[float] = None
+
+    def __init__(self, host: str, client: WledClient, brightness: int = 255):
+        self.host = host
+        self.socket = client.socket(host)
+        self.brightness = brightness
+
+    async def send(self, pixels: np.ndarray):
+        self.socket.push(pixels, self.brightness)
+
+    def ready(self) -> bool:
+        """False while the socket waits to reconnect"""
+        return self.socket.ready()
+
+    async def keepalive(self):
+        pass
+
+    async def close(self):
+        # The last frame must reach the panel before anything else is sent to it
+        await self.socket.flush(WS_FLUSH_TIMEOUT)
+
+
+class UdpTransport:
+    """Base class for realtime UDP transports"""
+    name = "udp"
+    port = 0
+    # Datagrams are fire and forget: no round-trip to adapt to
+    min_interval = 0.0
+
+    def __init__(self, host: str, client: WledClient, brightness: int = 255, timeout: int = 2):
+        self.host = host
+        self.client = client
+        self.brightness = brightness
+        self.timeout = max(1, min(254, int(timeout)))
+        # Refresh well before WLED's realtime timeout expires
+        self.keepalive_interval = self.timeout / 2
+        # Resolved on the first frame (see _connect), then reused by every packet
+        self.address: Optional[tuple] = None
+        self._sock: Optional[socket.socket] = None
+        self._last_packets: List[bytes] = []
+        self.last_sent = 0.0
+
+    def ready(self) -> bool:
+        return True
+
+    async def send(self, pixels: np.ndarray):
+        if self._sock is None:
+            await self._connect()
+        with ENCODE_SECONDS.labels(self.name).time():
+            rgb = frames.scale_brightness(np.asarray(pixels, dtype=np.uint8), self.brightness)
+            self._last_packets = self.packets(rgb.reshape(-1, 3).tobytes())
+        self._flush()
+
+    async def _connect(self):
+        """Resolve the host once, off the loop: sendto() with a hostname would resolve (mDNS) on every packet"""
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(
+                udp_address(self.host), self.port, type=socket.SOCK_DGRAM)
+        except OSError as e:
+            raise WledError(f"Cannot resolve {self.host}: {e}") from e
+        family, _, _, _, address = infos[0]
+        sock = socket.socket(family, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        self._sock, self.address = sock, address
+
+    async def keepalive(self):
+        if self._last_packets and time.monotonic() - self.last_sent >= self.keepalive_interval:
+            self._flush()
+
+    def _flush(self):
+        for packet in self._last_packets:
+            self._sock.sendto(packet, self.address)
+        self.last_sent = time.monotonic()
+
+    def packets(self, data: bytes) -> List[bytes]:
+        raise NotImplementedError
+
+    async def close(self):
+        try:
+            await self.exit_realtime()
+        finally:
+            if self._sock is not None:
+                self._sock.close()
+            # Realtime data overwrote the pixels the HTTP delta encoder remembers
+            self.client.forget_frame(self.host)
+
+    async def exit_realtime(self):
+        raise NotImplementedError
+
+
+class DdpTransport(UdpTransport):
+    name = "ddp"
+    port = DDP_PORT
+
+    def __init__(self, host: str, client: WledClient, brightness: int = 255, timeout: int = 2):
+        super().__init__(host, client, brightness, timeout)
+        self._sequence = 0
+
+    def packets(self, data: bytes) -> List[bytes]:
+        self._sequence = self._sequence % 15 + 1
+        chunk = DDP_MAX_LEDS * 3
+        out = []
+        for offset in range(0, len(data), chunk):
+            payload = data[offset:offset + chunk]
+            flags = DDP_VERSION | (DDP_PUSH if offset + chunk >= len(data) else 0)
+            header = DDP_HEADER.pack(flags, self._sequence, DDP_TYPE_RGB24, DDP_DEST_DISPLAY,
+                                     offset, len(payload))
+            out.append(header + payload)
+        return out
+
+    async def exit_realtime(self):
+        # DDP has no "leave realtime" packet: ask the JSON API
+        try:
+            await self.client.set_state(self.host, {"live": False})
+        except WledError as e:
+            log.warning("Could not leave realtime mode", host=self.host, error=e)
+
+
+class WledRealtimeTransport(UdpTransport):
+    """DRGB / DNRGB on WLED's realtime UDP port"""
+    port = REALTIME_PORT
+
+    def __init__(self, host: str, client: WledClient, brightness: int = 255, timeout: int = 2,
+                 protocol: int = PROTOCOL_DNRGB):
+        super().__init__(host, client, brightness, timeout)
+        self.protocol = protocol
+        self.name = "drgb" if protocol == PROTOCOL_DRGB else "dnrgb"
+
+    def packets(self, data: bytes) -> List[bytes]:
+        leds = len(data) // 3
+        if self.protocol == PROTOCOL_DRGB and leds <= DRGB_MAX_LEDS:
+            return [bytes((PROTOCOL_DRGB, self.timeout)) + data]
+        chunk = DNRGB_MAX_LEDS * 3
+        return [
+            bytes((PROTOCOL_DNRGB, self.timeout)) + struct.pack(">H", offset // 3) + data[offset:offset + chunk]
+            for offset in range(0, len(data), chunk)
+        ]
+
+    async def exit_realtime(self):
+        # A timeout byte of 0 makes WLED leave realtime mode immediately
+        if self._sock is not None:
+            self._sock.sendto(bytes((self.protocol, 0)), self.address)
+
+
+class GroupTransport:
+    """Sends each frame to several member transports at once
+
+    With tiled=True frames are (members, pixels, 3) stacks and member i gets
+    tile i; otherwise every member gets the same frame.
+    """
+
+    def __init__(self, members: List, tiled: bool = False):
+        self.members = members
+        self.tiled = tiled
+        self.name = f"group/{members[0].name}"
+        intervals = [m.keepalive_interval for m in members if m.keepalive_interval]
+        self.keepalive_interval: Optional[float] = min(intervals) if intervals else None
+        # Estimated time until a frame shows, per member: WLED answers the
+        # JSON API once the state is applied, so the send round-trip is used
+        self.latency = {m.host: 0.0 for m in members}
+
+    async def send(self, pixels: np.ndarray):
+        lead = max(self.latency.values())
+        results = await asyncio.gather(
+            *(self._send(m, pixels[i] if self.tiled else pixels, lead - self.latency[m.host])
+              for i, m in enumerate(self.members)),
+            return_exceptions=True,
+        )
+        failed = [(m.host, r) for m, r in zip(self.members, results) if isinstance(r, Exception)]
+        if failed:
+            raise WledError("; ".join(f"{host}: {e}" for host, e in failed))
+
+    @property
+    def min_interval(self) -> float:
+        # The group plays at the pace of its slowest reachable member
+        return max((m.min_interval for m in self.members if m.ready()), default=0.0)
+
+    def ready(self) -> bool:
+        return any(m.ready() for m in self.members)
+
+    async def _send(self, member, pixels: np.ndarray, delay: float):
+        loop = asyncio.get_running_loop()
+        if delay > 0.001:
+            await asyncio.sleep(delay)
+        started = loop.time()
+        await member.send(pixels)
+        rtt = loop.time() - started
+        self.latency[member.host] += LATENCY_SMOOTHING * (rtt - self.latency[member.host])
+
+    async def keepalive(self):
+        await asyncio.gather(*(m.keepalive() for m in self.members), return_exceptions=True)
+
+    async def close(self):
+        results = await asyncio.gather(*(m.close() for m in self.members), return_exceptions=True)
+        for member, result in zip(self.members, results):
+            if isinstance(result, Exception):
+                log.warning("Could not close transport", host=member.host, error=result)
+
+    def member_status(self) -> List[dict]:
+        return [{"host": host, "latency_ms": round(latency * 1000, 1)} for host, latency in self.latency.items()]
+
+
+def create_transport(name: str, host: str, client: WledClient, brightness: int = 255, timeout: int = 2):
+    """Build a transport by name, falling back to HTTP"""
+    if name == "ws":
+        return WebSocketTransport(host, client, brightness)
+    if name == "ddp":
+        return DdpTransport(host, client, brightness, timeout)
+    if name == "dnrgb":
+        return WledRealtimeTransport(host, client, brightness, timeout, PROTOCOL_DNRGB)
+    if name == "drgb":
+        return WledRealtimeTransport(host, client, brightness, timeout, PROTOCOL_DRGB)
+    return HttpTransport(host, client, brightness)
@@ -0,0 +1,214 @@
+"""Shared async HTTP client for WLED devices.
+
+A single ``httpx.AsyncClient`` keeps connections alive per host, so frames
+after the first one reuse the same TCP connection instead of paying a
+handshake each time. A semaphore per host caps how many requests are in
+flight towards one ESP, which only handles a few concurrent connections.
+
+Frames go through a per-host FrameEncoder, so each request only carries the
+pixels that changed since the previous frame on that panel.
+
+Every request feeds the host's HostFlow (round-trip time, circuit breaker):
+frames get a timeout of a few round-trips, and a host that stopped
+answering fails fast until a probe request succeeds again.
+
+The ``ws`` transport pushes frames over a persistent WebSocket per host
+instead (``socket()``, see ``wled_socket``), sharing the same encoder.
+
+The client must be used from a single event loop (the animation engine's).
+"""
+import asyncio
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+import numpy as np
+
+from . import logs
+from .encoder import FrameEncoder
+from .flow import HostFlow
+from .metrics import ENCODE_SECONDS, WLED_REQUEST_SECONDS, WLED_RETRIES
+from .wled_socket import WledSocket
+
+log = logs.get_logger("wled")
+
+# State keys that leave the pixels of a frozen segment untouched
+PIXEL_SAFE_KEYS = {"on", "bri", "transition", "tt"}
+
+
+class WledError(Exception):
+    """A WLED device could not be reached or answered with an error"""
+
+    def __init__(self, detail: str, status_code: Optional[int] = None):
+        super().__init__(detail)
+        self.status_code = status_code
+
+
+class CircuitOpen(WledError):
+    """The host failed too many times in a row; requests are not sent until the cooldown ends"""
+
+
+class WledClient:
+    def __init__(self, timeout: float = 5.0, retries: int = 1, max_concurrency: int = 2,
+                 keepalive_expiry: float = 30.0, keyframe_interval: int = 30):
+        self.timeout = timeout
+        self.retries = retries
+        self.max_concurrency = max_concurrency
+        self.keepalive_expiry = keepalive_expiry
+        self._client: Optional[httpx.AsyncClient] = None
+        self._limits: Dict[str, asyncio.Semaphore] = {}
+        self.keyframe_interval = keyframe_interval
+        self._encoders: Dict[str, FrameEncoder] = {}
+        self._flows: Dict[str, HostFlow] = {}
+        self._sockets: Dict[str, WledSocket] = {}
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=None,
+                    max_keepalive_connections=None,
+                    keepalive_expiry=self.keepalive_expiry,
+                ),
+            )
+        return self._client
+
+    def _limit(self, host: str) -> asyncio.Semaphore:
+        sem = self._limits.get(host)
+        if sem is None:
+            sem = self._limits[host] = asyncio.Semaphore(self.max_concurrency)
+        return sem
+
+    def encoder(self, host: str) -> FrameEncoder:
+        enc = self._encoders.get(host)
+        if enc is None:
+            enc = self._encoders[host] = FrameEncoder(self.keyframe_interval)
+        return enc
+
+    def flow(self, host: str) -> HostFlow:
+        flow = self._flows.get(host)
+        if flow is None:
+            flow = self._flows[host] = HostFlow(host)
+        return flow
+
+    def socket(self, host: str) -> WledSocket:
+        """Persistent WebSocket to host, connected on its first frame"""
+        sock = self._sockets.get(host)
+        if sock is None:
+            sock = self._sockets[host] = WledSocket(host, self)
+        return sock
+
+    def reset_flow(self, host: Optional[str] = None):
+        """Forget the measured round-trip time and close the breaker (of every host when None)"""
+        for h in [host] if host else list(self._flows):
+            if h in self._flows:
+                self._flows[h].reset()
+
+    def forget_frame(self, host: str):
+        """The panel no longer shows our last frame: send a full one next time"""
+        enc = self._encoders.get(host)
+        if enc is not None:
+            enc.reset()
+
+    async def request(self, method: str, host: str, path: str = "/json/state",
+                      payload: Any = None, retries: Optional[int] = None,
+                      timeout: Optional[float] = None) -> httpx.Response:
+        """Send one request; connection errors, timeouts and 5xx are retried with backoff"""
+        retries = self.retries if retries is None else retries
+        url = f"http://{host}{path}"
+        flow = self.flow(host)
+        if not flow.allow():
+            raise CircuitOpen(f"Circuit open: {host} unreachable, retry in {flow.status()['retry_in']}s")
+        try:
+            async with self._limit(host):
+                for attempt in range(retries + 1):
+                    if attempt:
+                        WLED_RETRIES.labels(host).inc()
+                    start = time.perf_counter()
+                    try:
+                        r = await self._http().request(method, url, json=payload, timeout=timeout or self.timeout)
+                        rtt = time.perf_counter() - start
+                        WLED_REQUEST_SECONDS.observe(rtt)
+                    except httpx.HTTPError as e:
+                        if attempt < retries:
+                            await asyncio.sleep(0.1 * 2 ** attempt)
+                            continue
+                        self._failed(flow, e, time.perf_counter() - start)
+                        raise WledError(f"Connection error: {e!r}")
+                    if r.status_code >= 500 and attempt < retries:
+                        await asyncio.sleep(0.1 * 2 ** attempt)
+                        continue
+                    if r.status_code >= 500:
+                        self._failed(flow, r.status_code)
+                    elif flow.success(rtt):
+                        log.info("Host reachable again, circuit closed", host=host, rtt_ms=round(rtt * 1000, 1))
+                    if not r.is_success:
+                        raise WledError(f"WLED error: {r.status_code} {r.text}", r.status_code)
+                    return r
+        except asyncio.CancelledError:
+            flow.abandon()
+            raise
+
+    @staticmethod
+    def _failed(flow: HostFlow, error, elapsed: Optional[float] = None):
+        if flow.failure(elapsed):
+            log.warning("Host not answering, circuit open", host=flow.host, failures=flow.consecutive_failures,
+                        retry_in=flow.open_seconds, error=error)
+
+    async def get_state(self, host: str) -> Dict:
+        r = await self.request("GET", host, "/json/state")
+        return r.json()
+
+    async def get_info(self, host: str) -> Dict:
+        r = await self.request("GET", host, "/json/info")
+        return r.json()
+
+    async def set_state(self, host: str, payload: Dict, retries: Optional[int] = None) -> Dict:
+        if not PIXEL_SAFE_KEYS.issuperset(payload):
+            self.forget_frame(host)
+        r = await self.request("POST", host, "/json/state", payload, retries=retries)
+        return r.json() if r.content else {}
+
+    async def send_frame(self, host: str, colors, brightness: int = 255):
+        """Post one frame to segment 0 as a delta against the previous one
+
+        colors is a (pixels, 3) array or a [[r, g, b], ...] list. Frames are not
+        retried, the next one supersedes them; an unchanged frame is not sent.
+        """
+        enc = self.encoder(host)
+        flow = self.flow(host)
+        # One frame in flight per host: each delta is encoded against the frame sent before it
+        async with flow.sending:
+            with ENCODE_SECONDS.labels("http").time():
+                payload = enc.encode(np.asarray(colors, dtype=np.uint8))
+            if payload is None:
+                return
+            try:
+                # Large panels need several requests to stay within WLED's JSON buffer
+                for tokens in payload.chunks():
+                    await self.request("POST", host, "/json/state",
+                                       {"seg": [{"id": 0, "i": tokens, "bri": brightness}]}, retries=0,
+                                       timeout=flow.frame_timeout(self.timeout))
+            except BaseException:
+                # The request may or may not have reached the panel
+                enc.reset()
+                raise
+            enc.sent()
+
+    def encoder_stats(self) -> Dict[str, Dict]:
+        return {host: dict(enc.stats) for host, enc in self._encoders.items()}
+
+    def flow_stats(self) -> Dict[str, Dict]:
+        return {host: flow.status() for host, flow in list(self._flows.items())}
+
+    def socket_stats(self) -> Dict[str, Dict]:
+        return {host: sock.status() for host, sock in list(self._sockets.items())}
+
+    async def aclose(self):
+        for sock in list(self._sockets.values()):
+            await sock.aclose()
+        self._sockets.clear()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,209 @@
+"""Persistent WebSocket to a WLED device, for the ``ws`` frame transport.
+
+WLED accepts the same JSON state messages on ``ws://<host>/ws`` as on
+``POST /json/state``. Over one long-lived connection a frame costs a single
+small write: no HTTP request and response, and no round-trip to wait for
+before the next frame.
+
+- Frames go through a bounded queue (``QUEUE_SIZE``). When the panel or the
+  Wi-Fi cannot keep up, the oldest queued frame is dropped instead of
+  building a backlog of stale frames. Frames are delta encoded when they
+  are written, against the frame actually sent before them.
+- A writer task owns the connection. It connects on the first frame,
+  reconnects with exponential backoff after an error, and closes the
+  connection after ``IDLE_TIMEOUT`` seconds without frames.
+- Health checks are WebSocket pings every ``PING_INTERVAL`` seconds. A
+  missing pong within ``PING_TIMEOUT`` closes the connection, and the next
+  frame reconnects.
+- A reader task drains what WLED pushes (it broadcasts its state to every
+  client), so unread messages never stall the connection.
+
+Everything here runs on the animation engine loop.
+"""
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Dict, Optional
+
+import numpy as np
+from websockets.asyncio.client import ClientConnection, connect
+from websockets.exceptions import ConnectionClosed, WebSocketException
+
+from . import logs
+from .metrics import ENCODE_SECONDS, FRAMES_DROPPED
+
+log = logs.get_logger("ws")
+
+# Frames waiting to be written; older ones are dropped
+QUEUE_SIZE = 2
+CONNECT_TIMEOUT = 3.0
+PING_INTERVAL = 10.0
+PING_TIMEOUT = 5.0
+# Reconnection backoff bounds
+MIN_BACKOFF = 0.5
+MAX_BACKOFF = 30.0
+# Seconds without frames before the connection is closed
+IDLE_TIMEOUT = 60.0
+# Write buffer high-water mark: past it, frames wait in the queue where they can be dropped
+WRITE_LIMIT = 4096
+
+
+class WledSocket:
+    def __init__(self, host: str, client, queue_size: int = QUEUE_SIZE):
+        # client is the WledClient: its per-host encoder and flow are shared with HTTP frames
+        self.host = host
+        self.client = client
+        self._queue: deque = deque(maxlen=queue_size)
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._writer: Optional[asyncio.Task] = None
+        self._reader: Optional[asyncio.Task] = None
+        self._conn: Optional[ClientConnection] = None
+        self.backoff = MIN_BACKOFF
+        self.retry_at = 0.0
+        self.stats = {"sent": 0, "dropped": 0, "connects": 0, "errors": 0}
+
+    @property
+    def connected(self) -> bool:
+        return self._conn is not None
+
+    def ready(self) -> bool:
+        """False while waiting to reconnect after an error"""
+        return self.connected or time.monotonic() >= self.retry_at
+
+    def push(self, pixels: np.ndarray, brightness: int = 255):
+        """Queue a frame for the writer, dropping the oldest one if the queue is full"""
+        if len(self._queue) == self._queue.maxlen:
+            self.stats["dropped"] += 1
+            FRAMES_DROPPED.labels(self.host).inc()
+        self._queue.append((pixels, brightness))
+        self._idle.clear()
+        self._wakeup.set()
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.ensure_future(self._run())
+
+    async def flush(self, timeout: float):
+        """Wait until every queued frame is written (or timeout)"""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            log.debug("Frames still queued", host=self.host, queued=len(self._queue))
+
+    # --- Writer ---
+
+    async def _run(self):
+        try:
+            while True:
+                if not self._queue:
+                    self._idle.set()
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), IDLE_TIMEOUT)
+                    except asyncio.TimeoutError:
+                        await self._disconnect()
+                        return
+                    continue
+                if self._conn is None and not await self._connect():
+                    # Frames queued while the panel was unreachable are stale by now
+                    self.stats["dropped"] += len(self._queue)
+                    FRAMES_DROPPED.labels(self.host).inc(len(self._queue))
+                    self._queue.clear()
+                    continue
+                pixels, brightness = self._queue.popleft()
+                try:
+                    await self._send(self._conn, pixels, brightness)
+                except (WebSocketException, OSError) as e:
+                    self._failed(e)
+                    await self._disconnect()
+        finally:
+            self._idle.set()
+
+    async def _send(self, conn: ClientConnection, pixels: np.ndarray, brightness: int):
+        enc = self.client.encoder(self.host)
+        # Same encoder as HTTP frames: never interleave with one being posted
+        async with self.client.flow(self.host).sending:
+            with ENCODE_SECONDS.labels("ws").time():
+                payload = enc.encode(np.asarray(pixels, dtype=np.uint8))
+            if payload is None:
+                return
+            try:
+                for tokens in payload.chunks():
+                    await conn.send(json.dumps({"seg": [{"id": 0, "i": tokens, "bri": brightness}]},
+                                               separators=(",", ":")))
+            except BaseException:
+                # The message may or may not have reached the panel
+                enc.reset()
+                raise
+            enc.sent()
+        self.stats["sent"] += 1
+
+    # --- Connection ---
+
+    async def _connect(self) -> bool:
+        delay = self.retry_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            conn = await connect(f"ws://{self.host}/ws", open_timeout=CONNECT_TIMEOUT, proxy=None,
+                                 compression=None, ping_interval=PING_INTERVAL, ping_timeout=PING_TIMEOUT,
+                                 write_limit=WRITE_LIMIT, user_agent_header=None)
+        except (OSError, asyncio.TimeoutError, WebSocketException) as e:
+            self._failed(e)
+            return False
+        self._conn = conn
+        self._reader = asyncio.ensure_future(self._drain(conn))
+        self.backoff = MIN_BACKOFF
+        self.stats["connects"] += 1
+        # Whatever the panel shows now, the first frame on this connection is a full one
+        self.client.forget_frame(self.host)
+        log.info("WebSocket connected", host=self.host, connects=self.stats["connects"])
+        return True
+
+    async def _drain(self, conn: ClientConnection):
+        """Read and discard WLED's messages until the connection closes"""
+        try:
+            async for _ in conn:
+                pass
+        except ConnectionClosed as e:
+            log.info("WebSocket closed by the panel", host=self.host, error=e)
+        if self._conn is conn:
+            # Dead connection (missed pong, device reboot): the next frame reconnects
+            self._conn = None
+            self.client.forget_frame(self.host)
+
+    def _failed(self, error):
+        self.stats["errors"] += 1
+        self.retry_at = time.monotonic() + self.backoff
+        log.warning("WebSocket error", host=self.host, retry_in=self.backoff, error=error)
+        self.backoff = min(self.backoff * 2, MAX_BACKOFF)
+
+    async def _disconnect(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            await conn.close()
+        if self._reader is not None:
+            self._reader.cancel()
+            self._reader = None
+
+    def status(self) -> Dict:
+        latency = self._conn.latency if self._conn is not None else None
+        return {
+            **self.stats,
+            "connected": self.connected,
+            "queued": len(self._queue),
+            "ping_ms": round(latency * 1000, 1) if latency else None,
+            "retry_in": round(max(0.0, self.retry_at - time.monotonic()), 1) if not self.connected else 0,
+        }
+
+    async def aclose(self):
+        self._queue.clear()
+        if self._writer is not None:
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+            self._writer = None
+        await self._disconnect()
@@ -0,0 +1,96 @@
+"""Microbenchmark: per-pixel Python pipeline vs NumPy frame pipeline.
+
+Renders a random RGBA animation (recolor, rotate, flip, alpha threshold,
+brightness, serialization) at 8x8, 16x16 and 32x32 with the legacy loops
+that used to live in main.py and with app.frames, and prints the time per
+frame and the speedup.
+
+    cd addon/wled_icons && python -m benchmarks.bench_pixels
+"""
+import argparse
+import timeit
+
+import numpy as np
+from PIL import Image
+
+from app import frames
+
+
+# --- Legacy per-pixel implementation (reference) ---
+
+def legacy_recolor(img, rgb):
+    img = img.convert("RGBA")
+    out = []
+    for r, g, b, a in img.getdata():
+        if a > 0:
+            out.append((*rgb, a))
+        else:
+            out.append((r, g, b, a))
+    out_img = Image.new("RGBA", img.size)
+    out_img.putdata(out)
+    return out_img
+
+
+def legacy_frame_to_colors(frame, rotate=0, flip_h=False, flip_v=False):
+    if rotate:
+        frame = frame.rotate(-rotate, expand=False)
+    if flip_h:
+        frame = frame.transpose(Image.FLIP_LEFT_RIGHT)
+    if flip_v:
+        frame = frame.transpose(Image.FLIP_TOP_BOTTOM)
+    width, height = frame.size
+    pixels = []
+    data = frame.getdata()
+    for y in range(height):
+        for x in range(width):
+            r, g, b, a = data[y * width + x]
+            if a < 10:
+                r, g, b = 0, 0, 0
+            pixels.append([r, g, b])
+    return pixels
+
+
+def legacy_render(images, rgb, brightness):
+    out = []
+    for img in images:
+        colors = legacy_frame_to_colors(legacy_recolor(img, rgb), 90, True, False)
+        out.append([[int(c * brightness / 255) for c in pixel] for pixel in colors])
+    return out
+
+
+def vectorized_render(stack, rgb, brightness):
+    size = (stack.shape[2], stack.shape[1])
+    rendered = frames.render(stack, rgb, 90, True, False, size=size)
+    rendered = frames.scale_brightness(rendered, brightness)
+    return [frames.to_colors(pixels) for pixels in rendered]
+
+
+def bench(size: int, n_frames: int, repeat: int):
+    rng = np.random.default_rng(size)
+    stack = rng.integers(0, 256, (n_frames, size, size, 4), dtype=np.uint8)
+    images = [Image.fromarray(f, "RGBA") for f in stack]
+    rgb, brightness = (255, 64, 0), 128
+
+    assert legacy_render(images, rgb, brightness) == vectorized_render(stack, rgb, brightness)
+
+    number = max(1, 2000 // (size * n_frames))
+    legacy = min(timeit.repeat(lambda: legacy_render(images, rgb, brightness), number=number, repeat=repeat))
+    vector = min(timeit.repeat(lambda: vectorized_render(stack, rgb, brightness), number=number, repeat=repeat))
+    per_frame = lambda t: t / number / n_frames * 1e6
+    return per_frame(legacy), per_frame(vector)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=30, help="frames per animation")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'size':>7} {'legacy us/frame':>16} {'numpy us/frame':>15} {'speedup':>8}")
+    for size in (8, 16, 32):
+        legacy, vector = bench(size, args.frames, args.repeat)
+        print(f"{size:>3}x{size:<3} {legacy:>16.1f} {vector:>15.1f} {legacy / vector:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
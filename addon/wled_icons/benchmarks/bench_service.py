@@ -0,0 +1,443 @@
+"""End-to-end benchmark: the service driving a fake WLED, without network.
+
+Starts benchmarks.fake_wled in a separate process, loads the service
+in-process (FastAPI TestClient) on a temporary data directory, seeds it with
+synthetic WI icons and LaMetric GIFs, then measures:
+
+- request latency percentiles of the custom icon endpoints, /show/icon and
+  /api/icons/bulk-display (``latency_ms``; ``cold_ms`` is the first,
+  uncached request)
+- playback seen by the fake device, per transport: achieved vs requested
+  FPS, frame jitter (interval minus the requested one) and delay to the
+  first frame. The ``requests`` transport is the baseline the engine
+  replaced: the same frames posted whole with a blocking ``requests.post``,
+  then a sleep of the frame duration
+- service CPU time per frame played and memory (RSS) after each scenario
+
+Results are written as JSON; two result files can be compared to spot
+regressions between versions::
+
+    cd addon/wled_icons
+    python -m benchmarks.bench_service --output before.json
+    python -m benchmarks.bench_service --output after.json
+    python -m benchmarks.bench_service --compare before.json after.json
+"""
+import argparse
+import io
+import json
+import math
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+import numpy as np
+import requests
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parent.parent
+
+ANIMATED_GIF_ID = "90001"
+STATIC_PNG_ID = "90002"
+
+# Metrics where a larger value is better; every other compared metric is a cost
+HIGHER_IS_BETTER = ("achieved_fps", "fps_ratio")
+
+
+# --- Measurements ---
+
+def summarize(values: List[float]) -> Dict:
+    """Percentiles of a list of milliseconds"""
+    if not values:
+        return {"n": 0}
+    ordered = sorted(values)
+
+    def pct(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1)], 3)
+
+    return {
+        "n": len(values),
+        "mean": round(statistics.fmean(values), 3),
+        "p50": pct(50),
+        "p90": pct(90),
+        "p99": pct(99),
+        "max": round(ordered[-1], 3),
+    }
+
+
+def rss_mb() -> float:
+    """Current resident memory of this process"""
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20, 2)
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (2 ** 20 if sys.platform == "darwin" else 2 ** 10), 2)
+
+
+def frame_times(frames: List[list], fps: float) -> List[float]:
+    """Arrival time of each displayed frame
+
+    Payloads split over several requests or packets arrive within a fraction
+    of the frame interval and count as one frame.
+    """
+    times: List[float] = []
+    for t, _, _ in sorted(frames):
+        if not times or t - times[-1] > 0.25 / fps:
+            times.append(t)
+    return times
+
+
+def playback_metrics(times: List[float], fps: float, started: float) -> Dict:
+    """FPS and jitter of frames as the device received them"""
+    if len(times) < 2:
+        return {"frames": len(times), "requested_fps": fps}
+    intervals = np.diff(times)
+    achieved = (len(times) - 1) / (times[-1] - times[0])
+    deviation = np.abs(intervals - 1.0 / fps) * 1000
+    return {
+        "frames": len(times),
+        "requested_fps": fps,
+        "achieved_fps": round(achieved, 2),
+        "fps_ratio": round(achieved / fps, 4),
+        "first_frame_ms": round((times[0] - started) * 1000, 3),
+        "jitter_ms": {
+            "mean": round(float(deviation.mean()), 3),
+            "p95": round(float(np.percentile(deviation, 95)), 3),
+            "max": round(float(deviation.max()), 3),
+            "std": round(float(np.std(intervals) * 1000), 3),
+        },
+    }
+
+
+# --- Synthetic icons ---
+
+def sprite_frames(n_frames: int, width: int, height: int) -> np.ndarray:
+    """(n, h, w, 4) frames: a 3x3 sprite moving over a static gradient
+
+    Every frame differs from the previous one, so none is skipped by the
+    delta encoder, and only a few pixels change, like a typical icon.
+    """
+    y, x = np.mgrid[0:height, 0:width]
+    background = np.stack([x * 255 // max(1, width - 1), y * 255 // max(1, height - 1),
+                           np.full_like(x, 64), np.full_like(x, 255)], axis=-1).astype(np.uint8)
+    stack = np.repeat(background[None], n_frames, axis=0)
+    for i in range(n_frames):
+        px, py = i % (width - 2), (i // (width - 2)) % (height - 2)
+        stack[i, py:py + 3, px:px + 3] = (255, 255, 255, 255)
+    return stack
+
+
+def synthetic_gif(n_frames: int, width: int, height: int, fps: float) -> bytes:
+    images = [Image.fromarray(f, "RGBA").convert("RGB") for f in sprite_frames(n_frames, width, height)]
+    buf = io.BytesIO()
+    images[0].save(buf, format="GIF", save_all=True, append_images=images[1:],
+                   duration=int(round(1000 / fps)), loop=0)
+    return buf.getvalue()
+
+
+def synthetic_png(width: int, height: int) -> bytes:
+    buf = io.BytesIO()
+    Image.fromarray(sprite_frames(1, width, height)[0], "RGBA").save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def synthetic_wi(n_frames: int, width: int, height: int, fps: int, name: str) -> Dict:
+    grids = [[["#%02X%02X%02X" % tuple(px[:3]) for px in row] for row in frame]
+             for frame in sprite_frames(n_frames, width, height)]
+    return {"name": name, "frames": grids, "fps": fps, "created": "bench", "modified": "bench"}
+
+
+# --- Harness ---
+
+class FakeDevice:
+    """benchmarks.fake_wled running in a child process"""
+
+    def __init__(self, address: str, width: int, height: int, delay: float):
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.fake_wled", "--address", address,
+             "--width", str(width), "--height", str(height), "--delay", str(delay)],
+            cwd=ROOT, stdout=subprocess.PIPE, text=True,
+        )
+        self.host = self.proc.stdout.readline().strip()
+        if not self.host:
+            raise RuntimeError(f"fake WLED did not start on {address}")
+        self.http = httpx.Client(base_url=f"http://{self.host}", timeout=5)
+
+    def frames(self) -> List[list]:
+        return self.http.get("/_bench/frames").json()
+
+    def clear(self):
+        self.http.delete("/_bench/frames")
+
+    def close(self):
+        self.http.close()
+        self.proc.terminate()
+        self.proc.wait(timeout=5)
+
+
+def timed(call, url: str, **kwargs):
+    """(milliseconds, response) of one request, which must succeed"""
+    start = time.perf_counter()
+    r = call(url, **kwargs)
+    elapsed = (time.perf_counter() - start) * 1000
+    if r.status_code != 200:
+        raise RuntimeError(f"{url}: {r.status_code} {r.text}")
+    return elapsed, r
+
+
+class Bench:
+    def __init__(self, service, client, device: FakeDevice, args):
+        self.service = service
+        self.client = client
+        self.device = device
+        self.args = args
+
+    def wait_idle(self, timeout: float):
+        """Wait for the player on the fake device to finish"""
+        deadline = time.monotonic() + timeout
+        while self.service.engine.player(self.device.host) is not None:
+            if time.monotonic() > deadline:
+                raise RuntimeError("playback did not finish in time")
+            time.sleep(0.05)
+
+    def play(self, url: str, body: Dict, fps: float, expected: float) -> Dict:
+        """Start a playback, wait for its end and measure it on the device side"""
+        self.device.clear()
+        cpu = time.process_time()
+        started = time.monotonic()
+        latency, r = timed(self.client.post, url, json=body)
+        self.wait_idle(expected * 3 + 5)
+        cpu = time.process_time() - cpu
+        times = frame_times(self.device.frames(), fps)
+        metrics = {
+            "latency_ms": round(latency, 3),
+            **playback_metrics(times, fps, started),
+            "cpu_ms_per_frame": round(cpu * 1000 / max(1, len(times)), 4),
+            "rss_mb": rss_mb(),
+        }
+        if "job_id" in r.json():
+            playlist = self.client.get(f"/api/playlists/{r.json()['job_id']}").json()
+            metrics["late_frames"] = playlist.get("late_frames")
+            metrics["dropped_frames"] = playlist.get("dropped_frames")
+        return metrics
+
+    def play_requests(self, icon_id: str, fps: float, loops: int) -> Dict:
+        """Baseline playback: full frames posted one by one with requests.post, sleeping in between"""
+        req = self.service.IconRequest(icon_id=icon_id, fps=fps, loop=loops)
+        sequence = self.service.prepare_sequence(req, self.service.geometries.get(self.device.host))
+        url = f"http://{self.device.host}/json/state"
+        self.device.clear()
+        cpu = time.process_time()
+        started = time.monotonic()
+        with requests.Session() as session:
+            for _ in range(loops):
+                for colors, duration in sequence:
+                    payload = {"seg": [{"id": 0, "i": np.asarray(colors).tolist(), "bri": 255}]}
+                    session.post(url, json=payload, timeout=5).raise_for_status()
+                    time.sleep(duration)
+        cpu = time.process_time() - cpu
+        times = frame_times(self.device.frames(), fps)
+        return {
+            **playback_metrics(times, fps, started),
+            "cpu_ms_per_frame": round(cpu * 1000 / max(1, len(times)), 4),
+            "rss_mb": rss_mb(),
+        }
+
+    # --- Scenarios ---
+
+    def custom_icons(self) -> Dict:
+        """Save, read, list, search, display and delete WI icons"""
+        n, size = self.args.requests, self.args.size
+        icons = [synthetic_wi(1 + i % 4, size, size, self.args.fps, f"bench icon {i}") for i in range(n)]
+        timings: Dict[str, List[float]] = {k: [] for k in ("save", "get", "list", "search", "display", "delete")}
+        for i, icon in enumerate(icons):
+            timings["save"].append(timed(self.client.post, f"/api/icons/WIBENCH{i}", json=icon)[0])
+        for i in range(n):
+            timings["get"].append(timed(self.client.get, f"/api/icons/WIBENCH{i}")[0])
+            timings["search"].append(timed(self.client.get, "/api/icons/search",
+                                           params={"q": f"icon {i}", "fields": "meta"})[0])
+            timings["display"].append(timed(self.client.post, f"/api/icons/WIBENCH{i}/display",
+                                            params={"host": self.device.host})[0])
+        for _ in range(max(1, n // 10)):
+            timings["list"].append(timed(self.client.get, "/api/icons")[0])
+        for i in range(n):
+            timings["delete"].append(timed(self.client.delete, f"/api/icons/WIBENCH{i}")[0])
+        return {name: {"latency_ms": summarize(values)} for name, values in timings.items()}
+
+    def show_static(self) -> Dict:
+        """Static /show/icon, WI and LaMetric: first request renders, the next hit the cache"""
+        results = {}
+        for label, icon_id in (("wi", "WIBENCHSTATIC"), ("lametric", STATIC_PNG_ID)):
+            body = {"host": self.device.host, "icon_id": icon_id, "animate": False}
+            cold = timed(self.client.post, "/show/icon", json=body)[0]
+            warm = [timed(self.client.post, "/show/icon", json=body)[0] for _ in range(self.args.requests)]
+            results[label] = {"cold_ms": round(cold, 3), "latency_ms": summarize(warm)}
+        return results
+
+    def animations(self) -> Dict:
+        """Animated /show/icon on every transport, WI and LaMetric GIF"""
+        fps, frames = self.args.fps, self.args.frames
+        loops = max(1, math.ceil(self.args.seconds * fps / frames))
+        expected = loops * frames / fps
+        results = {}
+        for transport in self.args.transports:
+            for label, icon_id in (("wi", "WIBENCHANIM"), ("lametric", ANIMATED_GIF_ID)):
+                if transport == "requests":
+                    results[f"{transport}_{label}"] = self.play_requests(icon_id, fps, loops)
+                    continue
+                body = {"host": self.device.host, "icon_id": icon_id, "fps": fps, "loop": loops,
+                        "transport": transport}
+                results[f"{transport}_{label}"] = self.play("/show/icon", body, fps, expected)
+        return results
+
+    def bulk_display(self) -> Dict:
+        """A playlist of animated icons played by the engine"""
+        duration = self.args.seconds / 4
+        icons = ["WIBENCHANIM", ANIMATED_GIF_ID, "WIBENCHANIM", ANIMATED_GIF_ID]
+        body = {"host": self.device.host, "icons": icons, "duration": duration, "loop": 1}
+        metrics = self.play("/api/icons/bulk-display", body, self.args.fps, duration * len(icons))
+        return {"http": metrics}
+
+    def run(self) -> Dict:
+        size, fps = self.args.size, self.args.fps
+        # Icons used by the playback scenarios; LaMetric icons go straight into the download cache
+        timed(self.client.post, "/api/icons/WIBENCHSTATIC", json=synthetic_wi(1, size, size, fps, "bench static"))
+        timed(self.client.post, "/api/icons/WIBENCHANIM",
+              json=synthetic_wi(self.args.frames, size, size, fps, "bench animation"))
+        self.service.lametric_cache._store(ANIMATED_GIF_ID, synthetic_gif(self.args.frames, size, size, fps), {})
+        self.service.lametric_cache._store(STATIC_PNG_ID, synthetic_png(size, size), {})
+        # Open the connection and read the panel geometry outside of the measurements
+        timed(self.client.post, "/show/icon",
+              json={"host": self.device.host, "icon_id": "WIBENCHSTATIC", "animate": False, "rotate": 180})
+
+        results = {}
+        for name in self.args.scenarios:
+            print(f"[BENCH] {name}...", file=sys.stderr)
+            results[name] = getattr(self, name)()
+        return results
+
+
+SCENARIOS = ("custom_icons", "show_static", "animations", "bulk_display")
+
+
+def run(args) -> Dict:
+    data_dir = tempfile.mkdtemp(prefix="wled-icons-bench-")
+    # The service reads its data directory when it is imported
+    os.environ["WLED_ICONS_DATA_DIR"] = data_dir
+    sys.path.insert(0, str(ROOT))
+    from fastapi.testclient import TestClient
+    from app import main as service
+
+    device = FakeDevice(args.address, args.size, args.size, args.delay)
+    try:
+        with TestClient(service.app) as client:
+            results = Bench(service, client, device, args).run()
+    finally:
+        device.close()
+        service.icon_store.close()
+        shutil.rmtree(data_dir, ignore_errors=True)
+    return {
+        "meta": {
+            "version": service.app.version,
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+            "peak_rss_mb": peak_rss_mb(),
+        },
+        "results": results,
+    }
+
+
+# --- Comparison ---
+
+def flatten(tree: Dict, prefix: str = "") -> Dict[str, float]:
+    out = {}
+    for key, value in tree.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            out.update(flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[path] = value
+    return out
+
+
+def compared(path: str) -> bool:
+    """Costs (times, memory) and achieved frame rates; counts are context only"""
+    if path.endswith(".n"):
+        return False
+    return "_ms" in path or path.endswith("_mb") or path.endswith(HIGHER_IS_BETTER)
+
+
+def compare(old_file: str, new_file: str, threshold: float) -> int:
+    """Print every metric of two result files; return the number of regressions"""
+    with open(old_file) as f:
+        old = json.load(f)
+    with open(new_file) as f:
+        new = json.load(f)
+    before, after = flatten(old["results"]), flatten(new["results"])
+    print(f"{old['meta'].get('version')} -> {new['meta'].get('version')}")
+    print(f"{'metric':<52} {'before':>10} {'after':>10} {'change':>8}")
+    regressions = 0
+    for path in sorted(before.keys() & after.keys()):
+        if not compared(path):
+            continue
+        a, b = before[path], after[path]
+        change = (b - a) / a if a else 0.0
+        worse = -change if path.endswith(HIGHER_IS_BETTER) else change
+        flag = ""
+        if worse > threshold:
+            flag = " REGRESSION"
+            regressions += 1
+        print(f"{path:<52} {a:>10.3f} {b:>10.3f} {change:>+7.1%}{flag}")
+    print(f"{regressions} regression(s) above {threshold:.0%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", help="write results to this JSON file (default: stdout)")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="compare two result files instead of running")
+    parser.add_argument("--threshold", type=float, default=0.20,
+                        help="relative change counted as a regression (default: 0.20)")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--transports", nargs="+", default=["requests", "http", "ws", "ddp", "dnrgb"],
+                        help="requests is the blocking baseline, the others go through the engine")
+    parser.add_argument("--address", default="127.0.0.42", help="loopback address of the fake WLED")
+    parser.add_argument("--size", type=int, default=8, help="panel width and height")
+    parser.add_argument("--fps", type=int, default=20, help="requested frame rate")
+    parser.add_argument("--frames", type=int, default=12, help="frames per synthetic animation")
+    parser.add_argument("--seconds", type=float, default=3.0, help="length of each playback")
+    parser.add_argument("--requests", type=int, default=50, help="requests per latency measurement")
+    parser.add_argument("--delay", type=float, default=0.0, help="simulated WLED time per JSON request")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold) else 0)
+
+    report = json.dumps(run(args), indent=2)
+    if args.output:
+        Path(args.output).write_text(report + "\n")
+        print(f"[BENCH] Results written to {args.output}", file=sys.stderr)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
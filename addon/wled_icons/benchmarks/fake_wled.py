@@ -0,0 +1,281 @@
+"""Stand-in WLED device for benchmarks: records when every frame arrives.
+
+Answers the JSON API (``/json/info``, ``/json/state``) over HTTP and over a
+WebSocket on ``/ws`` (minimal RFC 6455 server: text messages, ping/pong,
+close), and listens for realtime UDP frames (DDP on 4048, DRGB/DNRGB on 21324) on the same
+loopback address. Every frame is recorded as ``[monotonic time, transport,
+bytes]``; CLOCK_MONOTONIC is shared by all processes, so the timestamps
+compare directly with the benchmark's own clock.
+
+Run it in its own process so its CPU time does not count against the
+service. It prints its HTTP host on the first line of stdout::
+
+    python -m benchmarks.fake_wled --address 127.0.0.42 --width 8 --height 8
+
+Recorded frames are read with ``GET /_bench/frames`` and cleared with
+``DELETE /_bench/frames``. The tests run it in-process instead (the
+``fake_wled`` fixture): ``serve_forever()`` on a thread, ``close()`` after.
+"""
+import argparse
+import base64
+import hashlib
+import json
+import socket
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+DDP_PORT = 4048
+REALTIME_PORT = 21324
+DDP_PUSH = 0x01
+
+WS_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+WS_TEXT, WS_CLOSE, WS_PING, WS_PONG = 0x1, 0x8, 0x9, 0xA
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.frames: List[list] = []
+
+    def add(self, kind: str, size: int):
+        now = time.monotonic()
+        with self._lock:
+            self.frames.append([now, kind, size])
+
+    def take(self, clear: bool = False) -> List[list]:
+        with self._lock:
+            frames = list(self.frames)
+            if clear:
+                self.frames.clear()
+            return frames
+
+
+class FakeWled:
+    def __init__(self, address: str = "127.0.0.42", width: int = 8, height: int = 8, delay: float = 0.0):
+        self.address = address
+        self.width = width
+        self.height = height
+        # Simulated processing time of the ESP per JSON request
+        self.delay = delay
+        self.recorder = Recorder()
+        # Open WebSocket connections, so a test can cut them (drop_websockets)
+        self.websockets = set()
+        self.state = {"on": True, "bri": 128, "live": False, "seg": [{"id": 0, "start": 0, "stop": width * height}]}
+        self._http = ThreadingHTTPServer((address, 0), self._handler())
+        self._udp = [self._bind_udp(DDP_PORT, self._on_ddp), self._bind_udp(REALTIME_PORT, self._on_realtime)]
+
+    @property
+    def host(self) -> str:
+        return f"{self.address}:{self._http.server_port}"
+
+    def info(self) -> dict:
+        return {
+            "ver": "0.14.0-fake",
+            "name": "fake-wled",
+            "leds": {"count": self.width * self.height, "matrix": {"w": self.width, "h": self.height}},
+            "udpport": REALTIME_PORT,
+            "ws": 0,
+        }
+
+    def apply(self, body: dict, kind: str, size: int):
+        """Apply a JSON state message; frames (seg.i) are recorded"""
+        segments = body.get("seg") or []
+        if any("i" in seg for seg in segments):
+            self.recorder.add(kind, size)
+        for key in ("on", "bri", "live"):
+            if key in body:
+                self.state[key] = body[key]
+
+    def serve_forever(self):
+        for sock, handler in self._udp:
+            threading.Thread(target=self._udp_loop, args=(sock, handler), daemon=True).start()
+        self._http.serve_forever()
+
+    def drop_websockets(self):
+        """Cut every WebSocket connection without a close frame, like a rebooting device"""
+        for conn in list(self.websockets):
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def close(self):
+        self.drop_websockets()
+        self._http.shutdown()
+        self._http.server_close()
+        for sock, _ in self._udp:
+            # Wakes the receiving thread up; closing alone leaves the port bound until recv returns
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+    # --- UDP ---
+
+    def _bind_udp(self, port: int, handler):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind((self.address, port))
+        return sock, handler
+
+    @staticmethod
+    def _udp_loop(sock, handler):
+        while True:
+            try:
+                data = sock.recv(65535)
+            except OSError:
+                return
+            if not data:
+                # Shut down by close()
+                return
+            handler(data)
+
+    def _on_ddp(self, data: bytes):
+        # Multi-packet frames are displayed on the packet carrying the push flag
+        if len(data) > 10 and data[0] & DDP_PUSH:
+            self.recorder.add("ddp", len(data))
+
+    def _on_realtime(self, data: bytes):
+        protocol = data[0]
+        if len(data) <= 2:
+            # Timeout byte only: leave realtime mode
+            return
+        if protocol == 4 and struct.unpack(">H", data[2:4])[0] != 0:
+            # DNRGB continuation packet of the same frame
+            return
+        self.recorder.add("drgb" if protocol == 2 else "dnrgb", len(data))
+
+    # --- HTTP ---
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _reply(self, obj, code: int = 200):
+                body = json.dumps(obj).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == "/ws" and self.headers.get("Upgrade", "").lower() == "websocket":
+                    self._websocket()
+                elif self.path == "/json/info":
+                    self._reply(fake.info())
+                elif self.path == "/json/state":
+                    self._reply(fake.state)
+                elif self.path == "/json":
+                    self._reply({"state": fake.state, "info": fake.info()})
+                elif self.path == "/_bench/frames":
+                    self._reply(fake.recorder.take())
+                else:
+                    self._reply({"error": "not found"}, 404)
+
+            def do_DELETE(self):
+                if self.path == "/_bench/frames":
+                    fake.recorder.take(clear=True)
+                    self._reply({"success": True})
+                else:
+                    self._reply({"error": "not found"}, 404)
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if fake.delay:
+                    time.sleep(fake.delay)
+                try:
+                    body = json.loads(raw or b"{}")
+                except ValueError:
+                    self._reply({"error": 9}, 400)
+                    return
+                fake.apply(body, "http", len(raw))
+                self._reply({"success": True})
+
+            # --- WebSocket ---
+
+            def _websocket(self):
+                key = self.headers["Sec-WebSocket-Key"].encode()
+                accept = base64.b64encode(hashlib.sha1(key + WS_GUID).digest()).decode()
+                self.send_response(101)
+                self.send_header("Upgrade", "websocket")
+                self.send_header("Connection", "Upgrade")
+                self.send_header("Sec-WebSocket-Accept", accept)
+                self.end_headers()
+                # Like WLED, greet the new client with the full state
+                self._ws_send(WS_TEXT, json.dumps({"state": fake.state, "info": fake.info()}).encode())
+                fake.websockets.add(self.connection)
+                try:
+                    self._ws_serve()
+                finally:
+                    fake.websockets.discard(self.connection)
+
+            def _ws_serve(self):
+                while True:
+                    opcode, payload = self._ws_read()
+                    if opcode is None or opcode == WS_CLOSE:
+                        if opcode == WS_CLOSE:
+                            self._ws_send(WS_CLOSE, payload[:2])
+                        self.close_connection = True
+                        return
+                    if opcode == WS_PING:
+                        self._ws_send(WS_PONG, payload)
+                    elif opcode == WS_TEXT:
+                        if fake.delay:
+                            time.sleep(fake.delay)
+                        try:
+                            fake.apply(json.loads(payload), "ws", len(payload))
+                        except ValueError:
+                            pass
+
+            def _ws_read(self):
+                """(opcode, payload) of the next client frame, (None, b"") once the connection is gone"""
+                head = self.rfile.read(2)
+                if len(head) < 2:
+                    return None, b""
+                length = head[1] & 0x7F
+                if length == 126:
+                    length = struct.unpack(">H", self.rfile.read(2))[0]
+                elif length == 127:
+                    length = struct.unpack(">Q", self.rfile.read(8))[0]
+                mask = self.rfile.read(4) if head[1] & 0x80 else b"\0\0\0\0"
+                data = self.rfile.read(length)
+                key = int.from_bytes((mask * (length // 4 + 1))[:length], "big")
+                payload = (int.from_bytes(data, "big") ^ key).to_bytes(length, "big")
+                return head[0] & 0x0F, payload
+
+            def _ws_send(self, opcode: int, payload: bytes):
+                if len(payload) < 126:
+                    header = bytes((0x80 | opcode, len(payload)))
+                elif len(payload) < 65536:
+                    header = bytes((0x80 | opcode, 126)) + struct.pack(">H", len(payload))
+                else:
+                    header = bytes((0x80 | opcode, 127)) + struct.pack(">Q", len(payload))
+                self.wfile.write(header + payload)
+                self.wfile.flush()
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--address", default="127.0.0.42", help="loopback address to listen on")
+    parser.add_argument("--width", type=int, default=8)
+    parser.add_argument("--height", type=int, default=8)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds spent on each JSON request")
+    args = parser.parse_args()
+    fake = FakeWled(args.address, args.width, args.height, args.delay)
+    print(fake.host, flush=True)
+    fake.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,40 +1,23 @@
 from __future__ import annotations
 
-import base64
+import asyncio
 import logging
-from io import BytesIO
 from typing import Any
 
-import requests
-from PIL import Image, ImageSequence
+import aiohttp
 
 from homeassistant.core import HomeAssistant, ServiceCall
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
 from homeassistant.helpers.typing import ConfigType
 
+from .local import LocalRenderError, LocalRenderer
+
 _LOGGER = logging.getLogger(__name__)
 
 DOMAIN = "wled_icons"
 CONF_HOST = "host"
 CONF_ADDON_URL = "addon_url"
-
-
-def frame_to_colors(frame: Image.Image) -> list[list[int]]:
-    pixels: list[list[int]] = []
-    data = frame.getdata()
-    for y in range(8):
-        for x in range(8):
-            r, g, b, a = data[y * 8 + x]
-            if a < 10:
-                r, g, b = 0, 0, 0
-            pixels.append([r, g, b])
-    return pixels
-
-
-def send_frame(host: str, colors: list[list[int]]):
-    url = f"http://{host}/json/state"
-    payload = {"seg": [{"id": 0, "i": colors}]}
-    r = requests.post(url, json=payload, timeout=5)
-    r.raise_for_status()
+CONF_LOCAL_FALLBACK = "local_fallback"
 
 
 async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
@@ -45,7 +28,15 @@ async def async_setup_entry(hass: HomeAssistant, entry) -> bool:
     data = entry.data
     host_default: str = data.get(CONF_HOST)
     addon_default: str | None = data.get(CONF_ADDON_URL)
-    
+    local_fallback: bool = data.get(CONF_LOCAL_FALLBACK, True)
+
+    # Home Assistant's shared session: pooled connections, no session per call
+    session = async_get_clientsession(hass)
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if "local" not in domain_data:
+        domain_data["local"] = LocalRenderer(hass)
+    local: LocalRenderer = domain_data["local"]
+
     async def async_show_lametric(call: ServiceCall):
         """Display a LaMetric icon (static or animated) on WLED"""
         host: str = call.data.get("host", host_default)
@@ -59,58 +50,83 @@ async def async_setup_entry(hass: HomeAssistant, entry) -> bool:
         loop: int = call.data.get("loop", 1)
         brightness: int = call.data.get("brightness", 255)
         addon_url: str = call.data.get("addon_url", addon_default or "http://localhost:8234")
-        
+        force_local: bool = call.data.get("local", False)
+
         if not host or not icon_id:
             _LOGGER.error("host et icon_id requis")
             return
-        
+
+        async def show_locally():
+            try:
+                await local.show(host, icon_id, color=color, rotate=rotate, flip_h=flip_h, flip_v=flip_v,
+                                 animate=animate, fps=fps, loop=loop, brightness=brightness)
+                _LOGGER.info("LaMetric icon %s displayed on %s (local rendering)", icon_id, host)
+            except (LocalRenderError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                _LOGGER.error("Echec affichage local de l'icône %s: %s", icon_id, e)
+
+        if force_local:
+            await show_locally()
+            return
+
+        payload: dict[str, Any] = {
+            "host": host,
+            "icon_id": icon_id,
+            "rotate": rotate,
+            "flip_h": flip_h,
+            "flip_v": flip_v,
+            "animate": animate,
+            "loop": loop,
+            "brightness": brightness
+        }
+        if color:
+            payload["color"] = color
+        if fps:
+            payload["fps"] = fps
+
+        # The add-on takes over the panel: stop a local fallback animation first
+        await local.stop(host)
         try:
-            import aiohttp
-            payload: dict[str, Any] = {
-                "host": host,
-                "icon_id": icon_id,
-                "rotate": rotate,
-                "flip_h": flip_h,
-                "flip_v": flip_v,
-                "animate": animate,
-                "loop": loop,
-                "brightness": brightness
-            }
-            if color:
-                payload["color"] = color
-            if fps:
-                payload["fps"] = fps
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.post(f"{addon_url}/show/icon", json=payload, timeout=30) as resp:
-                    if resp.status >= 400:
-                        text = await resp.text()
-                        raise RuntimeError(f"Addon error {resp.status}: {text}")
-                    _LOGGER.info("LaMetric icon %s displayed on %s", icon_id, host)
-        except Exception as e:
+            async with session.post(f"{addon_url}/show/icon", json=payload,
+                                    timeout=aiohttp.ClientTimeout(total=30)) as resp:
+                if resp.status >= 400:
+                    text = await resp.text()
+                    _LOGGER.error("Addon error %s: %s", resp.status, text)
+                    return
+                _LOGGER.info("LaMetric icon %s displayed on %s", icon_id, host)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            if not local_fallback:
+                _LOGGER.error("Add-on injoignable (%s): %s", addon_url, e)
+                return
+            _LOGGER.warning("Add-on injoignable (%s), rendu local: %s", addon_url, e)
+            await show_locally()
+        except aiohttp.ClientError as e:
             _LOGGER.exception("Echec affichage icône LaMetric: %s", e)
 
     async def async_stop(call: ServiceCall):
         """Stop the current animation on WLED"""
         host: str = call.data.get("host", host_default)
         addon_url: str = call.data.get("addon_url", addon_default or "http://localhost:8234")
-        
+
         if not host:
             _LOGGER.error("host requis")
             return
-        
+
+        was_local = local.playing(host)
+        await local.stop(host)
         try:
-            import aiohttp
             payload: dict[str, Any] = {"host": host}
-            async with aiohttp.ClientSession() as session:
-                async with session.post(f"{addon_url}/stop", json=payload, timeout=10) as resp:
-                    if resp.status >= 400:
-                        text = await resp.text()
-                        _LOGGER.error("Stop error %s: %s", resp.status, text)
-                    else:
-                        _LOGGER.info("Animation stopped on %s", host)
-        except Exception as e:
-            _LOGGER.exception("Échec arrêt animation: %s", e)
+            async with session.post(f"{addon_url}/stop", json=payload,
+                                    timeout=aiohttp.ClientTimeout(total=10)) as resp:
+                if resp.status >= 400:
+                    text = await resp.text()
+                    _LOGGER.error("Stop error %s: %s", resp.status, text)
+                else:
+                    _LOGGER.info("Animation stopped on %s", host)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if was_local:
+                _LOGGER.info("Local animation stopped on %s", host)
+            else:
+                _LOGGER.error("Échec arrêt animation: %s", e)
 
     hass.services.async_register(DOMAIN, "show_lametric", async_show_lametric)
     hass.services.async_register(DOMAIN, "stop", async_stop)
@@ -120,5 +136,8 @@ async def async_setup_entry(hass: HomeAssistant, entry) -> bool:
 
 
 async def async_unload_entry(hass: HomeAssistant, entry) -> bool:
-    # Services are global; if last entry removed, cleanup (optional)
+    # Services are global; local animations are stopped with the entry
+    local: LocalRenderer | None = hass.data.get(DOMAIN, {}).get("local")
+    if local is not None:
+        await local.stop()
     return True
@@ -7,6 +7,7 @@ from homeassistant.core import HomeAssistant
 DOMAIN = "wled_icons"
 DATA_HOST = "host"
 DATA_ADDON_URL = "addon_url"
+DATA_LOCAL_FALLBACK = "local_fallback"
 
 class WledIconsConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     VERSION = 1
@@ -28,7 +29,8 @@ class WledIconsConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         
         schema = vol.Schema({
             vol.Required(DATA_HOST): str,
-            vol.Optional(DATA_ADDON_URL, default="http://localhost:8234"): str
+            vol.Optional(DATA_ADDON_URL, default="http://localhost:8234"): str,
+            vol.Optional(DATA_LOCAL_FALLBACK, default=True): bool
         })
         return self.async_show_form(
             step_id="user", 
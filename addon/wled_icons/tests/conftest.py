@@ -0,0 +1,82 @@
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+# The service reads its data directory when it is imported
+os.environ.setdefault("WLED_ICONS_DATA_DIR", tempfile.mkdtemp(prefix="wled-icons-test-"))
+
+
+@pytest.fixture(scope="session")
+def service():
+    from app import main
+    yield main
+    main.shutdown_engine()
+
+
+@pytest.fixture(scope="session")
+def client(service):
+    from fastapi.testclient import TestClient
+    return TestClient(service.app)
+
+
+def grid(color: str, size: int = 8):
+    return [[color] * size for _ in range(size)]
+
+
+@pytest.fixture
+def fake_wled():
+    """The benchmarks' stand-in WLED device (HTTP, WebSocket and UDP), served from a thread"""
+    from benchmarks.fake_wled import FakeWled
+    # Its own loopback address: the realtime UDP ports are fixed
+    fake = FakeWled("127.0.0.43")
+    threading.Thread(target=fake.serve_forever, name="fake-wled", daemon=True).start()
+    yield fake
+    fake.close()
+
+
+@pytest.fixture
+def engine():
+    from app.engine import AnimationEngine
+    engine = AnimationEngine()
+    yield engine
+    engine.shutdown()
+
+
+class RecordingTransport:
+    """Stands in for a panel: keeps every frame it is sent"""
+
+    name = "fake"
+    keepalive_interval = 0
+
+    def __init__(self, min_interval: float = 0.0, delay: float = 0.0):
+        self.min_interval = min_interval
+        self.delay = delay
+        self.frames = []
+        self.closed = False
+
+    def ready(self) -> bool:
+        return True
+
+    async def send(self, pixels):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.frames.append(int(pixels[0, 0]))
+
+    async def keepalive(self):
+        pass
+
+    async def close(self):
+        self.closed = True
+
+
+def frame(value: int, duration: float = 0.03):
+    """A 2x2 frame whose pixels all have value (what RecordingTransport records)"""
+    return np.full((2, 2), value, dtype=np.uint8), duration
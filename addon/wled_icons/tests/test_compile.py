@@ -0,0 +1,13 @@
+from conftest import grid
+
+
+def test_save_compiles_in_the_background(client, service):
+    icon = {"name": "compiled", "frames": [grid("#FF0000"), grid("#0000FF")], "fps": 4,
+            "created": "c", "modified": "m"}
+    assert client.post("/api/icons/WICOMPILE", json=icon).status_code == 200
+    service.compiler.submit(lambda: None).result(timeout=10)
+    geometry = service.geometries.default
+    req = service.IconRequest(icon_id="WICOMPILE", rotate=90)
+    key = ("WICOMPILE", service.icon_store.content_hash("WICOMPILE"), *service.render_params(req, geometry))
+    assert service.render_cache.get(key) is not None
+    assert "WICOMPILE" not in service.compiling
@@ -0,0 +1,40 @@
+import asyncio
+import time
+
+from app.devices import DeviceRegistry
+from app.wled_client import WledError
+
+
+class FakeClient:
+    def __init__(self, reachable):
+        self.reachable = reachable
+
+    async def get_state(self, host):
+        if host not in self.reachable:
+            raise WledError("unreachable")
+        return {"on": True}
+
+    async def get_info(self, host):
+        if host not in self.reachable:
+            raise WledError("unreachable")
+        return {"ver": "0.14.0", "leds": {"count": 64}}
+
+
+def test_idle_hosts_are_evicted():
+    registry = DeviceRegistry(FakeClient({"alive"}), hosts=["configured"], evict_after=60)
+    for host in ("typo", "alive", "used"):
+        registry.device(host).last_used = time.monotonic() - 120
+    asyncio.run(registry._refresh("alive"))
+    asyncio.run(registry._refresh("typo"))
+    registry.device("used").last_used = time.monotonic()
+    registry.device("configured").last_used = time.monotonic() - 120
+    registry.evict()
+    assert sorted(registry.all()) == ["alive", "configured", "used"]
+
+
+def test_requests_keep_a_host():
+    registry = DeviceRegistry(FakeClient(set()), evict_after=60)
+    registry.device("panel").last_used = time.monotonic() - 120
+    registry.transport("panel", "ddp")
+    registry.evict()
+    assert "panel" in registry.all()
@@ -0,0 +1,107 @@
+import time
+
+import pytest
+
+from app.display_queue import DisplayQueue, QueueEntry
+
+from conftest import RecordingTransport, frame
+
+
+@pytest.fixture
+def queue(engine):
+    return DisplayQueue(engine)
+
+
+class Panel:
+    """make_transport factory: one RecordingTransport per (re)start of an entry"""
+
+    def __init__(self):
+        self.transports = []
+
+    def __call__(self):
+        self.transports.append(RecordingTransport())
+        return self.transports[-1]
+
+    def frames(self):
+        return [t.frames for t in self.transports]
+
+
+def entry(icon_id, values, panel, loop=1, duration=0.03, **kwargs):
+    return QueueEntry("panel", icon_id, [frame(v, duration) for v in values], loop, panel, **kwargs)
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_higher_priority_interrupts_and_the_entry_resumes(engine, queue):
+    low_panel, high_panel = Panel(), Panel()
+    low = entry("low", range(1, 11), low_panel)
+    engine.call(queue.enqueue(low))
+    wait_until(lambda: len(low_panel.transports[0].frames) >= 3)
+    high = entry("high", [100, 101], high_panel, priority=5)
+    engine.call(queue.enqueue(high))
+    assert low.state == "interrupted"
+    wait_until(lambda: low.state == "finished")
+
+    assert high.state == "finished" and high_panel.frames() == [[100, 101]]
+    first, resumed = low_panel.frames()
+    # Resumes from the frame it was showing, not from the start
+    assert resumed[0] == first[-1] and resumed[0] > 1
+    assert resumed[-1] == 10
+    assert queue.entries("panel") == {"panel": {"current": None, "queued": []}}
+
+
+def test_lower_priority_waits_its_turn(engine, queue):
+    high_panel, low_panel = Panel(), Panel()
+    high = entry("high", [1, 2, 3], high_panel, priority=5)
+    low = entry("low", [7], low_panel, priority=1)
+    engine.call(queue.enqueue(high))
+    engine.call(queue.enqueue(low))
+    assert low.state == "queued"
+    assert [e["icon_id"] for e in queue.entries("panel")["panel"]["queued"]] == ["low"]
+    wait_until(lambda: low.state == "finished")
+    assert high_panel.frames() == [[1, 2, 3]] and low_panel.frames() == [[7]]
+
+
+def test_ttl_ends_an_endless_entry(engine, queue):
+    panel = Panel()
+    endless = entry("clock", [1, 2], panel, loop=0, ttl=0.2)
+    engine.call(queue.enqueue(endless))
+    wait_until(lambda: endless.state == "expired", timeout=2)
+    assert engine.player("panel") is None
+
+
+def test_expired_waiting_entries_are_skipped(engine, queue):
+    first_panel, late_panel, next_panel = Panel(), Panel(), Panel()
+    engine.call(queue.enqueue(entry("first", [1] * 10, first_panel, priority=5)))
+    late = entry("late", [2], late_panel, ttl=0.05)
+    following = entry("next", [3], next_panel)
+    engine.call(queue.enqueue(late))
+    engine.call(queue.enqueue(following))
+    wait_until(lambda: following.state == "finished")
+    assert late_panel.transports == []
+    assert next_panel.frames() == [[3]]
+
+
+def test_same_key_replaces_the_entry_on_screen(engine, queue):
+    old_panel, new_panel = Panel(), Panel()
+    old = entry("weather", [1, 2], old_panel, loop=0, key="ambient")
+    new = entry("weather2", [3, 4], new_panel, loop=0, key="ambient", priority=-1)
+    engine.call(queue.enqueue(old))
+    engine.call(queue.enqueue(new))
+    # Replaced despite its lower priority, and not kept to resume later
+    assert old.state == "stopped" and new.state == "playing"
+    assert queue.entries("panel")["panel"]["queued"] == []
+    engine.call(queue.clear("panel"))
+
+
+def test_same_key_replaces_a_waiting_entry(engine, queue):
+    engine.call(queue.enqueue(entry("alert", [1] * 10, Panel(), priority=5)))
+    engine.call(queue.enqueue(entry("news", [2], Panel(), key="ticker")))
+    engine.call(queue.enqueue(entry("news2", [3], Panel(), key="ticker")))
+    assert [e["icon_id"] for e in queue.entries("panel")["panel"]["queued"]] == ["news2"]
+    engine.call(queue.clear("panel"))
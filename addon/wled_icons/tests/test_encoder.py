@@ -0,0 +1,23 @@
+import numpy as np
+
+from app.encoder import FrameEncoder
+
+
+def test_sent_without_encode_is_a_no_op():
+    encoder = FrameEncoder()
+    encoder.sent()
+    assert encoder.last is None
+    assert encoder.stats["keyframes"] == 0
+
+
+def test_delta_after_a_sent_keyframe():
+    encoder = FrameEncoder()
+    pixels = np.zeros((4, 3), dtype=np.uint8)
+    assert encoder.encode(pixels) is not None
+    encoder.sent()
+    pixels = pixels.copy()
+    pixels[2] = (255, 0, 0)
+    payload = encoder.encode(pixels)
+    encoder.sent()
+    assert payload.tokens == [2, "FF0000"]
+    assert encoder.stats == {"keyframes": 1, "deltas": 1, "skipped": 0}
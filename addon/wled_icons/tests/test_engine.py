@@ -0,0 +1,65 @@
+import asyncio
+
+from app.engine import Player
+from app.frame_stream import FrameStream
+from app.playlist import PlaylistItem, PlaylistPlayer
+
+from conftest import RecordingTransport, frame
+
+
+def play(engine, player, timeout: float = 5.0):
+    engine.call(engine.play(player))
+    engine.call(asyncio.wait_for(asyncio.shield(player.task), timeout), timeout + 1)
+    return player
+
+
+def test_plays_every_frame_of_every_loop(engine):
+    transport = RecordingTransport()
+    player = play(engine, Player("panel", [frame(1), frame(2), frame(3)], 2, transport))
+    assert player.state == "finished"
+    assert transport.frames == [1, 2, 3, 1, 2, 3]
+    assert transport.closed
+    assert engine.player("panel") is None
+
+
+def test_slow_panel_drops_frames_but_shows_the_last(engine):
+    transport = RecordingTransport(delay=0.1)
+    sequence = [frame(value) for value in range(1, 11)]
+    player = play(engine, Player("panel", sequence, 1, transport))
+    assert player.dropped_frames > 0
+    assert len(transport.frames) + player.dropped_frames == 10
+    assert transport.frames[-1] == 10
+
+
+def test_min_interval_throttles_frames(engine):
+    transport = RecordingTransport(min_interval=0.1)
+    sequence = [frame(value) for value in range(1, 11)]
+    player = play(engine, Player("panel", sequence, 1, transport))
+    assert player.throttled_frames > 0
+    assert transport.frames[0] == 1 and transport.frames[-1] == 10
+
+
+def test_starting_a_player_stops_the_previous_one(engine):
+    first, second = RecordingTransport(), RecordingTransport()
+    looping = Player("panel", [frame(1), frame(2)], 0, first)
+    engine.call(engine.play(looping))
+    play(engine, Player("panel", [frame(3)], 1, second))
+    assert looping.state == "stopped" and first.closed
+    assert second.frames == [3]
+
+
+def test_plays_a_stream_while_it_decodes(engine):
+    transport = RecordingTransport()
+    stream = FrameStream(iter([frame(1), frame(1), frame(2), frame(3)]))
+    player = play(engine, Player("panel", stream, 2, transport))
+    assert stream.complete
+    # Identical consecutive frames are merged into one
+    assert transport.frames == [1, 2, 3, 1, 2, 3]
+
+
+def test_playlist_plays_items_in_order(engine):
+    transport = RecordingTransport()
+    items = [PlaylistItem("a", [frame(1)], 0.06), PlaylistItem("b", [frame(2), frame(3)], 0.12)]
+    player = play(engine, PlaylistPlayer("panel", items, 1, False, transport))
+    assert player.state == "finished"
+    assert transport.frames == [1, 1, 2, 3, 2, 3]
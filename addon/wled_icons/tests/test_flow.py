@@ -0,0 +1,19 @@
+from app.flow import FRAME_HEADROOM, HostFlow
+
+
+def test_first_sample_does_not_seed_rtt():
+    flow = HostFlow("panel")
+    flow.success(0.5)
+    assert flow.rtt is None and flow.min_interval == 0.0
+    flow.success(0.02)
+    assert flow.rtt == 0.02
+    assert flow.min_interval == 0.02 * FRAME_HEADROOM
+
+
+def test_reset_skips_the_next_first_sample():
+    flow = HostFlow("panel")
+    flow.success(0.02)
+    flow.success(0.02)
+    flow.reset()
+    flow.success(0.4)
+    assert flow.rtt is None
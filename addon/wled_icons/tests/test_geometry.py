@@ -0,0 +1,51 @@
+import asyncio
+import time
+
+from app.geometry import GeometryRegistry
+from app.wled_client import WledError
+
+from conftest import grid
+
+
+class FakeDevices:
+    def __init__(self, info=None):
+        self.info_calls = 0
+        self._info = info
+
+    async def info(self, host):
+        self.info_calls += 1
+        if self._info is None:
+            raise WledError("unreachable")
+        return self._info
+
+
+def test_failed_discovery_is_not_retried_at_once():
+    registry = GeometryRegistry([])
+    devices = FakeDevices()
+    for _ in range(3):
+        assert asyncio.run(registry.discover("down", devices)) is registry.default
+    assert devices.info_calls == 1
+
+    devices._info = {"leds": {"matrix": {"w": 16, "h": 16}}}
+    assert asyncio.run(registry.discover("down", devices)) is registry.default
+    registry.forget("down")
+    assert asyncio.run(registry.discover("down", devices)).size == (16, 16)
+    assert devices.info_calls == 2
+
+
+def test_in_use_keeps_recent_hosts_only():
+    registry = GeometryRegistry([{"host": f"panel{i}", "width": 8 + i, "height": 8} for i in range(6)])
+    assert [g.size for g in registry.in_use()] == [(8, 8)]
+    for i in range(6):
+        registry._used[f"panel{i}"] = time.monotonic() - 10 + i
+    assert [g.width for g in registry.in_use(limit=3)] == [13, 12, 11]
+    registry._used["panel5"] = time.monotonic() - 2 * 3600
+    assert registry.in_use(limit=1)[0].width == 12
+
+
+def test_display_on_an_unreachable_panel_is_a_502(client):
+    icon = {"name": "down", "frames": [grid("#FF0000")], "fps": 1, "created": "c", "modified": "m"}
+    assert client.post("/api/icons/WIDOWN", json=icon).status_code == 200
+    # Nothing listens on the discard port: every request is refused
+    response = client.post("/api/icons/WIDOWN/display", params={"host": "127.0.0.1:9"})
+    assert response.status_code == 502
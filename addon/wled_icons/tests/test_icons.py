@@ -0,0 +1,118 @@
+import base64
+import json
+import sqlite3
+
+import numpy as np
+import pytest
+
+from app import icon_codec
+from app.icon_store import IconStore, split_icon
+
+from conftest import grid
+
+BLACK = icon_codec.encode(np.zeros((1, 8, 8, 3), np.uint8))
+
+
+def save(client, icon_id, **fields):
+    icon = {"name": "icon", "frames": [grid("#FF0000"), grid("#00FF00")], "fps": 4,
+            "created": "c", "modified": "m", **fields}
+    assert client.post(f"/api/icons/{icon_id}", json=icon).status_code == 200
+
+
+def import_lines(client, *lines):
+    body = "\n".join(json.dumps(line) for line in lines)
+    return client.post("/api/icons/import", content=body).json()
+
+
+def test_get_keeps_legacy_keys(client):
+    save(client, "WISHAPE")
+    icon = client.get("/api/icons/WISHAPE").json()
+    assert icon["id"] == "WISHAPE"
+    assert icon["grid"] == grid("#FF0000")
+    assert len(icon["frames"]) == 2
+    assert client.get("/api/icons").json()["WISHAPE"]["grid"] == grid("#FF0000")
+
+
+def test_search_meta_counts_frames(client):
+    save(client, "WICOUNT", name="countme")
+    [meta] = client.get("/api/icons/search", params={"q": "countme", "fields": "meta"}).json()["icons"]
+    assert meta["frame_count"] == 2
+    assert "frames" not in meta
+
+
+def test_import_rejects_bad_metadata_per_line(client):
+    good = {"id": "WIIMPGOOD", "name": "ok", "frames": [grid("#0000FF")], "fps": 5}
+    result = import_lines(
+        client,
+        {"id": "WIIMPNAME", "name": 123, "frames": [grid("#0000FF")]},
+        {"id": "WIIMPFPS", "name": "x", "fps": "fast", "frames": [grid("#0000FF")]},
+        {"id": "WIIMPNULL", "name": "x", "frames": [[[None] * 8] * 8]},
+        good,
+    )
+    assert result["imported"] == 1
+    assert [e["line"] for e in result["errors"]] == [1, 2, 3]
+    assert client.get("/api/icons/WIIMPNAME").status_code == 404
+    assert client.get("/api/icons/search", params={"q": "WIIMPGOOD"}).json()["count"] == 1
+
+
+def test_import_rejects_bad_metadata_in_wic(client):
+    record = icon_codec.with_meta(BLACK, {"name": ["list"]})
+    result = import_lines(client, {"id": "WIIMPWIC", "wic": base64.b64encode(record).decode()})
+    assert result["imported"] == 0
+    assert result["errors"][0]["error"] == "name invalide"
+
+
+def test_put_wic_rejects_bad_metadata(client):
+    record = icon_codec.with_meta(BLACK, {"name": "ok", "fps": -1})
+    assert client.put("/api/icons/WIPUTBAD/wic", content=record).status_code == 400
+    assert client.get("/api/icons/WIPUTBAD").status_code == 404
+
+
+def test_custom_icon_rejects_non_positive_fps(client):
+    icon = {"name": "bad", "frames": [grid("#FF0000")], "fps": -2, "created": "c", "modified": "m"}
+    assert client.post("/api/icons/WIFPSNEG", json=icon).status_code == 422
+
+
+def test_stored_negative_fps_is_clamped(service):
+    # Icons saved before fps was validated
+    icon = {"name": "old", "frames": [grid("#FF0000"), grid("#00FF00")], "fps": -2}
+    service.icon_store._write([service.icon_store._row("WIFPSOLD", *split_icon(icon, check=False))])
+    sequence = service.render_custom_sequence("WIFPSOLD", service.IconRequest(icon_id="WIFPSOLD"),
+                                              service.geometries.default)
+    assert [d for _, d in sequence] == [1.0, 1.0]
+    item = service.PlaylistItem("WIFPSOLD", sequence, 3.0)
+    assert sum(d for _, d in item.frames) == pytest.approx(3.0)
+
+
+def test_migration_leaves_unreadable_rows(tmp_path):
+    path = tmp_path / "icons.db"
+    db = sqlite3.connect(str(path))
+    db.execute("CREATE TABLE icons (id TEXT PRIMARY KEY, name TEXT NOT NULL DEFAULT '', data TEXT NOT NULL, "
+               "hash TEXT NOT NULL, updated REAL NOT NULL DEFAULT (julianday('now')))")
+    broken = json.dumps({"name": "keep me", "fps": 3, "frames": [[["#GGGGGG"]]]})
+    legacy = json.dumps({"name": "legacy", "fps": -2, "grid": grid("#FF0000")})
+    db.executemany("INSERT INTO icons (id, name, data, hash) VALUES (?, ?, ?, '')",
+                   [("WIBROKEN", "keep me", broken), ("WILEGACY", "legacy", legacy)])
+    db.commit()
+    db.close()
+
+    store = IconStore(path)
+    assert store.ids() == ["WILEGACY"]
+    assert store.info("WILEGACY")["fps"] == -2
+    assert [e for e in store.rows()][0][0] == "WILEGACY"
+    row = store._db.execute("SELECT data, pixels FROM icons WHERE id = 'WIBROKEN'").fetchone()
+    assert row == (broken, None)
+    store.close()
+
+
+def test_empty_or_oversized_wic_is_rejected(client):
+    empty = icon_codec.HEADER.pack(b"WIC", 1, icon_codec.RAW, 8, 8, 0, 0, 0)
+    zero_width = icon_codec.HEADER.pack(b"WIC", 1, icon_codec.RAW, 0, 8, 1, 0, 0)
+    huge = icon_codec.HEADER.pack(b"WIC", 1, icon_codec.PALETTE_RLE, 4000, 4000, 1, 1, 0) + b"\0\0\0\xff\0"
+    for record in (empty, zero_width, huge):
+        assert client.put("/api/icons/WIEMPTY/wic", content=record).status_code == 400
+    result = import_lines(client, *({"id": "WIEMPTY", "wic": base64.b64encode(r).decode()}
+                                    for r in (empty, zero_width, huge)))
+    assert result["imported"] == 0 and len(result["errors"]) == 3
+    assert client.get("/api/icons/WIEMPTY").status_code == 404
+    assert client.get("/api/icons").status_code == 200
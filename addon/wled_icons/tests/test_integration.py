@@ -0,0 +1,21 @@
+import filecmp
+
+from conftest import ROOT
+
+REPO = ROOT.parent.parent
+INTEGRATION = REPO / "custom_components" / "wled_icons"
+# Add-on modules the integration vendors; the add-on image copies them into its integration
+VENDORED = ("frames.py", "encoder.py")
+
+
+def test_vendored_modules_match_the_addon():
+    for name in VENDORED:
+        assert filecmp.cmp(INTEGRATION / name, ROOT / "app" / name, shallow=False), name
+
+
+def test_addon_integration_mirrors_custom_components():
+    shipped = ROOT / "integration"
+    compared = filecmp.dircmp(INTEGRATION, shipped, ignore=["__pycache__", *VENDORED])
+    assert not compared.left_only and not compared.right_only
+    _, mismatch, errors = filecmp.cmpfiles(INTEGRATION, shipped, compared.common_files, shallow=False)
+    assert not mismatch and not errors
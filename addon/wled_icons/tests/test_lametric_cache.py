@@ -0,0 +1,49 @@
+import threading
+import time
+
+from app import lametric_cache
+from app.lametric_cache import LaMetricCache
+
+
+class FakeResponse:
+    status_code = 200
+    ok = True
+    headers = {"ETag": '"v1"'}
+
+    def __init__(self, content: bytes):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+
+def test_concurrent_misses_fetch_once_and_drop_their_lock(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_get(url, **kwargs):
+        calls.append(url)
+        time.sleep(0.05)
+        return FakeResponse(b"gif")
+
+    monkeypatch.setattr(lametric_cache.requests, "get", fake_get)
+    cache = LaMetricCache(tmp_path, max_bytes=1 << 20, max_age=3600)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("1486"))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == [b"gif"] * 4
+    assert len(calls) == 1
+    assert cache._fetch_locks == {}
+
+
+def test_missing_blob_is_a_miss(tmp_path, monkeypatch):
+    monkeypatch.setattr(lametric_cache.requests, "get", lambda url, **kwargs: FakeResponse(b"gif"))
+    cache = LaMetricCache(tmp_path, max_bytes=1 << 20, max_age=3600)
+    cache.get("1486")
+    cache._blob_path(cache.content_hash("1486")).unlink()
+    assert cache._lookup("1486") is None
+    assert cache.content_hash("1486") is None
+    assert cache.get("1486") == b"gif"
+    assert cache.stats()["misses"] == 2
@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+
+from app.playlist import fit_sequence
+
+PIXELS = [np.full((64, 3), i, np.uint8) for i in range(3)]
+
+
+def test_fit_sequence_loops_to_duration():
+    out = fit_sequence([(PIXELS[0], 0.3), (PIXELS[1], 0.2)], 1.2)
+    assert [round(d, 6) for _, d in out] == [0.3, 0.2, 0.3, 0.2, 0.2]
+    assert sum(d for _, d in out) == pytest.approx(1.2)
+
+
+@pytest.mark.parametrize("durations", [[0.0], [0.0, 0.0], [-0.5], [-0.5, 0.5]])
+def test_fit_sequence_without_positive_length(durations):
+    out = fit_sequence([(PIXELS[i], d) for i, d in enumerate(durations)], 2.0)
+    assert out == [(PIXELS[0], 2.0)]
+
+
+def test_fit_sequence_empty():
+    assert fit_sequence([], 2.0) == []
@@ -0,0 +1,76 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image, ImageSequence
+
+from conftest import grid
+
+
+@pytest.fixture(scope="module")
+def icon(client):
+    icon = {"name": "preview", "frames": [grid("#FF0000"), grid("#00FF00")], "fps": 4,
+            "created": "c", "modified": "m"}
+    assert client.post("/api/icons/WIPREVIEW", json=icon).status_code == 200
+    return icon
+
+
+def test_png_is_the_first_frame_scaled(client, icon):
+    r = client.get("/api/icons/WIPREVIEW/preview.png", params={"scale": 2})
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "image/png"
+    assert r.headers["cache-control"] == "no-cache"
+    image = Image.open(BytesIO(r.content))
+    assert image.size == (16, 16)
+    assert image.convert("RGB").getpixel((15, 15)) == (255, 0, 0)
+
+
+def test_gif_plays_every_frame(client, icon):
+    r = client.get("/api/icons/WIPREVIEW/preview.gif", params={"scale": 1})
+    assert r.status_code == 200 and r.headers["content-type"] == "image/gif"
+    image = Image.open(BytesIO(r.content))
+    frames = [(f.convert("RGB").getpixel((0, 0)), f.info["duration"]) for f in ImageSequence.Iterator(image)]
+    assert frames == [((255, 0, 0), 250), ((0, 255, 0), 250)]
+
+
+def test_matching_etag_is_a_304_without_rendering(client, service, icon):
+    tag = client.get("/api/icons/WIPREVIEW/preview.png").headers["etag"]
+    stats = service.previews.stats()
+    for header in (tag, f"W/{tag}", f'"other", {tag}', "*"):
+        r = client.get("/api/icons/WIPREVIEW/preview.png", headers={"If-None-Match": header})
+        assert r.status_code == 304 and r.content == b""
+        assert r.headers["etag"] == tag
+    assert service.previews.stats() == stats
+    assert client.get("/api/icons/WIPREVIEW/preview.png",
+                      headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_etag_follows_the_icon_and_the_parameters(client, icon):
+    url = "/api/icons/WIPREVIEW/preview.png"
+    tag = client.get(url).headers["etag"]
+    assert client.get(url, params={"rotate": 90}).headers["etag"] != tag
+    assert client.get(url.replace(".png", ".gif")).headers["etag"] != tag
+    assert client.get(url).headers["etag"] == tag
+
+    assert client.post("/api/icons/WIPREVIEW", json={**icon, "frames": [grid("#0000FF")]}).status_code == 200
+    r = client.get(url, headers={"If-None-Match": tag})
+    assert r.status_code == 200 and r.headers["etag"] != tag
+    assert Image.open(BytesIO(r.content)).convert("RGB").getpixel((0, 0)) == (0, 0, 255)
+    assert client.post("/api/icons/WIPREVIEW", json=icon).status_code == 200
+
+
+def test_lametric_preview_is_cached_publicly(client, service):
+    buf = BytesIO()
+    Image.new("RGB", (8, 8), (0, 0, 255)).save(buf, format="PNG")
+    service.lametric_cache._store("90101", buf.getvalue(), {})
+    r = client.get("/api/icons/90101/preview.png", params={"scale": 1})
+    assert r.status_code == 200
+    assert r.headers["cache-control"] == "public, max-age=86400"
+    assert Image.open(BytesIO(r.content)).convert("RGB").getpixel((3, 3)) == (0, 0, 255)
+
+
+@pytest.mark.parametrize("url, status", [("/api/icons/WIPREVIEW/preview.bmp", 404),
+                                         ("/api/icons/WIPREVIEW/preview.png?scale=0", 400),
+                                         ("/api/icons/WIPREVIEW/preview.png?width=300", 400),
+                                         ("/api/icons/WINOPE/preview.png", 404)])
+def test_invalid_requests(client, icon, url, status):
+    assert client.get(url).status_code == status
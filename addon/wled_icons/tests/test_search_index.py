@@ -0,0 +1,95 @@
+import pytest
+
+from app.search_index import SearchIndex
+
+ICONS = {
+    "WISUN": "sun",
+    "WISUNSET": "sunset",
+    "WISUNNY": "sunny day",
+    "WIBEACH": "beach sun",
+    "WIMOON": "moonsun",
+    "WIRAIN": "rain",
+}
+
+
+@pytest.fixture
+def index():
+    index = SearchIndex()
+    for icon_id, name in ICONS.items():
+        index.add(icon_id, name)
+    return index
+
+
+def pages(index, query, limit):
+    """Every page of a search, following the cursors"""
+    out, cursor = [], None
+    while True:
+        ids, cursor = index.search(query, limit, cursor)
+        out.append(ids)
+        if cursor is None:
+            return out
+
+
+def test_exact_then_prefix_then_word_then_substring(index):
+    ids, cursor = index.search("sun")
+    assert ids == ["WISUN", "WISUNNY", "WISUNSET", "WIBEACH", "WIMOON"]
+    assert cursor is None
+
+
+def test_id_matches_rank_before_name_matches(index):
+    index.add("WIX", "wisun fan")
+    assert index.search("wisun")[0] == ["WISUN", "WISUNNY", "WISUNSET", "WIX"]
+
+
+def test_every_term_must_match(index):
+    assert index.search("sun day")[0] == ["WISUNNY"]
+    assert index.search("SUN   Beach")[0] == ["WIBEACH"]
+    assert index.search("sun snow")[0] == []
+
+
+def test_long_terms_use_trigrams(index):
+    assert index.search("onsu")[0] == ["WIMOON"]
+    # Every trigram present, but never as one substring
+    index.add("WISPLIT", "sunse xunset")
+    assert index.search("sunset")[0] == ["WISUNSET"]
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 5])
+def test_pages_concatenate_to_the_full_result(index, limit):
+    full = index.search("sun", 20)[0]
+    found = pages(index, "sun", limit)
+    assert [i for page in found for i in page] == full
+    assert all(len(page) == limit for page in found[:-1])
+
+
+def test_cursor_is_stable_when_icons_are_added(index):
+    first, cursor = index.search("sun", 2)
+    assert first == ["WISUN", "WISUNNY"]
+    # Sorts before the cursor: not on later pages. After it: on them
+    index.add("WISUNA", "suna")
+    index.add("WISUNZ", "sunz")
+    second, cursor = index.search("sun", 2, cursor)
+    assert second == ["WISUNSET", "WISUNZ"]
+    third, cursor = index.search("sun", 2, cursor)
+    assert third == ["WIBEACH", "WIMOON"]
+    assert cursor is None
+
+
+def test_removed_icons_leave_the_results(index):
+    index.remove("WISUNNY")
+    index.add("WISUN", "moon")
+    # Now only a substring of its id, which still weighs more than one of a name
+    assert index.search("sun")[0] == ["WISUNSET", "WIBEACH", "WISUN", "WIMOON"]
+    assert len(index) == len(ICONS) - 1
+
+
+def test_empty_query_lists_everything_by_name(index):
+    found = pages(index, "", 4)
+    assert found == [["WIBEACH", "WIMOON", "WIRAIN", "WISUN"], ["WISUNNY", "WISUNSET"]]
+    assert index.search("   ")[0] == index.search("", 20)[0]
+
+
+def test_invalid_cursor(index, client):
+    with pytest.raises(ValueError):
+        index.search("sun", 2, "not-a-cursor")
+    assert client.get("/api/icons/search", params={"q": "sun", "cursor": "bm9wZQ"}).status_code == 400
@@ -0,0 +1,191 @@
+import asyncio
+import socket
+import struct
+import time
+
+import numpy as np
+import pytest
+
+from app.transport import (DDP_HEADER, PROTOCOL_DNRGB, PROTOCOL_DRGB, DdpTransport, GroupTransport,
+                           WledRealtimeTransport, udp_address)
+from app.wled_client import WledError
+
+
+class FakeClient:
+    def __init__(self):
+        self.states = []
+        self.forgotten = []
+
+    async def set_state(self, host, state):
+        self.states.append((host, state))
+
+    def forget_frame(self, host):
+        self.forgotten.append(host)
+
+
+@pytest.fixture
+def listener():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.settimeout(2)
+    yield sock
+    sock.close()
+
+
+def frame(leds: int) -> np.ndarray:
+    return (np.arange(leds * 3) % 251).astype(np.uint8).reshape(leds, 3)
+
+
+def play(transport, listener, pixels, packets: int):
+    """Send pixels and close the transport; the datagrams the listener got"""
+    transport.port = listener.getsockname()[1]
+
+    async def run():
+        await transport.send(pixels)
+        await transport.close()
+
+    asyncio.run(run())
+    return [listener.recv(4096) for _ in range(packets)]
+
+
+def test_ddp_packets(listener):
+    client = FakeClient()
+    pixels = frame(600)
+    first, second = play(DdpTransport("127.0.0.1", client), listener, pixels, 2)
+    data = pixels.tobytes()
+    assert DDP_HEADER.unpack_from(first) == (0x40, 1, 0x0B, 0x01, 0, 480 * 3)
+    assert DDP_HEADER.unpack_from(second) == (0x41, 1, 0x0B, 0x01, 480 * 3, 120 * 3)
+    assert first[DDP_HEADER.size:] + second[DDP_HEADER.size:] == data
+    # DDP leaves realtime mode through the JSON API
+    assert client.states == [("127.0.0.1", {"live": False})]
+    assert client.forgotten == ["127.0.0.1"]
+
+
+def test_ddp_sequence_number_advances():
+    transport = DdpTransport("127.0.0.1", FakeClient())
+    sequences = [transport.packets(b"\0" * 3)[0][1] for _ in range(16)]
+    assert sequences == list(range(1, 16)) + [1]
+
+
+def test_dnrgb_chunks(listener):
+    pixels = frame(600)
+    transport = WledRealtimeTransport("127.0.0.1", FakeClient(), timeout=5, protocol=PROTOCOL_DNRGB)
+    first, second, leave = play(transport, listener, pixels, 3)
+    assert first[:4] == bytes((PROTOCOL_DNRGB, 5)) + struct.pack(">H", 0)
+    assert second[:4] == bytes((PROTOCOL_DNRGB, 5)) + struct.pack(">H", 489)
+    assert first[4:] + second[4:] == pixels.tobytes()
+    assert leave == bytes((PROTOCOL_DNRGB, 0))
+
+
+def test_drgb_up_to_490_leds(listener):
+    pixels = frame(490)
+    transport = WledRealtimeTransport("127.0.0.1", FakeClient(), timeout=2, protocol=PROTOCOL_DRGB)
+    packet, leave = play(transport, listener, pixels, 2)
+    assert packet == bytes((PROTOCOL_DRGB, 2)) + pixels.tobytes()
+    assert leave == bytes((PROTOCOL_DRGB, 0))
+
+
+def test_drgb_falls_back_to_dnrgb_chunks():
+    transport = WledRealtimeTransport("127.0.0.1", FakeClient(), protocol=PROTOCOL_DRGB)
+    packets = transport.packets(frame(491).tobytes())
+    assert [p[0] for p in packets] == [PROTOCOL_DNRGB, PROTOCOL_DNRGB]
+    assert [struct.unpack(">H", p[2:4])[0] for p in packets] == [0, 489]
+
+
+def test_close_without_frames_sends_nothing():
+    client = FakeClient()
+    asyncio.run(WledRealtimeTransport("127.0.0.1", client).close())
+    assert client.forgotten == ["127.0.0.1"]
+
+
+@pytest.mark.parametrize("host, address", [("wled.local", "wled.local"), ("10.0.0.5:80", "10.0.0.5"),
+                                           ("fe80::1", "fe80::1"), ("[::1]:80", "::1")])
+def test_udp_address(host, address):
+    assert udp_address(host) == address
+
+
+def test_ipv6_host():
+    try:
+        listener = socket.socket(socket.AF_INET6, socket.SOCK_DGRAM)
+        listener.bind(("::1", 0))
+    except OSError:
+        pytest.skip("No IPv6 loopback")
+    listener.settimeout(2)
+    with listener:
+        transport = WledRealtimeTransport("[::1]", FakeClient(), protocol=PROTOCOL_DRGB)
+        packet, _ = play(transport, listener, frame(4), 2)
+    assert packet[0] == PROTOCOL_DRGB
+    assert transport.address[0] == "::1"
+
+
+class FakeMember:
+    """Group member answering after delay seconds; keeps (time the frame showed, first pixel)"""
+
+    name = "http"
+    keepalive_interval = None
+
+    def __init__(self, host, delay=0.0, fails=False, reachable=True, min_interval=0.0):
+        self.host = host
+        self.delay = delay
+        self.fails = fails
+        self.reachable = reachable
+        self.min_interval = min_interval
+        self.shown = []
+
+    def ready(self):
+        return self.reachable
+
+    async def send(self, pixels):
+        await asyncio.sleep(self.delay)
+        if self.fails:
+            raise WledError("timeout")
+        self.shown.append((time.monotonic(), int(np.asarray(pixels).flat[0])))
+
+    async def close(self):
+        pass
+
+
+def test_group_tiles_go_to_their_member():
+    members = [FakeMember("left"), FakeMember("right")]
+    group = GroupTransport(members, tiled=True)
+    tiles = np.stack([np.full((4, 3), 1, np.uint8), np.full((4, 3), 2, np.uint8)])
+    asyncio.run(group.send(tiles))
+    assert [m.shown[0][1] for m in members] == [1, 2]
+
+    same = GroupTransport([FakeMember("a"), FakeMember("b")])
+    asyncio.run(same.send(np.full((4, 3), 7, np.uint8)))
+    assert [m.shown[0][1] for m in same.members] == [7, 7]
+
+
+def test_group_holds_fast_members_back():
+    slow, fast = FakeMember("slow", delay=0.05), FakeMember("fast")
+    group = GroupTransport([slow, fast])
+
+    async def play():
+        for value in range(20):
+            await group.send(np.full((4, 3), value, np.uint8))
+
+    asyncio.run(play())
+    gaps = [abs(s[0] - f[0]) for s, f in zip(slow.shown, fast.shown)]
+    # The first frame shows 50 ms apart; once the latency is learnt, together
+    assert gaps[0] > 0.04
+    assert max(gaps[-5:]) < 0.015
+    assert group.member_status()[0]["latency_ms"] > 40
+
+
+def test_group_failures_are_reported_together():
+    members = [FakeMember("a", fails=True), FakeMember("b"), FakeMember("c", fails=True)]
+    group = GroupTransport(members)
+    with pytest.raises(WledError) as error:
+        asyncio.run(group.send(np.zeros((4, 3), np.uint8)))
+    assert str(error.value) == "a: timeout; c: timeout"
+    # The reachable member still got its frame
+    assert len(members[1].shown) == 1
+
+
+def test_group_paces_on_its_slowest_reachable_member():
+    members = [FakeMember("a", min_interval=0.05), FakeMember("b", min_interval=0.2, reachable=False)]
+    group = GroupTransport(members)
+    assert group.ready() and group.min_interval == 0.05
+    members[0].reachable = False
+    assert not group.ready()
@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+import numpy as np
+import pytest
+
+from app.transport import WebSocketTransport
+from app.wled_client import WledClient
+from app.wled_socket import MIN_BACKOFF
+
+
+def pixels(value: int) -> np.ndarray:
+    return np.full((64, 3), value, dtype=np.uint8)
+
+
+async def received(fake, count: int, timeout: float = 3.0):
+    """Frames the fake device got over the WebSocket, once there are count of them"""
+    deadline = time.monotonic() + timeout
+    while True:
+        frames = [f for f in fake.recorder.take() if f[1] == "ws"]
+        if len(frames) >= count or time.monotonic() > deadline:
+            return frames
+        await asyncio.sleep(0.01)
+
+
+def run(test):
+    """Run test(client) on a fresh loop, closing the client's sockets afterwards"""
+    async def main():
+        client = WledClient()
+        try:
+            await test(client)
+        finally:
+            await client.aclose()
+    asyncio.run(main())
+
+
+def test_frames_reach_the_panel(fake_wled):
+    async def test(client):
+        sock = client.socket(fake_wled.host)
+        sock.push(pixels(1))
+        await sock.flush(2)
+        assert len(await received(fake_wled, 1)) == 1
+        assert sock.status()["connected"] and sock.stats["connects"] == 1
+    run(test)
+
+
+def test_full_queue_drops_the_oldest_frames(fake_wled):
+    async def test(client):
+        sock = client.socket(fake_wled.host)
+        # Pushed before the writer gets a chance to run: only the last two fit
+        for value in range(5):
+            sock.push(pixels(value))
+        assert sock.stats["dropped"] == 3
+        await sock.flush(2)
+        assert sock.stats["sent"] == 2
+        assert len(await received(fake_wled, 2)) == 2
+    run(test)
+
+
+def test_reconnects_after_the_panel_drops_the_connection(fake_wled):
+    async def test(client):
+        sock = client.socket(fake_wled.host)
+        sock.push(pixels(1))
+        await sock.flush(2)
+        await received(fake_wled, 1)
+        fake_wled.drop_websockets()
+        for _ in range(300):
+            if not sock.connected:
+                break
+            await asyncio.sleep(0.01)
+        assert not sock.connected
+        sock.push(pixels(2))
+        await sock.flush(2)
+        assert len(await received(fake_wled, 2)) == 2
+        assert sock.stats["connects"] == 2
+    run(test)
+
+
+def test_unreachable_panel_backs_off():
+    async def test(client):
+        # Nothing listens on the discard port
+        sock = client.socket("127.0.0.1:9")
+        sock.push(pixels(1))
+        await sock.flush(2)
+        assert sock.stats["errors"] == 1 and sock.stats["dropped"] == 1
+        assert not sock.ready()
+        assert sock.backoff == MIN_BACKOFF * 2
+        assert 0 < sock.status()["retry_in"] <= MIN_BACKOFF
+    run(test)
+
+
+def test_transport_close_flushes_queued_frames(fake_wled):
+    async def test(client):
+        transport = WebSocketTransport(fake_wled.host, client)
+        await transport.send(pixels(1))
+        await transport.send(pixels(2))
+        await transport.close()
+        # close() returned only once both frames were written
+        assert transport.socket.stats["sent"] == 2
+        assert transport.socket.status()["queued"] == 0
+        assert len(await received(fake_wled, 2)) == 2
+    run(test)
@@ -0,0 +1,172 @@
+"""Delta encoder for WLED ``seg.i`` payloads.
+
+WLED's individual LED API reads ``seg.i`` as a flat list where a color
+(``"RRGGBB"``) sets the next LED, a single index before a color moves to
+that LED, and two indices before a color fill the range ``[start, stop)``::
+
+    ["FF0000", "00FF00"]          LEDs 0 and 1
+    [10, "FF0000", "00FF00"]      LEDs 10 and 11
+    [0, 8, "000000"]              LEDs 0 to 7
+
+The first ``seg.i`` freezes the segment, after which unaddressed LEDs keep
+their color. The encoder remembers the last frame each host received and
+only sends the pixels that changed, as runs or single LEDs, whichever is
+shorter. Full frames (also run-length encoded) are sent on the first frame,
+after an error, and every ``keyframe_interval`` frames to resync. Payloads
+too large for WLED's JSON buffer are split into several requests.
+"""
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+# WLED parses a request into a fixed-size JSON document (10-24 KB depending
+# on the chip, about 15-23 bytes per array entry): larger frames are split
+MAX_TOKENS_PER_REQUEST = 500
+
+
+def pack_rgb(pixels: np.ndarray) -> np.ndarray:
+    """(N, 3) uint8 -> (N,) uint32 0xRRGGBB"""
+    p = pixels.reshape(-1, 3).astype(np.uint32)
+    return (p[:, 0] << 16) | (p[:, 1] << 8) | p[:, 2]
+
+
+def hex_colors(pixels: np.ndarray) -> np.ndarray:
+    """(N, 3) uint8 -> object array of "RRGGBB" strings, without a Python loop"""
+    h = np.ascontiguousarray(pixels, dtype=np.uint8).tobytes().hex().upper().encode()
+    return np.frombuffer(h, dtype="S6").astype("U6").astype(object)
+
+
+def digits(values: np.ndarray) -> np.ndarray:
+    """Decimal digits of non-negative integers"""
+    return np.floor(np.log10(np.maximum(values, 1))).astype(np.intp) + 1
+
+
+def _spans(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Concatenation of arange(start, start + length) for every pair"""
+    offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.repeat(starts, lengths) + np.arange(lengths.sum()) - offsets
+
+
+class Payload:
+    """seg.i tokens for one frame, with the run layout needed to split them"""
+
+    def __init__(self, tokens: list, size: int, run_offsets: np.ndarray, run_starts: np.ndarray,
+                 run_indexed: np.ndarray):
+        self.tokens = tokens
+        self.size = size
+        self._run_offsets = run_offsets
+        self._run_starts = run_starts
+        self._run_indexed = run_indexed
+
+    def chunks(self, max_tokens: int = MAX_TOKENS_PER_REQUEST) -> List[list]:
+        """Split at run boundaries; a chunk starting mid-sequence gets its start index"""
+        if len(self.tokens) <= max_tokens:
+            return [self.tokens]
+        bounds = np.append(self._run_offsets, len(self.tokens))
+        out = []
+        first = 0
+        while first < len(self._run_offsets):
+            # Furthest run boundary within max_tokens, keeping a slot for the start index
+            stop = int(np.searchsorted(bounds, bounds[first] + max_tokens - 1, side="right")) - 1
+            stop = max(stop, first + 1)
+            chunk = self.tokens[bounds[first]:bounds[stop]]
+            if first and not self._run_indexed[first]:
+                chunk = [int(self._run_starts[first])] + chunk
+            out.append(chunk)
+            first = stop
+        return out
+
+
+def encode_runs(pixels: np.ndarray, indices: np.ndarray) -> Payload:
+    """Encode the LEDs at sorted indices as seg.i tokens (vectorized, no per-LED loop)"""
+    pixels = pixels.reshape(-1, 3)
+    n = len(indices)
+    if n == 0:
+        return Payload([], 0, np.zeros(0, np.intp), np.zeros(0, np.intp), np.zeros(0, bool))
+    packed = pack_rgb(pixels)[indices]
+    # A run is a stretch of consecutive LEDs sharing one color
+    breaks = np.flatnonzero((np.diff(indices) != 1) | (np.diff(packed) != 0)) + 1
+    first = np.concatenate(([0], breaks))
+    last = np.concatenate((breaks, [n]))
+    run_start = indices[first]
+    run_end = indices[last - 1] + 1
+    length = run_end - run_start
+
+    # WLED continues after the previous run (range or LED), so only gaps need an index
+    cursor = np.concatenate(([0], run_end[:-1]))
+    jump = run_start != cursor
+    # '"RRGGBB",' is 9 characters, an index costs its digits plus a comma
+    as_range = digits(run_start) + digits(run_end) + 2 + 9
+    as_leds = length * 9 + np.where(jump, digits(run_start) + 1, 0)
+    ranged = (length > 1) & (as_range < as_leds)
+    size = int(np.where(ranged, as_range, as_leds).sum())
+
+    counts = np.where(ranged, 3, length + jump)
+    offsets = np.cumsum(counts) - counts
+    tokens = np.empty(int(counts.sum()), dtype=object)
+    colors = hex_colors(pixels[indices])
+
+    tokens[offsets[ranged]] = run_start[ranged].astype(object)
+    tokens[offsets[ranged] + 1] = run_end[ranged].astype(object)
+    tokens[offsets[ranged] + 2] = colors[first[ranged]]
+    single = ~ranged
+    indexed = single & jump
+    tokens[offsets[indexed]] = run_start[indexed].astype(object)
+    lengths = length[single]
+    tokens[_spans(offsets[single] + jump[single], lengths)] = colors[_spans(first[single], lengths)]
+    return Payload(tokens.tolist(), size, offsets, run_start, ranged | jump)
+
+
+class FrameEncoder:
+    """Per-host encoder; call sent() after a successful send, reset() after a failure"""
+
+    def __init__(self, keyframe_interval: int = 30):
+        self.keyframe_interval = keyframe_interval
+        self.last: Optional[np.ndarray] = None
+        self.since_keyframe = 0
+        # Frame returned by the last encode(), until sent() confirms it
+        self._pending: Optional[Tuple[np.ndarray, bool]] = None
+        self.stats = {"keyframes": 0, "deltas": 0, "skipped": 0}
+
+    def encode(self, pixels: np.ndarray) -> Optional[Payload]:
+        """seg.i payload for pixels, or None when the host already shows them"""
+        pixels = np.asarray(pixels, dtype=np.uint8).reshape(-1, 3)
+        full = encode_runs(pixels, np.arange(len(pixels)))
+        keyframe = (
+            self.last is None
+            or self.last.shape != pixels.shape
+            or self.since_keyframe >= self.keyframe_interval
+        )
+        if keyframe:
+            self._pending = (pixels, True)
+            return full
+
+        changed = np.flatnonzero(np.any(pixels != self.last, axis=1))
+        if len(changed) == 0:
+            self.stats["skipped"] += 1
+            self.since_keyframe += 1
+            return None
+        delta = encode_runs(pixels, changed)
+        if full.size <= delta.size:
+            self._pending = (pixels, True)
+            return full
+        self._pending = (pixels, False)
+        return delta
+
+    def sent(self):
+        if self._pending is None:
+            return
+        pixels, keyframe = self._pending
+        self._pending = None
+        self.last = pixels
+        if keyframe:
+            self.since_keyframe = 0
+            self.stats["keyframes"] += 1
+        else:
+            self.since_keyframe += 1
+            self.stats["deltas"] += 1
+
+    def reset(self):
+        """Forget what the host shows: the next frame is a keyframe"""
+        self.last = None
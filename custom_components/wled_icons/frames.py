@@ -0,0 +1,182 @@
+"""Array-backed frame pipeline.
+
+Every stage works on uint8 arrays: a single frame is ``(H, W, 4)`` RGBA (or
+``(H, W, 3)`` RGB) and a whole animation is ``(N, H, W, 4)``, so an icon is
+recolored, thresholded, rotated and serialized with a handful of NumPy
+operations instead of per-pixel Python loops. The final output of the
+pipeline is a ``(N, H*W, 3)`` RGB array; ``to_colors`` turns one frame into
+the ``[[r, g, b], ...]`` list WLED's JSON API expects. A video wall render
+splits the image into panel tiles and yields ``(N, panels, h*w, 3)``.
+"""
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+# Pixels more transparent than this are sent as black
+ALPHA_THRESHOLD = 10
+
+
+def image_to_array(img: Image.Image) -> np.ndarray:
+    """PIL image -> (H, W, 4) RGBA array"""
+    if img.mode != "RGBA":
+        img = img.convert("RGBA")
+    return np.asarray(img, dtype=np.uint8)
+
+
+def images_to_array(images: Iterable[Image.Image]) -> np.ndarray:
+    """PIL frames -> (N, H, W, 4) RGBA array"""
+    return np.stack([image_to_array(img) for img in images])
+
+
+def grid_to_array(grid: Sequence[Sequence[str]]) -> np.ndarray:
+    """Grid of "#RRGGBB" strings -> opaque (H, W, 4) RGBA array"""
+    return grids_to_array([grid])[0]
+
+
+def grids_to_array(grids: Sequence[Sequence[Sequence[str]]]) -> np.ndarray:
+    """List of hex grids (animation frames) -> opaque (N, H, W, 4) RGBA array"""
+    n, h, w = len(grids), len(grids[0]), len(grids[0][0])
+    flat = [c for grid in grids for row in grid for c in row]
+    digits = "".join(c.strip().lstrip('#') for c in flat)
+    if len(digits) != 6 * len(flat):
+        # Some colors use the #RGB shorthand: expand them one by one
+        digits = "".join(_expand_hex(c) for c in flat)
+    try:
+        rgb = np.frombuffer(bytes.fromhex(digits), dtype=np.uint8)
+    except ValueError:
+        raise ValueError("Invalid hex color")
+    out = np.full((n, h, w, 4), 255, dtype=np.uint8)
+    out[..., :3] = rgb.reshape(n, h, w, 3)
+    return out
+
+
+def _expand_hex(hex_color: str) -> str:
+    s = hex_color.strip().lstrip('#')
+    if len(s) == 3:
+        s = ''.join(c*2 for c in s)
+    if len(s) != 6:
+        raise ValueError("Invalid hex color")
+    return s
+
+
+def resize(frames: np.ndarray, width: int, height: int) -> np.ndarray:
+    """Nearest-neighbour resize of (..., H, W, C) frames, sampling pixel centres like PIL"""
+    h, w = frames.shape[-3], frames.shape[-2]
+    if (w, h) == (width, height):
+        return frames
+    ys = ((np.arange(height) + 0.5) * h / height).astype(np.intp)
+    xs = ((np.arange(width) + 0.5) * w / width).astype(np.intp)
+    return frames[..., ys[:, None], xs[None, :], :]
+
+
+def fit(frames: np.ndarray, width: int, height: int, mode: str = "contain") -> np.ndarray:
+    """Scale (N, H, W, C) frames into width x height
+
+    "contain" keeps the aspect ratio and letterboxes with transparent
+    pixels, "stretch" fills the whole area.
+    """
+    h, w = frames.shape[-3], frames.shape[-2]
+    if (w, h) == (width, height) or mode == "stretch":
+        return resize(frames, width, height)
+    scale = min(width / w, height / h)
+    sw, sh = max(1, min(width, round(w * scale))), max(1, min(height, round(h * scale)))
+    out = np.zeros(frames.shape[:-3] + (height, width, frames.shape[-1]), dtype=frames.dtype)
+    top, left = (height - sh) // 2, (width - sw) // 2
+    out[..., top:top + sh, left:left + sw, :] = resize(frames, sw, sh)
+    return out
+
+
+def tile(frames: np.ndarray, columns: int, rows: int) -> np.ndarray:
+    """(N, H, W, C) -> (N, rows*columns, H/rows, W/columns, C), tiles in row-major order"""
+    n, h, w, c = frames.shape
+    th, tw = h // rows, w // columns
+    tiles = frames[:, :th * rows, :tw * columns].reshape(n, rows, th, columns, tw, c)
+    return tiles.transpose(0, 1, 3, 2, 4, 5).reshape(n, rows * columns, th, tw, c)
+
+
+def recolor(frames: np.ndarray, rgb: Tuple[int, int, int]) -> np.ndarray:
+    """Paint every non-transparent pixel with rgb, keeping its alpha"""
+    out = frames.copy()
+    out[..., :3] = np.where(frames[..., 3:4] > 0, np.asarray(rgb, dtype=np.uint8), frames[..., :3])
+    return out
+
+
+def transform(frames: np.ndarray, rotate: int = 0, flip_h: bool = False, flip_v: bool = False) -> np.ndarray:
+    """Clockwise rotation then mirroring of (..., H, W, C) frames"""
+    rotate %= 360
+    if rotate % 90 == 0:
+        if rotate:
+            frames = np.rot90(frames, k=-(rotate // 90), axes=(-3, -2))
+    else:
+        frames = _rotate_arbitrary(frames, rotate)
+    if flip_h:
+        frames = frames[..., :, ::-1, :]
+    if flip_v:
+        frames = frames[..., ::-1, :, :]
+    return frames
+
+
+def _rotate_arbitrary(frames: np.ndarray, rotate: int) -> np.ndarray:
+    """Non right-angle rotations go through PIL, frame by frame"""
+    flat = frames.reshape((-1,) + frames.shape[-3:])
+    mode = "RGBA" if frames.shape[-1] == 4 else "RGB"
+    rotated = [
+        np.asarray(Image.fromarray(np.ascontiguousarray(f), mode).rotate(-rotate, expand=False))
+        for f in flat
+    ]
+    return np.stack(rotated).reshape(frames.shape)
+
+
+def flatten_alpha(frames: np.ndarray, threshold: int = ALPHA_THRESHOLD) -> np.ndarray:
+    """RGBA -> RGB, blacking out pixels below the alpha threshold"""
+    if frames.shape[-1] == 3:
+        return frames
+    return np.where(frames[..., 3:4] < threshold, 0, frames[..., :3]).astype(np.uint8)
+
+
+def scale_brightness(rgb: np.ndarray, brightness: int = 255, gamma: float = 1.0) -> np.ndarray:
+    """Apply brightness (0-255) and an optional gamma curve through a lookup table"""
+    if brightness >= 255 and gamma == 1.0:
+        return rgb
+    lut = np.arange(256, dtype=np.float32) / 255.0
+    if gamma != 1.0:
+        lut = lut ** gamma
+    lut = (lut * 255.0 * brightness / 255).astype(np.uint8)
+    return lut[rgb]
+
+
+def to_pixels(frames: np.ndarray) -> np.ndarray:
+    """(..., H, W, 3) -> contiguous (..., H*W, 3) row-major pixel order"""
+    h, w = frames.shape[-3], frames.shape[-2]
+    return np.ascontiguousarray(frames.reshape(frames.shape[:-3] + (h * w, 3)))
+
+
+def render(frames: np.ndarray, color: Tuple[int, int, int] = None, rotate: int = 0,
+           flip_h: bool = False, flip_v: bool = False, size: Tuple[int, int] = (8, 8),
+           grid: Optional[Tuple[int, int]] = None, mode: str = "contain") -> np.ndarray:
+    """Full pipeline: (N, H, W, 4) RGBA -> (N, W*H, 3) RGB for a W x H panel
+
+    The image is fitted to the panel (see ``fit``) as seen before rotation,
+    so a quarter turn on a 32x8 panel draws into 8x32. With grid=(columns,
+    rows) it is fitted to the whole wall and split into panel tiles, each
+    rotated/mirrored on its own (panels keep their mounting orientation),
+    giving (N, columns*rows, W*H, 3).
+    """
+    width, height = size
+    if rotate % 180 == 90:
+        width, height = height, width
+    if grid:
+        width, height = width * grid[0], height * grid[1]
+    frames = fit(frames, width, height, mode)
+    if color:
+        frames = recolor(frames, color)
+    if grid:
+        frames = tile(frames, *grid)
+    frames = transform(frames, rotate, flip_h, flip_v)
+    return to_pixels(flatten_alpha(frames))
+
+
+def to_colors(pixels: np.ndarray) -> List[List[int]]:
+    """(H*W, 3) frame -> [[r, g, b], ...] for the WLED JSON API"""
+    return pixels.reshape(-1, 3).tolist()
@@ -0,0 +1,236 @@
+"""Local rendering: show LaMetric icons straight from Home Assistant.
+
+Used when the add-on cannot be reached, or when a service call asks for it
+with ``local: true``. The icon is downloaded with Home Assistant's shared
+aiohttp session, decoded and transformed in the executor by the add-on's
+NumPy pipeline (``frames.py`` and ``encoder.py`` are vendored from the
+add-on's ``app/`` package; the add-on image copies them in at build time and
+a test checks that these copies match), then played on the event loop
+with async requests timed on absolute deadlines. Frames are sent as deltas
+like the add-on does. Downloads and rendered sequences are kept in memory.
+
+Custom (WI) icons are stored in the add-on and cannot be shown locally.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+from collections import OrderedDict
+from io import BytesIO
+from typing import Any
+
+import aiohttp
+import numpy as np
+from PIL import Image, ImageSequence
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+
+from . import frames
+from .encoder import FrameEncoder
+
+_LOGGER = logging.getLogger(__name__)
+
+LAMETRIC_URL = "https://developer.lametric.com/content/apps/icon_thumbs/{icon_id}"
+DOWNLOAD_CACHE_SIZE = 64
+RENDER_CACHE_SIZE = 32
+DEFAULT_SIZE = (8, 8)
+TIMEOUT = aiohttp.ClientTimeout(total=5)
+
+Sequence = list[tuple[np.ndarray, float]]
+
+
+class LocalRenderError(Exception):
+    """The icon could not be shown without the add-on"""
+
+
+def hex_to_rgb(hex_color: str) -> tuple[int, int, int]:
+    s = hex_color.strip().lstrip("#")
+    if len(s) == 3:
+        s = "".join(c * 2 for c in s)
+    if len(s) != 6:
+        raise ValueError("Invalid hex color")
+    return tuple(int(s[i:i + 2], 16) for i in (0, 2, 4))  # type: ignore
+
+
+def render_sequence(content: bytes, params: dict[str, Any], size: tuple[int, int]) -> Sequence:
+    """Decode a LaMetric icon and render it for a panel (runs in the executor)"""
+    img = Image.open(BytesIO(content))
+    fps = params.get("fps")
+    if getattr(img, "is_animated", False) and params["animate"]:
+        images, durations = [], []
+        for frame in ImageSequence.Iterator(img):
+            images.append(frame.convert("RGBA"))
+            # Like browsers, treat 0-10 ms frames as 100 ms
+            duration = frame.info.get("duration", 100) / 1000.0
+            if duration <= 0.01:
+                duration = 0.1
+            durations.append(1.0 / fps if fps else duration)
+        stack = frames.images_to_array(images)
+    else:
+        if getattr(img, "is_animated", False):
+            img.seek(0)
+        stack = frames.image_to_array(img)[None]
+        durations = [1.0]
+    color = hex_to_rgb(params["color"]) if params.get("color") else None
+    rendered = frames.render(stack, color, params["rotate"], params["flip_h"], params["flip_v"], size=size)
+    return list(zip(rendered, durations))
+
+
+class LocalRenderer:
+    def __init__(self, hass: HomeAssistant):
+        self.hass = hass
+        self._session = async_get_clientsession(hass)
+        self._downloads: OrderedDict[str, bytes] = OrderedDict()
+        self._sequences: OrderedDict[tuple, Sequence] = OrderedDict()
+        self._sizes: dict[str, tuple[int, int]] = {}
+        self._encoders: dict[str, FrameEncoder] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    async def show(self, host: str, icon_id: str, *, color: str | None = None, rotate: int = 0,
+                   flip_h: bool = False, flip_v: bool = False, animate: bool = True, fps: int | None = None,
+                   loop: int = 1, brightness: int = 255):
+        """Display a LaMetric icon on host; animations play in the background"""
+        if icon_id.startswith("WI"):
+            raise LocalRenderError(f"Icône personnalisée {icon_id} : disponible uniquement via l'add-on")
+        params = {"color": color, "rotate": rotate % 360, "flip_h": flip_h, "flip_v": flip_v,
+                  "animate": animate, "fps": fps or None}
+        size = await self._panel_size(host)
+        key = (icon_id, size, *params.values())
+        sequence = self._sequences.get(key)
+        if sequence is None:
+            content = await self._download(icon_id)
+            try:
+                sequence = await self.hass.async_add_executor_job(render_sequence, content, params, size)
+            except (OSError, ValueError) as e:
+                # Unreadable image (PIL raises OSError subclasses) or invalid color
+                raise LocalRenderError(f"Icône LaMetric {icon_id} illisible: {e}") from e
+            self._remember(self._sequences, key, sequence, RENDER_CACHE_SIZE)
+        else:
+            self._sequences.move_to_end(key)
+
+        await self.stop(host)
+        if len(sequence) == 1:
+            await self._send(host, sequence[0][0], brightness)
+            return
+        self._tasks[host] = self.hass.async_create_background_task(
+            self._play(host, sequence, loop, brightness), f"wled_icons local {host}")
+
+    async def stop(self, host: str | None = None):
+        """Stop the local animation of host (every one when None)"""
+        hosts = list(self._tasks) if host is None else [host]
+        for h in hosts:
+            task = self._tasks.pop(h, None)
+            if task is None or task.done():
+                continue
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def playing(self, host: str) -> bool:
+        task = self._tasks.get(host)
+        return task is not None and not task.done()
+
+    # --- Internals ---
+
+    @staticmethod
+    def _remember(cache: OrderedDict, key, value, size: int):
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > size:
+            cache.popitem(last=False)
+
+    async def _download(self, icon_id: str) -> bytes:
+        content = self._downloads.get(icon_id)
+        if content is not None:
+            self._downloads.move_to_end(icon_id)
+            return content
+        try:
+            async with self._session.get(LAMETRIC_URL.format(icon_id=icon_id), timeout=TIMEOUT) as resp:
+                if resp.status in (404, 410):
+                    raise LocalRenderError(f"Icône LaMetric {icon_id} introuvable")
+                resp.raise_for_status()
+                content = await resp.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise LocalRenderError(f"Téléchargement de l'icône {icon_id} impossible: {e}") from e
+        self._remember(self._downloads, icon_id, content, DOWNLOAD_CACHE_SIZE)
+        return content
+
+    async def _panel_size(self, host: str) -> tuple[int, int]:
+        """Matrix size advertised by WLED /json/info (read once per host)"""
+        size = self._sizes.get(host)
+        if size is not None:
+            return size
+        try:
+            async with self._session.get(f"http://{host}/json/info", timeout=TIMEOUT) as resp:
+                resp.raise_for_status()
+                leds = (await resp.json(content_type=None)).get("leds") or {}
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            _LOGGER.warning("Taille du panneau %s inconnue (%s), 8x8 utilisé", host, e)
+            return DEFAULT_SIZE
+        matrix = leds.get("matrix") or {}
+        count = int(leds.get("count") or 0)
+        side = math.isqrt(count)
+        if matrix.get("w") and matrix.get("h"):
+            size = (int(matrix["w"]), int(matrix["h"]))
+        elif count and side * side == count:
+            size = (side, side)
+        else:
+            size = DEFAULT_SIZE
+        self._sizes[host] = size
+        return size
+
+    async def _send(self, host: str, pixels: np.ndarray, brightness: int):
+        encoder = self._encoders.setdefault(host, FrameEncoder())
+        payload = encoder.encode(pixels)
+        if payload is None:
+            return
+        try:
+            for tokens in payload.chunks():
+                async with self._session.post(f"http://{host}/json/state", timeout=TIMEOUT,
+                                              json={"seg": [{"id": 0, "i": tokens, "bri": brightness}]}) as resp:
+                    resp.raise_for_status()
+        except BaseException:
+            # The panel may or may not show the frame: send a full one next time
+            encoder.reset()
+            raise
+        encoder.sent()
+
+    async def _play(self, host: str, sequence: Sequence, loop: int, brightness: int):
+        """Background task: play sequence, logging whatever stops it"""
+        try:
+            await self._play_frames(host, sequence, loop, brightness)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # A background task has nobody to report to: log instead of dying silently
+            _LOGGER.exception("Animation locale sur %s interrompue", host)
+
+    async def _play_frames(self, host: str, sequence: Sequence, loop: int, brightness: int):
+        """Play sequence on absolute deadlines, skipping frames whose slot has passed"""
+        clock = asyncio.get_running_loop().time
+        cycle = sum(duration for _, duration in sequence)
+        deadline = clock()
+        done = 0
+        errors = 0
+        while loop <= 0 or done < loop:
+            for index, (pixels, duration) in enumerate(sequence):
+                lateness = clock() - deadline
+                if lateness > cycle:
+                    # Stalled for more than a whole loop: re-anchor
+                    deadline = clock()
+                elif lateness >= duration and index < len(sequence) - 1:
+                    deadline += duration
+                    continue
+                try:
+                    await self._send(host, pixels, brightness)
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                    errors += 1
+                    if errors == 1:
+                        _LOGGER.warning("Envoi de frame vers %s impossible: %s", host, e)
+                deadline += duration
+                await asyncio.sleep(max(0.0, deadline - clock()))
+            done += 1